@@ -8,7 +8,8 @@ in a coordinated manner. It includes tools for agent creation, communication, an
 from .agency import Agency
 from .agents import Agent
 from .tools import BaseTool
-from .util import set_openai_key, set_openai_client, get_openai_client
+from .util import set_openai_key, set_openai_client, get_openai_client, get_async_openai_client, \
+    set_async_openai_client
 from .util.streaming import AgencyEventHandler
 
 __all__ = [
@@ -18,6 +19,8 @@ __all__ = [
     'set_openai_key',
     'set_openai_client',
     'get_openai_client',
+    'get_async_openai_client',
+    'set_async_openai_client',
     'AgencyEventHandler'
 ]
 
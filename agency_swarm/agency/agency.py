@@ -1,9 +1,10 @@
+import asyncio
+import contextvars
 import inspect
-import json
 import os
-import queue
 import threading
 import uuid
+from concurrent.futures import ThreadPoolExecutor, wait
 from enum import Enum
 from typing import List, TypedDict, Callable, Any, Dict, Literal, Union, Optional
 
@@ -11,7 +12,7 @@ from openai.types.beta import AssistantToolChoice
 from openai.types.beta.threads import Message
 from openai.types.beta.threads.message import Attachment
 from openai.types.beta.threads.runs import RunStep
-from pydantic import Field, field_validator, model_validator
+from pydantic import BaseModel, Field, field_validator, model_validator
 from rich.console import Console
 from typing_extensions import override
 
@@ -21,17 +22,19 @@ from agency_swarm.messages.message_output import MessageOutputLive
 from agency_swarm.threads import Thread
 from agency_swarm.tools import BaseTool, FileSearch, CodeInterpreter
 from agency_swarm.user import User
-TELEGRAM_BOT_TOKEN=7838814763:AAGVkweVaww77zuWb6lUz4Fg6Xm5yiiEido
-GHL_API_KEY=your_ghl_api_key
-MAKE_WEBHOOK_URL=your_make_webhook_urlfrom agency_swarm.util.gpu_utils import get_device, move_to_device, optimize_memory
+from agency_swarm.util.event_bus import StreamEventBus
+from agency_swarm.util.gpu_utils import get_device, move_to_device, optimize_memory
+from agency_swarm.util.model_router import ModelRouter
+from agency_swarm.util.retry_policy import RetryPolicy
+from agency_swarm.util.settings_store import get_settings_store, CallbackSettingsStore
+from agency_swarm.util.shared_state import SharedState, get_shared_state
 from agency_swarm.util.streaming import AgencyEventHandler
+from agency_swarm.util.threads_store import ThreadsStore
+from agency_swarm.util.token_budget import TokenBudget
+from agency_swarm.util.worker_pool import WorkerPool
 
 console = Console()
 
-# Initialize GPU device
-device = get_device()
-console.print(f"Using device: {device}")
-
 class SettingsCallbacks(TypedDict):
     load: Callable[[], List[Dict]]
     save: Callable[[List[Dict]], Any]
@@ -68,7 +71,16 @@ class Agency:
                  shared_files: Union[str, List[str]] = None,
                  async_mode: Literal['threading'] = None,
                  settings_path: str = "./settings.json",
+                 settings_callbacks: SettingsCallbacks = None,
                  threads_path: str = "./threads.json",
+                 threads_callbacks: ThreadsCallbacks = None,
+                 shared_state: SharedState = None,
+                 shared_state_namespace: str = None,
+                 broadcast_messages: bool = False,
+                 worker_pool: WorkerPool = None,
+                 token_budget: TokenBudget = None,
+                 model_router: ModelRouter = None,
+                 retry_policy: RetryPolicy = None,
                  use_gpu: bool = True) -> None:
         """
         Initialize a new Agency instance.
@@ -78,8 +90,17 @@ class Agency:
             shared_instructions (str, optional): Instructions shared among all agents
             shared_files (Union[str, List[str]], optional): Files shared among all agents
             async_mode (Literal['threading'], optional): Mode for asynchronous operations
-            settings_path (str, optional): Path to settings file
+            settings_path (str, optional): Path to settings file. Paths ending with .db or .sqlite store the settings in SQLite
+            settings_callbacks (SettingsCallbacks, optional): Functions to load and save settings, for example from a database, instead of using the settings file
             threads_path (str, optional): Path to threads file
+            threads_callbacks (ThreadsCallbacks, optional): Functions to load and save thread ids, for example from a database, instead of using the threads file
+            shared_state (SharedState, optional): State shared by the tools of this agency, for example a SQLiteSharedState to keep it between runs. Defaults to the state shared by all tools
+            shared_state_namespace (str, optional): Namespace for the keys of this agency, so several agencies can use the same shared state without conflicts
+            broadcast_messages (bool, optional): Whether to give agents with several recipients a BroadcastMessage tool, which sends tasks to several agents at once and waits for all replies
+            worker_pool (WorkerPool, optional): Pool that processes messages in 'threading' async mode. Messages to a busy agent are queued in it. Defaults to a pool of 8 workers for this agency
+            token_budget (TokenBudget, optional): Prompt budget of the runs of agents that don't set their own. Runs projected to exceed it are truncated or summarized before they are created
+            model_router (ModelRouter, optional): Picks the model of each run of agents that don't set their own router, so cheaper and faster models can handle simple hops
+            retry_policy (RetryPolicy, optional): Retries, backoff and circuit breaking of failed runs of agents that don't set their own policy. Defaults to the policy shared by all agents
             use_gpu (bool, optional): Whether to use GPU acceleration
         """
         if not agency_chart:
@@ -100,9 +121,14 @@ class Agency:
                     raise FileNotFoundError(f"Shared file not found: {file}")
                     
         self.async_mode = async_mode
+        self.worker_pool = worker_pool
+        # a pool created by the agency is stopped by `shutdown`, a pool passed in belongs to the caller
+        self._owns_worker_pool = False
         if self.async_mode == "threading":
             from agency_swarm.threads.thread_async import ThreadAsync
             self.ThreadType = ThreadAsync
+            self.worker_pool = worker_pool or WorkerPool()
+            self._owns_worker_pool = worker_pool is None
 
         self.ceo = None
         self.user = User()
@@ -113,14 +139,26 @@ class Agency:
         self.recipient_agents = None  # for autocomplete
         self.shared_files = shared_files if shared_files else []
         self.settings_path = settings_path
+        self.settings_callbacks = settings_callbacks
         self.threads_path = threads_path
+        self.threads_callbacks = threads_callbacks
+        self.threads_store = None
+        self.shared_state = shared_state
+        if shared_state_namespace:
+            self.shared_state = (shared_state or get_shared_state()).namespace(shared_state_namespace)
         self.temperature = None
         self.top_p = None
         self.max_prompt_tokens = None
         self.max_completion_tokens = None
         self.truncation_strategy = None
-        self.device = device if use_gpu else torch.device('cpu')
-        console.print(f"Agency using device: {self.device}")
+        self.token_budget = token_budget
+        self.model_router = model_router
+        self.retry_policy = retry_policy
+        self.max_init_workers = 8
+        self.broadcast_messages = broadcast_messages
+        # seconds BroadcastMessage waits for the replies of all recipients
+        self.broadcast_timeout = 600
+        self.use_gpu = use_gpu
         
         if os.path.isfile(os.path.join(self._get_class_folder_path(), shared_instructions)):
             self._read_instructions(os.path.join(self._get_class_folder_path(), shared_instructions))
@@ -135,6 +173,11 @@ class Agency:
         self._init_threads()
         self._init_gpu()
 
+    @property
+    def device(self):
+        """Device used for tensors. Loads the accelerator backend on first access."""
+        return get_device() if self.use_gpu else "cpu"
+
     def get_completion(self, message: str,
                        message_files: List[str] = None,
                        yield_messages: bool = False,
@@ -162,8 +205,8 @@ class Agency:
             print("Warning: yield_messages parameter is deprecated. Use streaming instead.")
 
         # Move any tensor data to GPU
-        if hasattr(message, 'to'):
-            message = move_to_device(message, self.device)
+        if self.use_gpu and hasattr(message, 'to'):
+            message = move_to_device(message)
         
         result = self.main_thread.get_completion(message=message,
                                                message_files=message_files,
@@ -173,11 +216,40 @@ class Agency:
                                                tool_choice=tool_choice)
 
         # Optimize GPU memory after completion
-        if str(self.device) != 'cpu':
+        if self.use_gpu:
             optimize_memory()
         
         return result
 
+    async def aget_completion(self, message: str,
+                              message_files: List[str] = None,
+                              recipient_agent: Agent = None,
+                              additional_instructions: str = None,
+                              attachments: List[dict] = None,
+                              tool_choice: dict = None,
+                              ):
+        """
+        Coroutine version of get_completion. Uses the async OpenAI client, so a single event loop can drive many
+        concurrent conversations without a thread per conversation.
+
+        Parameters:
+            message (str): The message for which completion is to be retrieved.
+            message_files (list, optional): A list of file ids to be sent as attachments with the message. Defaults to None.
+            recipient_agent (Agent, optional): The agent to which the message should be sent. Defaults to the first agent in the agency chart.
+            additional_instructions (str, optional): Additional instructions to be sent with the message. Defaults to None.
+            attachments (List[dict], optional): A list of attachments to be sent with the message, following openai format. Defaults to None.
+            tool_choice (dict, optional): The tool choice for the recipient agent to use. Defaults to None.
+
+        Returns:
+            Final response: Final response from the main thread.
+        """
+        return await self.main_thread.aget_completion(message=message,
+                                                      message_files=message_files,
+                                                      attachments=attachments,
+                                                      recipient_agent=recipient_agent,
+                                                      additional_instructions=additional_instructions,
+                                                      tool_choice=tool_choice)
+
     def get_completion_stream(self,
                               message: str,
                               event_handler: type(AgencyEventHandler),
@@ -251,7 +323,6 @@ class Agency:
         recipient_agent = self.main_recipients[0]
 
         with gr.Blocks(js=js) as demo:
-            chatbot_queue = queue.Queue()
             chatbot = gr.Chatbot(height=height)
             with gr.Row():
                 with gr.Column(scale=9):
@@ -308,121 +379,46 @@ class Agency:
 
                 return original_user_message, history + [[user_message, None]]
 
-            class GradioEventHandler(AgencyEventHandler):
-                message_output = None
-
-                @override
-                def on_message_created(self, message: Message) -> None:
-                    if message.role == "user":
-                        self.message_output = MessageOutput("text", self.agent_name, self.recipient_agent_name,
-                                                            message.content[0].text.value)
-
-                    else:
-                        self.message_output = MessageOutput("text", self.recipient_agent_name, self.agent_name,
-                                                            "")
-
-                    chatbot_queue.put("[new_message]")
-                    chatbot_queue.put(self.message_output.get_formatted_content())
-
-                @override
-                def on_text_delta(self, delta, snapshot):
-                    chatbot_queue.put(delta.value)
-
-                @override
-                def on_tool_call_created(self, tool_call):
-                    # TODO: add support for code interpreter and retirieval tools
-                    if tool_call.type == "function":
-                        chatbot_queue.put("[new_message]")
-                        self.message_output = MessageOutput("function", self.recipient_agent_name, self.agent_name,
-                                                            str(tool_call.function))
-                        chatbot_queue.put(self.message_output.get_formatted_header() + "\n")
-
-                @override
-                def on_tool_call_done(self, snapshot):
-                    self.message_output = None
-
-                    # TODO: add support for code interpreter and retirieval tools
-                    if snapshot.type != "function":
-                        return
-
-                    chatbot_queue.put(str(snapshot.function))
-
-                    if snapshot.function.name == "SendMessage":
-                        try:
-                            args = eval(snapshot.function.arguments)
-                            recipient = args["recipient"]
-                            self.message_output = MessageOutput("text", self.recipient_agent_name, recipient,
-                                                                args["message"])
-
-                            chatbot_queue.put("[new_message]")
-                            chatbot_queue.put(self.message_output.get_formatted_content())
-                        except Exception as e:
-                            pass
-
-                    self.message_output = None
-
-                @override
-                def on_run_step_done(self, run_step: RunStep) -> None:
-                    if run_step.type == "tool_calls":
-                        for tool_call in run_step.step_details.tool_calls:
-                            if tool_call.type != "function":
-                                continue
-
-                            if tool_call.function.name == "SendMessage":
-                                continue
-
-                            self.message_output = None
-                            chatbot_queue.put("[new_message]")
-
-                            self.message_output = MessageOutput("function_output", tool_call.function.name,
-                                                                self.recipient_agent_name,
-                                                                tool_call.function.output)
-
-                            chatbot_queue.put(self.message_output.get_formatted_header() + "\n")
-                            chatbot_queue.put(tool_call.function.output)
-
-                @override
-                @classmethod
-                def on_all_streams_end(cls):
-                    self.message_output = None
-                    chatbot_queue.put("[end]")
-
             def bot(original_message, history):
                 nonlocal message_file_ids
                 nonlocal message_file_names
                 nonlocal recipient_agent
                 print("Message files: ", message_file_ids)
-                # Replace this with your actual chatbot logic
-
-                completion_thread = threading.Thread(target=self.get_completion_stream, args=(
-                    original_message, GradioEventHandler, message_file_ids, recipient_agent))
-                completion_thread.start()
 
-                message_file_ids = []
-                message_file_names = []
+                # deltas are coalesced by the bus, so the chat is re-rendered once per batch instead of once per token
+                bus = StreamEventBus()
+                subscription = bus.subscribe()
 
-                new_message = True
-                while True:
+                def run_completion(files, agent):
                     try:
-                        bot_message = chatbot_queue.get(block=True)
+                        self.get_completion_stream(original_message, bus.create_event_handler(), files, agent)
+                    finally:
+                        bus.close()
 
-                        if bot_message == "[end]":
-                            completion_thread.join()
-                            break
-
-                        if bot_message == "[new_message]":
-                            new_message = True
-                            continue
+                completion_thread = threading.Thread(target=run_completion, args=(message_file_ids, recipient_agent))
+                completion_thread.start()
 
-                        if new_message:
-                            history.append([None, bot_message])
-                            new_message = False
-                        else:
-                            history[-1][1] += bot_message
+                message_file_ids = []
+                message_file_names = []
 
-                        yield "", history
-                    except queue.Empty:
-                        break
+                rows = {}
+                for events in iter(subscription.get_batch, []):
+                    for event in events:
+                        if event.type == "message_start":
+                            message_output = MessageOutput(event.msg_type, event.sender_name, event.receiver_name,
+                                                           event.text)
+                            if event.msg_type == "text":
+                                content = message_output.get_formatted_content()
+                            else:
+                                content = message_output.get_formatted_header() + "\n" + event.text
+                            rows[event.message_id] = len(history)
+                            history.append([None, content])
+                        elif event.type == "delta" and event.message_id in rows:
+                            history[rows[event.message_id]][1] += event.text
+
+                    yield "", history
+
+                completion_thread.join()
 
             button.click(
                 user,
@@ -585,6 +581,40 @@ class Agency:
 
             self.get_completion_stream(message=text, event_handler=TermEventHandler, recipient_agent=recipient_agent)
 
+    def set_threads_store(self, threads_store: ThreadsStore):
+        """
+        Switches the agency to the threads of another conversation, for example to serve several sessions with the
+        same agents. Pending thread ids of the current conversation are written first. Must not be called while a
+        completion is running.
+
+        Parameters:
+            threads_store (ThreadsStore): Store with the thread ids of the conversation, see `SessionRegistry.get_threads_store`.
+        """
+        if self.threads_store:
+            self.threads_store.flush()
+        threads_store.load()
+        self.threads_store = threads_store
+
+        threads = [(self.main_thread, "main_thread", None)]
+        threads += [(thread, agent_name, other_agent)
+                    for agent_name, recipients in self.agents_and_threads.items()
+                    for other_agent, thread in recipients.items()]
+        for thread, agent_name, other_agent in threads:
+            thread.switch_thread(threads_store.get(agent_name, other_agent))
+
+    def cancel(self, timeout: float = None):
+        """
+        Stops the completion running on the agency from another thread, for example when the client waiting for it
+        disconnected. The runs of the main thread and of every agent thread are cancelled, see `Thread.cancel`.
+
+        Parameters:
+            timeout (float, optional): Seconds to wait for each cancelled run to stop. Defaults to the thread's `cancel_timeout`.
+        """
+        threads = [self.main_thread] + [thread for recipients in self.agents_and_threads.values()
+                                        for thread in recipients.values()]
+        for thread in threads:
+            thread.cancel(timeout)
+
     def get_customgpt_schema(self, url: str):
         """Returns the OpenAPI schema for the agency from the CEO agent, that you can use to integrate with custom gpts.
 
@@ -607,10 +637,10 @@ class Agency:
 
         There are no output parameters as this method is used for internal initialization purposes within the Agency class.
         """
-        if self.settings_path:
-            loaded_settings = json.load(open(self.settings_path, 'r'))
-            with open(self.settings_path, 'w') as f:
-                json.dump(loaded_settings, f, indent=4)
+        if self.settings_callbacks:
+            settings_store = CallbackSettingsStore(self.settings_callbacks)
+        else:
+            settings_store = get_settings_store(self.settings_path)
 
         for agent in self.agents:
             if "temp_id" in agent.id:
@@ -618,6 +648,7 @@ class Agency:
 
             agent.add_shared_instructions(self.shared_instructions)
             agent.settings_path = self.settings_path
+            agent.settings_store = settings_store
 
             if self.shared_files:
                 if isinstance(self.shared_files, str):
@@ -639,15 +670,18 @@ class Agency:
                 agent.max_completion_tokens = self.max_completion_tokens
             if self.truncation_strategy is not None and agent.truncation_strategy is None:
                 agent.truncation_strategy = self.truncation_strategy
-
-            agent.init_oai()
-
-        if self.settings_path:
-            with open(self.agents[0].get_settings_path(), 'r') as f:
-                settings = f.read()
-            settings = json.loads(settings)
-            with open(self.settings_path, 'w') as f:
-                json.dump(settings, f, indent=4)
+            if self.token_budget is not None and agent.token_budget is None:
+                agent.token_budget = self.token_budget
+            if self.model_router is not None and agent.model_router is None:
+                agent.model_router = self.model_router
+            if self.retry_policy is not None and agent.retry_policy is None:
+                agent.retry_policy = self.retry_policy
+
+        # agents whose settings are unchanged return without network calls, the rest are initialized concurrently
+        # and all settings changes are written once at the end
+        with settings_store.batch():
+            with ThreadPoolExecutor(max_workers=min(self.max_init_workers, len(self.agents))) as executor:
+                list(executor.map(lambda agent: agent.init_oai(), self.agents))
 
     def _init_threads(self):
         """
@@ -655,46 +689,36 @@ class Agency:
 
         This method creates Thread objects for each pair of interacting agents as defined in the agents_and_threads attribute of the Agency. Each thread facilitates communication and task execution between an agent and its designated recipient agent.
 
+        Threads are not created on OpenAI here. Previously saved thread ids are assigned to their Thread objects, all other threads are created on their first message and their ids are saved by the threads store, so the startup time does not depend on the number of agent pairs.
+
         No input parameters.
 
         Output Parameters:
-            This method does not return any value but updates the agents_and_threads attribute with initialized Thread objects.
+            This method does not return any value but updates the agents_and_threads attribute with Thread objects.
         """
-        self.main_thread = Thread(self.user, self.ceo)
+        if self.threads_callbacks:
+            self.threads_store = ThreadsStore(callbacks=self.threads_callbacks, debounce=0)
+        else:
+            self.threads_store = ThreadsStore(self.threads_path)
+        self.threads_store.load()
 
-        # load thread ids
-        loaded_thread_ids = {}
-        if self.threads_path:
-            loaded_thread_ids = json.load(open(self.threads_path, 'r'))
-            if "main_thread" in loaded_thread_ids:
-                self.main_thread.id = loaded_thread_ids["main_thread"]
-            else:
-                self.main_thread.init_thread()
+        self.main_thread = Thread(self.user, self.ceo,
+                                  on_created=lambda thread: self.threads_store.set("main_thread", thread_id=thread.id))
+        self.main_thread.id = self.threads_store.get("main_thread")
+        self.main_thread.shared_state = self.shared_state
 
         for agent_name, threads in self.agents_and_threads.items():
             for other_agent, items in threads.items():
-                self.agents_and_threads[agent_name][other_agent] = self.ThreadType(
+                thread = self.ThreadType(
                     self._get_agent_by_name(items["agent"]),
-                    self._get_agent_by_name(
-                        items["recipient_agent"]))
-
-                if agent_name in loaded_thread_ids and other_agent in loaded_thread_ids[agent_name]:
-                    self.agents_and_threads[agent_name][other_agent].id = loaded_thread_ids[agent_name][other_agent]
-                elif self.threads_path:
-                    self.agents_and_threads[agent_name][other_agent].init_thread()
-
-        # save thread ids
-        if self.threads_path:
-            loaded_thread_ids = {}
-            for agent_name, threads in self.agents_and_threads.items():
-                loaded_thread_ids[agent_name] = {}
-                for other_agent, thread in threads.items():
-                    loaded_thread_ids[agent_name][other_agent] = thread.id
-
-            loaded_thread_ids["main_thread"] = self.main_thread.id
-
-            with open(self.threads_path, 'w') as f:
-                json.dump(loaded_thread_ids, f, indent=4)
+                    self._get_agent_by_name(items["recipient_agent"]),
+                    on_created=lambda thread, agent_name=agent_name, other_agent=other_agent:
+                        self.threads_store.set(agent_name, other_agent, thread.id))
+                thread.id = self.threads_store.get(agent_name, other_agent)
+                thread.shared_state = self.shared_state
+                if self.worker_pool:
+                    thread.worker_pool = self.worker_pool
+                self.agents_and_threads[agent_name][other_agent] = thread
 
     def _parse_agency_chart(self, agency_chart):
         """
@@ -817,6 +841,8 @@ class Agency:
             agent.add_tool(self._create_send_message_tool(agent, recipient_agents))
             if self.async_mode:
                 agent.add_tool(self._create_get_response_tool(agent, recipient_agents))
+            elif self.broadcast_messages and len(recipient_agents) > 1:
+                agent.add_tool(self._create_broadcast_message_tool(agent, recipient_agents))
 
     def _create_send_message_tool(self, agent: Agent, recipient_agents: List[Agent]):
         """
@@ -891,6 +917,18 @@ class Agency:
 
                 return message or ""
 
+            async def arun(self):
+                if outer_self.async_mode:
+                    return await asyncio.to_thread(self.run)
+
+                thread = outer_self.agents_and_threads[self.caller_agent.name][self.recipient.value]
+
+                message = await thread.aget_completion(message=self.message,
+                                                       message_files=self.message_files,
+                                                       additional_instructions=self.additional_instructions)
+
+                return message or ""
+
         SendMessage.caller_agent = agent
         if self.async_mode:
             SendMessage.__doc__ = self.send_message_tool_description_async
@@ -899,6 +937,133 @@ class Agency:
 
         return SendMessage
 
+    def _create_broadcast_message_tool(self, agent: Agent, recipient_agents: List[Agent]):
+        """
+        Creates a BroadcastMessage tool to enable an agent to send tasks to several recipient agents at once.
+
+        Tasks are sent concurrently over the threads between the agent and each recipient, and the tool waits for all
+        replies, at most `broadcast_timeout` seconds. A recipient that fails or doesn't answer in time gets an error in
+        its place in the output, without affecting the replies of the others. The runs of recipients that don't answer
+        in time are cancelled, so their threads are ready for the next message.
+
+        Parameters:
+            agent (Agent): The agent who will be sending messages.
+            recipient_agents (List[Agent]): A list of recipient agents who can receive messages.
+
+        Returns:
+            BroadcastMessage: A BroadcastMessage tool class configured for the given agent and its recipient agents.
+        """
+        recipient_names = [agent.name for agent in recipient_agents]
+        recipients = Enum("recipient", {name: name for name in recipient_names})
+
+        agent_descriptions = ""
+        for recipient_agent in recipient_agents:
+            if not recipient_agent.description:
+                continue
+            agent_descriptions += recipient_agent.name + ": "
+            agent_descriptions += recipient_agent.description + "\n"
+
+        outer_self = self
+
+        class Task(BaseModel):
+            recipient: recipients = Field(..., description=agent_descriptions)
+            message: Optional[str] = Field(default=None,
+                                           description="Task for this recipient. Leave empty to send the shared "
+                                                       "message.")
+            additional_instructions: Optional[str] = Field(default=None,
+                                                           description="Any additional instructions or clarifications "
+                                                                       "for this recipient.")
+
+        class BroadcastMessage(BaseTool):
+            """Use this tool to send tasks to several agents at the same time, when the tasks don't depend on each other. Each recipient works on its task in parallel, and you receive the responses of all recipients at once. You can send the same message to all recipients, or a separate task to each of them. Use 'SendMessage' instead if a task depends on the response to another one."""
+            my_primary_instructions: str = Field(...,
+                                                 description="Please repeat your primary instructions step-by-step, including both completed "
+                                                             "and the following next steps that you need to perfrom. Keep in mind, that the "
+                                                             "recipient agents do not have access to these instructions.")
+            message: Optional[str] = Field(default=None,
+                                           description="Task sent to every recipient that has no message of its own.")
+            tasks: List[Task] = Field(..., description="One entry per recipient agent. Each recipient can only be "
+                                                       "included once.")
+            one_call_at_a_time: bool = True
+
+            @model_validator(mode='after')
+            def validate_tasks(self):
+                if not self.tasks:
+                    raise ValueError("Add at least one task.")
+                names = [task.recipient.value for task in self.tasks]
+                duplicates = sorted({name for name in names if names.count(name) > 1})
+                if duplicates:
+                    raise ValueError(f"Each recipient can only be included once. Duplicate recipients: {duplicates}")
+                if not self.message and any(not task.message for task in self.tasks):
+                    raise ValueError("Provide a message for every task, or a shared message for all recipients.")
+                return self
+
+            def run(self):
+                threads = outer_self.agents_and_threads[self.caller_agent.name]
+
+                def send(task):
+                    message = threads[task.recipient.value].get_completion(
+                        message=task.message or self.message,
+                        additional_instructions=task.additional_instructions)
+                    return message or ""
+
+                # the replies of concurrent runs would interleave in a streaming event handler, so it isn't passed on
+                executor = ThreadPoolExecutor(max_workers=len(self.tasks))
+                futures = [executor.submit(contextvars.copy_context().run, send, task) for task in self.tasks]
+                done, not_done = wait(futures, timeout=outer_self.broadcast_timeout)
+                if not_done:
+                    # stop the runs that didn't answer in time, and the workers driving them, so the next message
+                    # to these recipients doesn't find an active run on their threads
+                    timed_out = [threads[task.recipient.value] for task, future in zip(self.tasks, futures)
+                                 if future not in done]
+                    for thread in timed_out:
+                        thread.cancel()
+                    wait(not_done, timeout=max(thread.cancel_timeout for thread in timed_out))
+                executor.shutdown(wait=False)
+
+                responses = []
+                for task, future in zip(self.tasks, futures):
+                    if future not in done:
+                        response = f"Error: No response within {outer_self.broadcast_timeout} seconds."
+                    elif future.exception():
+                        response = f"Error: {future.exception()}"
+                    else:
+                        response = future.result()
+                    responses.append(f"{task.recipient.value}:\n{response}")
+
+                return "\n\n".join(responses)
+
+            async def arun(self):
+                threads = outer_self.agents_and_threads[self.caller_agent.name]
+                coroutines = [threads[task.recipient.value].aget_completion(
+                    message=task.message or self.message,
+                    additional_instructions=task.additional_instructions) for task in self.tasks]
+                tasks = [asyncio.ensure_future(coroutine) for coroutine in coroutines]
+                done, pending = await asyncio.wait(tasks, timeout=outer_self.broadcast_timeout)
+                for task in pending:
+                    task.cancel()
+                if pending:
+                    await asyncio.gather(*pending, return_exceptions=True)
+                    # cancelling the tasks doesn't stop their runs on OpenAI, which would block the next message
+                    await asyncio.gather(*[threads[task.recipient.value].acancel()
+                                           for task, future in zip(self.tasks, tasks) if future in pending])
+
+                responses = []
+                for task, future in zip(self.tasks, tasks):
+                    if future in pending:
+                        response = f"Error: No response within {outer_self.broadcast_timeout} seconds."
+                    elif future.exception():
+                        response = f"Error: {future.exception()}"
+                    else:
+                        response = future.result() or ""
+                    responses.append(f"{task.recipient.value}:\n{response}")
+
+                return "\n\n".join(responses)
+
+        BroadcastMessage.caller_agent = agent
+
+        return BroadcastMessage
+
     def _create_get_response_tool(self, agent: Agent, recipient_agents: List[Agent]):
         """
         Creates a CheckStatus tool to enable an agent to check the status of a task with a specified recipient agent.
@@ -985,6 +1150,17 @@ class Agency:
         """
         return os.path.abspath(os.path.dirname(inspect.getfile(self.__class__)))
 
+    def shutdown(self, wait: bool = True):
+        """
+        Stops the worker pool the agency created for the 'threading' async mode, so its worker threads don't outlive
+        a server that shuts down. Messages that are still queued fail. Does nothing in the other modes.
+
+        Parameters:
+            wait (bool, optional): Whether to wait for the messages that are being processed. Defaults to True.
+        """
+        if self.worker_pool and self._owns_worker_pool:
+            self.worker_pool.shutdown(wait=wait)
+
     def delete(self):
         """
         This method deletes the agency and all its agents, cleaning up any files and vector stores associated with each agent.
@@ -993,7 +1169,6 @@ class Agency:
             agent.delete()
 
     def _init_gpu(self):
-        """Initialize GPU-related settings"""
-        if str(self.device) != 'cpu':
+        """Initialize GPU-related settings. The accelerator itself is only loaded once tensors are passed in."""
+        if self.use_gpu:
             optimize_memory()
-            console.print("GPU memory optimized")
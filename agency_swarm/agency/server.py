@@ -0,0 +1,238 @@
+import asyncio
+import hashlib
+import itertools
+import multiprocessing
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, Dict, List, Optional
+
+from agency_swarm.util.session_registry import SessionLockTimeout, SessionRegistry
+
+
+def _serve(index: int, agency_factory: Callable, registry_path: str, lock_timeout: Optional[float], requests, results):
+    """Runs in a worker process: creates the agency and answers the requests routed to this worker, one at a time."""
+    try:
+        agency = agency_factory()
+        registry = SessionRegistry(registry_path)
+    except Exception as e:
+        results.put((None, "failed", (index, f"{type(e).__name__}: {e}")))
+        return
+    results.put((None, "ready", index))
+
+    while True:
+        request = requests.get()
+        if request is None:
+            # stop the worker threads of the agency, so they don't keep the process alive
+            agency.shutdown()
+            break
+        request_id, session_id, kwargs = request
+        try:
+            if kwargs.get("recipient_agent"):
+                kwargs["recipient_agent"] = agency._get_agent_by_name(kwargs["recipient_agent"])
+            with registry.lock(session_id, timeout=lock_timeout):
+                agency.set_threads_store(registry.get_threads_store(session_id))
+                response = agency.get_completion(**kwargs)
+            results.put((request_id, "ok", response))
+        except Exception as e:
+            # exceptions of the OpenAI client can't always be pickled, so only their type and message are sent back
+            results.put((request_id, "error", (type(e).__name__, str(e))))
+
+
+class _Worker:
+    def __init__(self, index: int):
+        self.index = index
+        self.process = None
+        self.requests = None
+        self.pending: Dict[int, Future] = {}
+        self.completed = 0
+        self.restarts = 0
+
+
+class AgencyServer:
+    """
+    Serves an agency from several worker processes that share assistants and conversations.
+
+    Every worker creates its own agency with `agency_factory`, which must be picklable, for example a module level
+    function. Assistant ids are shared through the settings of the agency; use a settings path ending with `.db` so
+    the workers share them in SQLite. The thread ids of every session are stored in a `SessionRegistry`.
+
+    Requests of the same session are always routed to the same worker, and run under the lock of the session, so a
+    conversation never has two runs at the same time, even if several servers share the registry. Workers that exit
+    unexpectedly are restarted, their session locks are released and their pending requests fail.
+    """
+
+    def __init__(self, agency_factory: Callable, workers: int = 4, registry_path: str = "./sessions.db",
+                 lock_timeout: Optional[float] = 600, start_method: str = "spawn"):
+        self.agency_factory = agency_factory
+        self.registry_path = registry_path
+        self.lock_timeout = lock_timeout
+        self.context = multiprocessing.get_context(start_method)
+        self.workers = [_Worker(i) for i in range(workers)]
+        self.registry = None
+        self.results = None
+        self.lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self._ready = {}
+        self._listener = None
+        self._stopping = False
+        self._stopped = threading.Event()
+
+    def start(self, timeout: float = 120):
+        """Starts the worker processes and waits until all of them have created their agency."""
+        # create the tables before the workers start using them
+        self.registry = SessionRegistry(self.registry_path)
+        self.results = self.context.Queue()
+        for worker in self.workers:
+            self._start_worker(worker)
+        self._listener = threading.Thread(target=self._listen, name="agency-server", daemon=True)
+        self._listener.start()
+
+        deadline = time.time() + timeout
+        while True:
+            failed = [message for message in self._ready.values() if message is not True]
+            if failed:
+                self.shutdown()
+                raise Exception(f"Agency worker failed to start: {failed[0]}")
+            if len(self._ready) == len(self.workers):
+                return self
+            if time.time() > deadline:
+                self.shutdown()
+                raise TimeoutError(f"Agency workers did not start within {timeout} seconds.")
+            time.sleep(0.05)
+
+    def route(self, session_id: str) -> int:
+        """Returns the index of the worker that serves the session."""
+        digest = hashlib.sha1(session_id.encode()).digest()
+        return int.from_bytes(digest[:8], "big") % len(self.workers)
+
+    def submit(self, session_id: str, message: str, recipient_agent: str = None, **kwargs) -> Future:
+        """
+        Sends a message to the agency in the session and returns a future of the response. `recipient_agent` is the
+        name of the agent, other keyword arguments are passed to `Agency.get_completion`.
+        """
+        future = Future()
+        worker = self.workers[self.route(session_id)]
+        if isinstance(self._ready.get(worker.index), str):
+            future.set_exception(Exception(f"Agency worker failed to start: {self._ready[worker.index]}"))
+            return future
+        with self.lock:
+            request_id = next(self._ids)
+            worker.pending[request_id] = future
+            worker.requests.put((request_id, session_id,
+                                 {"message": message, "recipient_agent": recipient_agent, **kwargs}))
+        return future
+
+    def get_completion(self, session_id: str, message: str, timeout: float = None, **kwargs) -> str:
+        return self.submit(session_id, message, **kwargs).result(timeout)
+
+    async def aget_completion(self, session_id: str, message: str, **kwargs) -> str:
+        return await asyncio.wrap_future(self.submit(session_id, message, **kwargs))
+
+    def get_stats(self) -> List[dict]:
+        with self.lock:
+            return [{
+                "worker": worker.index,
+                "pid": worker.process.pid if worker.process else None,
+                "pending": len(worker.pending),
+                "completed": worker.completed,
+                "restarts": worker.restarts,
+            } for worker in self.workers]
+
+    def shutdown(self, timeout: float = 10):
+        """Lets the workers finish the requests they already received, then stops them."""
+        self._stopping = True
+        for worker in self.workers:
+            if worker.process and worker.process.is_alive():
+                worker.requests.put(None)
+        for worker in self.workers:
+            if worker.process:
+                worker.process.join(timeout)
+                if worker.process.is_alive():
+                    worker.process.terminate()
+        # the listener reads the remaining results before it stops
+        self._stopped.set()
+        if self._listener:
+            self._listener.join()
+        for worker in self.workers:
+            self._fail_pending(worker, "The agency server was shut down.")
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.shutdown()
+
+    def _start_worker(self, worker: _Worker):
+        worker.requests = self.context.Queue()
+        worker.process = self.context.Process(
+            target=_serve, name=f"agency-worker-{worker.index}", daemon=True,
+            args=(worker.index, self.agency_factory, self.registry_path, self.lock_timeout, worker.requests,
+                  self.results))
+        worker.process.start()
+
+    def _listen(self):
+        while True:
+            try:
+                request_id, status, value = self.results.get(timeout=0.2)
+            except queue.Empty:
+                if self._stopped.is_set():
+                    break
+                self._check_workers()
+                continue
+
+            if status == "ready":
+                self._ready[value] = True
+                continue
+            if status == "failed":
+                self._ready[value[0]] = value[1]
+                self._fail_pending(self.workers[value[0]], f"Agency worker failed to start: {value[1]}")
+                continue
+
+            with self.lock:
+                future = None
+                for worker in self.workers:
+                    future = worker.pending.pop(request_id, None)
+                    if future:
+                        worker.completed += 1
+                        break
+            if future is None:
+                continue
+            if status == "ok":
+                future.set_result(value)
+            elif value[0] == SessionLockTimeout.__name__:
+                future.set_exception(SessionLockTimeout(value[1]))
+            else:
+                future.set_exception(Exception(f"{value[0]}: {value[1]}"))
+
+    def _check_workers(self):
+        for worker in self.workers:
+            if self._stopping or worker.process.is_alive() or self._ready.get(worker.index) is not True:
+                continue
+            print(f"Warning: Agency worker {worker.index} exited with code {worker.process.exitcode}, restarting it.")
+            # restart under the lock, so no request is sent to the queue of the dead worker in the meantime
+            with self.lock:
+                pending = self._take_pending(worker)
+                self.registry.release_process(worker.process.pid)
+                worker.restarts += 1
+                self._ready.pop(worker.index, None)
+                self._start_worker(worker)
+            self._fail(pending, f"Agency worker {worker.index} exited unexpectedly.")
+
+    def _fail_pending(self, worker: _Worker, message: str):
+        with self.lock:
+            pending = self._take_pending(worker)
+        self._fail(pending, message)
+
+    @staticmethod
+    def _take_pending(worker: _Worker) -> List[Future]:
+        pending = list(worker.pending.values())
+        worker.pending.clear()
+        return pending
+
+    @staticmethod
+    def _fail(futures: List[Future], message: str):
+        for future in futures:
+            if not future.done():
+                future.set_exception(Exception(message))
@@ -1,23 +1,27 @@
 import copy
+import hashlib
 import inspect
 import json
 import os
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, Union, Any, Type, Literal, TypedDict, Optional
 from typing import List
 
 from deepdiff import DeepDiff
 from openai import NotFoundError
+from openai.types.beta import Assistant
 from openai.types.beta.assistant import ToolResources
 
 from agency_swarm.tools import BaseTool, ToolFactory, Retrieval
 from agency_swarm.tools import FileSearch, CodeInterpreter
+from agency_swarm.util.file_cache import get_file_cache
+from agency_swarm.util.model_router import ModelRouter
 from agency_swarm.util.oai import get_openai_client
-from agency_swarm.util.openapi import validate_openapi_spec
+from agency_swarm.util.retry_policy import RetryPolicy
+from agency_swarm.util.settings_store import get_settings_store
+from agency_swarm.util.token_budget import TokenBudget
+from agency_swarm.util.vector_store_sync import VectorStoreSync, list_vector_store_file_ids
 from agency_swarm.util.gpu_utils import get_device, move_to_device, optimize_memory
-import torch
-
-# Initialize GPU device
-device = get_device()
 
 class ExampleMessage(TypedDict):
     role: Literal["user", "assistant"]
@@ -51,9 +55,12 @@ class Agent():
             max_completion_tokens: int = None,
             truncation_strategy: dict = None,
             examples: List[ExampleMessage] = None,
+            token_budget: TokenBudget = None,
+            model_router: ModelRouter = None,
+            retry_policy: RetryPolicy = None,
             use_gpu: bool = True,
     ):
-        self.device = device if use_gpu else torch.device('cpu')
+        self.use_gpu = use_gpu
         # public attributes
         self.id = id
         self.name = name if name else self.__class__.__name__
@@ -77,12 +84,21 @@ class Agent():
         self.max_completion_tokens = max_completion_tokens
         self.truncation_strategy = truncation_strategy
         self.examples = examples
+        self.token_budget = token_budget
+        self.model_router = model_router
+        self.retry_policy = retry_policy
 
         self.settings_path = './settings.json'
+        self.settings_store = None
+        self.files_cache_path = './files_cache.json'
+        self.max_upload_workers = 8
+        self.max_load_workers = 8
 
         # private attributes
         self._assistant: Any = None
         self._shared_instructions = None
+        self._fingerprint = None
+        self._folder_file_ids = None
 
         # init methods
         self.client = get_openai_client()
@@ -97,9 +113,14 @@ class Agent():
         self._parse_schemas()
         self._parse_tools_folder()
 
-        if str(self.device) != 'cpu':
+        if self.use_gpu:
             optimize_memory()
 
+    @property
+    def device(self):
+        """Device used for tensors. Loads the accelerator backend on first access."""
+        return get_device() if self.use_gpu else "cpu"
+
     # --- OpenAI Assistant Methods ---
 
     def init_oai(self):
@@ -112,9 +133,6 @@ class Agent():
             self: Returns the agent instance for chaining methods or further processing.
         """
 
-        # check if settings.json exists
-        path = self.get_settings_path()
-
         # load assistant from id
         if self.id:
             self.assistant = self.client.beta.assistants.retrieve(self.id)
@@ -130,31 +148,39 @@ class Agent():
             self.metadata = self.assistant.metadata
             self.model = self.assistant.model
             self.tool_resources = self.assistant.tool_resources.model_dump()
+            self._sync_folder_files()
             # update assistant if parameters are different
             if not self._check_parameters(self.assistant.model_dump()):
                 self._update_assistant()
             return self
 
+        # fingerprint of the desired configuration, saved with the settings after the assistant is in sync
+        self._fingerprint = self._get_fingerprint()
+
         # load assistant from settings
-        if os.path.exists(path):
-            with open(path, 'r') as f:
-                settings = json.load(f)
-                # iterate settings and find the assistant with the same name
-                for assistant_settings in settings:
-                    if assistant_settings['name'] == self.name:
-                        try:
-                            self.assistant = self.client.beta.assistants.retrieve(assistant_settings['id'])
-                            self.id = assistant_settings['id']
-                            if self.assistant.tool_resources:
-                                self.tool_resources = self.assistant.tool_resources.model_dump()
-                            # update assistant if parameters are different
-                            if not self._check_parameters(self.assistant.model_dump()):
-                                print("Updating assistant... " + self.name)
-                                self._update_assistant()
-                            self._update_settings()
-                            return self
-                        except NotFoundError:
-                            continue
+        for assistant_settings in self.get_settings_store().get_by_name(self.name):
+            # nothing changed since the assistant was last synced, so skip the network entirely
+            if assistant_settings.get('fingerprint') == self._fingerprint:
+                self.assistant = Assistant.model_validate(
+                    {k: v for k, v in assistant_settings.items() if k != 'fingerprint'})
+                self.id = assistant_settings['id']
+                if self.assistant.tool_resources:
+                    self.tool_resources = self.assistant.tool_resources.model_dump()
+                return self
+            try:
+                self.assistant = self.client.beta.assistants.retrieve(assistant_settings['id'])
+                self.id = assistant_settings['id']
+                if self.assistant.tool_resources:
+                    self.tool_resources = self.assistant.tool_resources.model_dump()
+                self._sync_folder_files()
+                # update assistant if parameters are different
+                if not self._check_parameters(self.assistant.model_dump()):
+                    print("Updating assistant... " + self.name)
+                    self._update_assistant()
+                self._update_settings()
+                return self
+            except NotFoundError:
+                continue
 
         # create assistant if settings.json does not exist or assistant with the same name does not exist
         self.assistant = self.client.beta.assistants.create(
@@ -174,6 +200,7 @@ class Agent():
             self.tool_resources = self.assistant.tool_resources.model_dump()
 
         self.id = self.assistant.id
+        self._record_folder_files()
 
         self._save_settings()
 
@@ -210,16 +237,8 @@ class Agent():
         self._update_settings()
 
     def _upload_files(self):
-        def add_id_to_file(f_path, id):
-            """Add file id to file name"""
-            if os.path.isfile(f_path):
-                file_name, file_ext = os.path.splitext(f_path)
-                f_path_new = file_name + "_" + id + file_ext
-                os.rename(f_path, f_path_new)
-                return f_path_new
-
         def get_id_from_file(f_path):
-            """Get file id from file name"""
+            """Get file id from file name, for files renamed by older versions"""
             if os.path.isfile(f_path):
                 file_name, file_ext = os.path.splitext(f_path)
                 file_name = os.path.basename(file_name)
@@ -229,10 +248,20 @@ class Agent():
                 else:
                     return None
 
+        def upload_file(f_path):
+            print("Uploading new file... " + os.path.basename(f_path))
+            with open(f_path, 'rb') as f:
+                file_id = self.client.with_options(
+                    timeout=80 * 1000,
+                ).files.create(file=f, purpose="assistants").id
+            file_cache.add(f_path, file_id)
+            return file_id
+
         files_folders = self.files_folder if isinstance(self.files_folder, list) else [self.files_folder]
 
-        file_search_ids = []
-        code_interpreter_ids = []
+        file_cache = get_file_cache(self.files_cache_path)
+        file_paths = []
+        file_ids = {}
 
         for files_folder in files_folders:
             if isinstance(files_folder, str):
@@ -243,48 +272,64 @@ class Agent():
                     f_path = os.path.normpath(f_path)
 
                 if os.path.isdir(f_path):
-                    f_paths = os.listdir(f_path)
+                    f_paths = sorted(os.listdir(f_path))
 
                     f_paths = [f for f in f_paths if not f.startswith(".")]
 
-                    f_paths = [os.path.join(f_path, f) for f in f_paths]
-
-                    code_interpreter_file_extensions = [
-                        ".json",  # JSON
-                        ".csv",  # CSV
-                        ".xml",  # XML
-                        ".jpeg",  # JPEG
-                        ".jpg",  # JPEG
-                        ".gif",  # GIF
-                        ".png",  # PNG
-                        ".zip"  # ZIP
-                    ]
+                    f_paths = [os.path.join(f_path, f).strip() for f in f_paths]
 
                     for f_path in f_paths:
-                        file_ext = os.path.splitext(f_path)[1]
+                        if not os.path.isfile(f_path):
+                            continue
+                        file_paths.append(f_path)
 
-                        f_path = f_path.strip()
-                        file_id = get_id_from_file(f_path)
+                        file_id = file_cache.get_file_id(f_path)
+                        if not file_id:
+                            file_id = get_id_from_file(f_path)
+                            if file_id:
+                                file_cache.add(f_path, file_id)
                         if file_id:
                             print("File already uploaded. Skipping... " + os.path.basename(f_path))
-                        else:
-                            print("Uploading new file... " + os.path.basename(f_path))
-                            with open(f_path, 'rb') as f:
-                                file_id = self.client.with_options(
-                                    timeout=80 * 1000,
-                                ).files.create(file=f, purpose="assistants").id
-                                f.close()
-                            add_id_to_file(f_path, file_id)
-
-                        if file_ext in code_interpreter_file_extensions:
-                            code_interpreter_ids.append(file_id)
-                        else:
-                            file_search_ids.append(file_id)
+                            file_ids[f_path] = file_id
                 else:
                     print(f"Files folder '{f_path}' is not a directory. Skipping...", )
             else:
                 print("Files folder path must be a string or list of strings. Skipping... ", files_folder)
 
+        new_file_paths = [f_path for f_path in file_paths if f_path not in file_ids]
+        try:
+            if new_file_paths:
+                with ThreadPoolExecutor(max_workers=min(self.max_upload_workers, len(new_file_paths))) as executor:
+                    futures = [executor.submit(upload_file, f_path) for f_path in new_file_paths]
+                errors = [future.exception() for future in futures if future.exception()]
+                if errors:
+                    raise errors[0]
+                for f_path, future in zip(new_file_paths, futures):
+                    file_ids[f_path] = future.result()
+        finally:
+            # record the files that did upload, so they are not uploaded again if another one failed
+            file_cache.save()
+
+        code_interpreter_file_extensions = [
+            ".json",  # JSON
+            ".csv",  # CSV
+            ".xml",  # XML
+            ".jpeg",  # JPEG
+            ".jpg",  # JPEG
+            ".gif",  # GIF
+            ".png",  # PNG
+            ".zip"  # ZIP
+        ]
+
+        file_search_ids = []
+        code_interpreter_ids = []
+        for f_path in file_paths:
+            file_ext = os.path.splitext(f_path)[1]
+            if file_ext in code_interpreter_file_extensions:
+                code_interpreter_ids.append(file_ids[f_path])
+            else:
+                file_search_ids.append(file_ids[f_path])
+
         if FileSearch not in self.tools and file_search_ids:
             print("Detected files without FileSearch. Adding FileSearch tool...")
             self.add_tool(FileSearch)
@@ -292,9 +337,67 @@ class Agent():
             print("Detected files without FileSearch. Adding FileSearch tool...")
             self.add_tool(CodeInterpreter)
 
+        # removed files are only detached from the agent's own vector store, not from one passed in tool_resources
+        file_search = (self.tool_resources or {}).get('file_search') or {}
+        if self.files_folder:
+            self._folder_file_ids = {"code_interpreter": code_interpreter_ids}
+            if not file_search.get('vector_store_ids'):
+                self._folder_file_ids["file_search"] = file_search_ids
+
         self.add_file_ids(file_search_ids, "file_search")
         self.add_file_ids(code_interpreter_ids, "code_interpreter")
 
+    def _sync_folder_files(self):
+        """
+        Updates the files of an existing assistant to match the files folder. New and changed files are attached to
+        its vector store and code interpreter, and files removed from the folder are detached. Files attached in
+        other ways are kept, as the file manifest records which files were attached from the folder. Unchanged files
+        don't change the fingerprint, so in that case the assistant is loaded from the settings and this method is
+        not called at all.
+        """
+        if not self._folder_file_ids:
+            return
+        if self.tool_resources is None:
+            self.tool_resources = {}
+        file_cache = get_file_cache(self.files_cache_path)
+
+        code_interpreter_ids = self._folder_file_ids["code_interpreter"]
+        resource_id = f"{self.id}/code_interpreter"
+        previous_ids = set(file_cache.get_attached(resource_id))
+        current_ids = (self.tool_resources.get('code_interpreter') or {}).get('file_ids') or []
+        # keep the files attached in other ways, and replace the ones attached from the folder before
+        file_ids = [file_id for file_id in current_ids
+                    if file_id not in previous_ids or file_id in code_interpreter_ids]
+        file_ids += [file_id for file_id in code_interpreter_ids if file_id not in file_ids]
+        if file_ids != current_ids:
+            self.tool_resources['code_interpreter'] = {"file_ids": file_ids}
+        file_cache.set_attached(resource_id, code_interpreter_ids)
+
+        file_search_ids = self._folder_file_ids.get("file_search")
+        vector_store_ids = (self.tool_resources.get('file_search') or {}).get('vector_store_ids')
+        if file_search_ids is not None and not vector_store_ids and file_search_ids:
+            vector_store_ids = [self.client.beta.vector_stores.create(name=self.name).id]
+            self.tool_resources['file_search'] = {"vector_store_ids": vector_store_ids}
+        if file_search_ids is not None and vector_store_ids:
+            result = VectorStoreSync(self.client, vector_store_ids[0], max_workers=self.max_upload_workers).sync(
+                file_search_ids, managed_ids=file_cache.get_attached(vector_store_ids[0]))
+            file_cache.set_attached(vector_store_ids[0], file_search_ids)
+            if result["attached"] or result["detached"]:
+                print(f"Synced files of {self.name}: {len(result['attached'])} attached, "
+                      f"{len(result['detached'])} detached, {result['unchanged']} unchanged.")
+        file_cache.save()
+
+    def _record_folder_files(self):
+        """Records the files a new assistant was created with from the files folder, see `_sync_folder_files`."""
+        if not self._folder_file_ids:
+            return
+        file_cache = get_file_cache(self.files_cache_path)
+        file_cache.set_attached(f"{self.id}/code_interpreter", self._folder_file_ids["code_interpreter"])
+        vector_store_ids = ((self.tool_resources or {}).get('file_search') or {}).get('vector_store_ids')
+        if self._folder_file_ids.get("file_search") and vector_store_ids:
+            file_cache.set_attached(vector_store_ids[0], self._folder_file_ids["file_search"])
+        file_cache.save()
+
     # --- Tool Methods ---
 
     # TODO: fix 2 methods below
@@ -368,26 +471,7 @@ class Agent():
 
                     f_paths = [os.path.join(f_path, f) for f in f_paths]
 
-                    for f_path in f_paths:
-                        with open(f_path, 'r') as f:
-                            openapi_spec = f.read()
-                            f.close()
-                        try:
-                            validate_openapi_spec(openapi_spec)
-                        except Exception as e:
-                            print("Invalid OpenAPI schema: " + os.path.basename(f_path))
-                            raise e
-                        try:
-                            headers = None
-                            params = None
-                            if os.path.basename(f_path) in self.api_headers:
-                                headers = self.api_headers[os.path.basename(f_path)]
-                            if os.path.basename(f_path) in self.api_params:
-                                params = self.api_params[os.path.basename(f_path)]
-                            tools = ToolFactory.from_openapi_schema(openapi_spec, headers=headers, params=params)
-                        except Exception as e:
-                            print("Error parsing OpenAPI schema: " + os.path.basename(f_path))
-                            raise e
+                    for tools in self._load_files(self._load_schema, f_paths):
                         for tool in tools:
                             self.add_tool(tool)
                 else:
@@ -406,21 +490,42 @@ class Agent():
         if os.path.isdir(self.tools_folder):
             f_paths = os.listdir(self.tools_folder)
             f_paths = [f for f in f_paths if not f.startswith(".") and not f.startswith("__")]
-            f_paths = [os.path.join(self.tools_folder, f) for f in f_paths]
-            for f_path in f_paths:
-                if not f_path.endswith(".py"):
-                    continue
-                if os.path.isfile(f_path):
-                    try:
-                        tool = ToolFactory.from_file(f_path)
-                        self.add_tool(tool)
-                    except Exception as e:
-                        print(f"Error parsing tool file {os.path.basename(f_path)}: {e}. Skipping...")
-                else:
-                    print("Items in tools folder must be files. Skipping... ", f_path)
+            f_paths = [os.path.join(self.tools_folder, f) for f in f_paths if f.endswith(".py")]
+            for tool in self._load_files(self._load_tool, f_paths):
+                if tool:
+                    self.add_tool(tool)
         else:
             print("Tools folder path is not a directory. Skipping... ", self.tools_folder)
 
+    def _load_files(self, load, f_paths):
+        """Loads the files in parallel and returns the results in the order of the files."""
+        if len(f_paths) <= 1:
+            return [load(f_path) for f_path in f_paths]
+        with ThreadPoolExecutor(max_workers=min(self.max_load_workers, len(f_paths))) as executor:
+            return list(executor.map(load, f_paths))
+
+    def _load_schema(self, f_path):
+        file_name = os.path.basename(f_path)
+        try:
+            return ToolFactory.from_openapi_file(f_path, headers=self.api_headers.get(file_name),
+                                                 params=self.api_params.get(file_name))
+        except ValueError as e:
+            print("Invalid OpenAPI schema: " + file_name)
+            raise e
+        except Exception as e:
+            print("Error parsing OpenAPI schema: " + file_name)
+            raise e
+
+    def _load_tool(self, f_path):
+        if not os.path.isfile(f_path):
+            print("Items in tools folder must be files. Skipping... ", f_path)
+            return None
+        try:
+            return ToolFactory.from_file(f_path)
+        except Exception as e:
+            print(f"Error parsing tool file {os.path.basename(f_path)}: {e}. Skipping...")
+            return None
+
     def get_openapi_schema(self, url):
         """Get openapi schema that contains all tools from the agent as different api paths. Make sure to call this after agency has been initialized."""
         if self.assistant is None:
@@ -482,33 +587,39 @@ class Agent():
 
         return True
 
+    def _get_fingerprint(self):
+        """
+        Returns a hash of the agent's desired assistant configuration: instructions, tool schemas, model, resources
+        and other parameters. If it matches the fingerprint saved in the settings, the assistant is already up to date
+        and init_oai can skip retrieving and updating it.
+        """
+        config = {
+            "name": self.name,
+            "description": self.description,
+            "instructions": self.instructions,
+            "tools": sorted(json.dumps(tool, sort_keys=True, default=str) for tool in self.get_oai_tools()),
+            "tool_resources": self.tool_resources,
+            "temperature": self.temperature,
+            "top_p": self.top_p,
+            "response_format": self.response_format,
+            "metadata": self.metadata,
+            "model": self.model,
+        }
+        return hashlib.sha256(json.dumps(config, sort_keys=True, default=str).encode()).hexdigest()
+
+    def _get_assistant_settings(self):
+        assistant_settings = self.assistant.model_dump()
+        if self._fingerprint:
+            assistant_settings['fingerprint'] = self._fingerprint
+        return assistant_settings
+
     def _save_settings(self):
-        path = self.get_settings_path()
-        # check if settings.json exists
-        if not os.path.isfile(path):
-            with open(path, 'w') as f:
-                json.dump([self.assistant.model_dump()], f, indent=4)
-        else:
-            settings = []
-            with open(path, 'r') as f:
-                settings = json.load(f)
-                settings.append(self.assistant.model_dump())
-            with open(path, 'w') as f:
-                json.dump(settings, f, indent=4)
+        self.get_settings_store().save(self._get_assistant_settings())
 
     def _update_settings(self):
-        path = self.get_settings_path()
-        # check if settings.json exists
-        if os.path.isfile(path):
-            settings = []
-            with open(path, 'r') as f:
-                settings = json.load(f)
-                for i, assistant_settings in enumerate(settings):
-                    if assistant_settings['id'] == self.id:
-                        settings[i] = self.assistant.model_dump()
-                        break
-            with open(path, 'w') as f:
-                json.dump(settings, f, indent=4)
+        store = self.get_settings_store()
+        if store.get_by_id(self.id):
+            store.save(self._get_assistant_settings())
 
     # --- Helper Methods ---
 
@@ -529,7 +640,9 @@ class Agent():
                     "file_ids": file_ids
                 }
 
-            self.tool_resources[tool_resource]['file_ids'] = file_ids
+            existing_ids = self.tool_resources[tool_resource].get('file_ids') or []
+            self.tool_resources[tool_resource]['file_ids'] = existing_ids + [
+                file_id for file_id in file_ids if file_id not in existing_ids]
         elif tool_resource == "file_search":
             if FileSearch not in self.tools:
                 raise Exception("FileSearch tool not found in tools.")
@@ -547,16 +660,19 @@ class Agent():
                 }]
             else:
                 vector_store_id = self.tool_resources[tool_resource]['vector_store_ids'][0]
-                self.client.beta.vector_stores.file_batches.create(
-                    vector_store_id=vector_store_id,
-                    file_ids=file_ids
-                )
+                VectorStoreSync(self.client, vector_store_id, max_workers=self.max_upload_workers).add(file_ids)
         else:
             raise Exception("Invalid tool resource.")
 
     def get_settings_path(self):
         return self.settings_path
 
+    def get_settings_store(self):
+        """Returns the store for assistant settings. Defaults to the shared store for the agent's settings path."""
+        if self.settings_store:
+            return self.settings_store
+        return get_settings_store(self.get_settings_path())
+
     def _read_instructions(self):
         class_instructions_path = os.path.normpath(os.path.join(self.get_class_folder_path(), self.instructions))
         if os.path.isfile(class_instructions_path):
@@ -603,37 +719,31 @@ class Agent():
 
         file_ids = []
         if self.tool_resources.get('code_interpreter'):
-            file_ids = self.tool_resources['code_interpreter'].get('file_ids', [])
+            file_ids = list(self.tool_resources['code_interpreter'].get('file_ids') or [])
 
         if self.tool_resources.get('file_search'):
             file_search_vector_store_ids = self.tool_resources['file_search'].get('vector_store_ids', [])
             for vector_store_id in file_search_vector_store_ids:
-                files = self.client.beta.vector_stores.files.list(vector_store_id=vector_store_id, limit=100)
-                for file in files:
-                    file_ids.append(file.id)
+                file_ids += list_vector_store_file_ids(self.client, vector_store_id)
 
                 self.client.beta.vector_stores.delete(vector_store_id)
 
         for file_id in file_ids:
             self.client.files.delete(file_id)
 
+        file_cache = get_file_cache(self.files_cache_path)
+        file_cache.remove_file_ids(file_ids)
+        file_cache.set_attached(f"{self.id}/code_interpreter", [])
+        for vector_store_id in (self.tool_resources.get('file_search') or {}).get('vector_store_ids') or []:
+            file_cache.set_attached(vector_store_id, [])
+        file_cache.save()
+
     def _delete_assistant(self):
         self.client.beta.assistants.delete(self.id)
         self._delete_settings()
 
     def _delete_settings(self):
-        path = self.get_settings_path()
-        # check if settings.json exists
-        if os.path.isfile(path):
-            settings = []
-            with open(path, 'r') as f:
-                settings = json.load(f)
-                for i, assistant_settings in enumerate(settings):
-                    if assistant_settings['id'] == self.id:
-                        settings.pop(i)
-                        break
-            with open(path, 'w') as f:
-                json.dump(settings, f, indent=4)
+        self.get_settings_store().delete(self.id)
 
     @property
     def assistant(self):
@@ -660,12 +770,12 @@ class Agent():
         Returns:
             str: The validated response.
         """
-        if hasattr(message, 'to'):
-            message = move_to_device(message, self.device)
+        if self.use_gpu and hasattr(message, 'to'):
+            message = move_to_device(message)
             
         result = message
             
-        if str(self.device) != 'cpu':
+        if self.use_gpu:
             optimize_memory()
             
         return result
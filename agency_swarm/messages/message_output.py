@@ -1,3 +1,5 @@
+import time
+from functools import lru_cache
 from typing import Literal
 import hashlib
 from rich.markdown import Markdown
@@ -7,6 +9,20 @@ from rich.live import Live
 console = Console()
 live_display = Live()
 
+COLORS = ['green', 'yellow', 'blue', 'magenta', 'cyan', 'bright_white']
+
+EMOJIS = [
+    '🐶', '🐱', '🐭', '🐹', '🐰', '🦊',
+    '🐻', '🐼', '🐨', '🐯', '🦁', '🐮',
+    '🐷', '🐸', '🐵', '🐔', '🐧', '🐦',
+    '🐤']
+
+
+@lru_cache(maxsize=1024)
+def _hash_index(text: str, size: int) -> int:
+    return int(hashlib.md5(text.encode()).hexdigest(), 16) % size
+
+
 class MessageOutput:
     def __init__(self, msg_type: Literal["function", "function_output", "text", "system"], sender_name: str,
                  receiver_name: str, content):
@@ -22,15 +38,7 @@ class MessageOutput:
         if self.msg_type == "system":
             return "red"
 
-        combined_str = self.sender_name + self.receiver_name
-        encoded_str = combined_str.encode()
-        hash_obj = hashlib.md5(encoded_str)
-        hash_int = int(hash_obj.hexdigest(), 16)
-        colors = [
-            'green', 'yellow', 'blue', 'magenta', 'cyan', 'bright_white',
-        ]
-        color_index = hash_int % len(colors)
-        return colors[color_index]
+        return COLORS[_hash_index(self.sender_name + self.receiver_name, len(COLORS))]
 
     def cprint(self):
         console.rule()
@@ -83,26 +91,20 @@ class MessageOutput:
             return "🤵"
 
         # output emoji based on hash of sender name
-        encoded_str = sender_name.encode()
-        hash_obj = hashlib.md5(encoded_str)
-        hash_int = int(hash_obj.hexdigest(), 16)
-        emojis = [
-            '🐶', '🐱', '🐭', '🐹', '🐰', '🦊',
-            '🐻', '🐼', '🐨', '🐯', '🦁', '🐮',
-            '🐷', '🐸', '🐵', '🐔', '🐧', '🐦',
-            '🐤']
-
-        emoji_index = hash_int % len(emojis)
-
-        return emojis[emoji_index]
+        return EMOJIS[_hash_index(sender_name, len(EMOJIS))]
 
 
 class MessageOutputLive(MessageOutput):
     live_display = None
+    # minimum number of seconds between two renders of the markdown content
+    min_refresh_interval = 0.05
 
     def __init__(self, msg_type: Literal["function", "function_output", "text", "system"], sender_name: str,
                  receiver_name: str, content):
         super().__init__(msg_type, sender_name, receiver_name, content)
+        self.header_text = self.formatted_header
+        self.rendered_content = None
+        self.last_render = 0.0
         # Initialize Live display if not already done
         self.live_display = Live(vertical_overflow="visible")
         self.live_display.start()
@@ -110,20 +112,27 @@ class MessageOutputLive(MessageOutput):
         console.rule()
 
     def __del__(self):
+        # show the updates that were skipped since the last render
+        if self.rendered_content is not None and self.rendered_content != self.content:
+            self.render()
         self.live_display.stop()
         self.live_display = None
 
     def cprint_update(self, snapshot):
         """
-        Update the display with new snapshot content.
+        Update the display with new snapshot content. Renders at most once per `min_refresh_interval`, the latest
+        content is rendered when the message is done.
         """
         self.content = snapshot  # Update content with the latest snapshot
 
-        header_text = self.formatted_header
-        md_content = Markdown(self.content)
+        if self.rendered_content is None or time.monotonic() - self.last_render >= self.min_refresh_interval:
+            self.render()
 
+    def render(self):
         # Creating a group of renderables for the live display
-        render_group = Group(header_text, md_content)
+        render_group = Group(self.header_text, Markdown(self.content))
 
         # Update the Live display
         self.live_display.update(render_group)
+        self.rendered_content = self.content
+        self.last_render = time.monotonic()
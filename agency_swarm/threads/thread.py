@@ -1,9 +1,14 @@
+import asyncio
+import contextvars
 import inspect
 import json
 import time
-from typing import Literal, List, Optional
+from collections import Counter, OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Literal, List, Optional
 
-from openai import BadRequestError
+from openai import (APIConnectionError, APIStatusError, AsyncAssistantEventHandler, BadRequestError,
+                    InternalServerError, RateLimitError)
 from openai.types.beta import AssistantToolChoice
 from openai.types.beta.threads.message import Attachment
 from openai.types.beta.threads.run import TruncationStrategy
@@ -13,7 +18,25 @@ from agency_swarm.util.streaming import AgencyEventHandler
 from agency_swarm.agents import Agent
 from agency_swarm.messages import MessageOutput
 from agency_swarm.user import User
-from agency_swarm.util.oai import get_openai_client
+from agency_swarm.util.backoff import Backoff
+from agency_swarm.util.message_cache import get_message_cache
+from agency_swarm.util.oai import get_openai_client, get_async_openai_client
+from agency_swarm.util.retry_policy import RetryPolicy, TRANSIENT_ERRORS, get_retry_policy
+from agency_swarm.util.shared_state import use_shared_state
+from agency_swarm.util.token_budget import TokenCounter
+from agency_swarm.util.tool_cache import get_tool_cache
+from agency_swarm.util.tracing import TracingEventHandler, get_current_span, get_tracer
+
+# sent when a run expired while its tools were running, so the new run makes the same calls
+REPEAT_TOOL_CALLS_MESSAGE = "Please repeat the exact same function calls again in the same order."
+# sent when retrying a run that failed again with a server error, in case it stopped halfway through its answer
+CONTINUE_MESSAGE = "Continue."
+# statuses of a run that block new messages and runs on its thread
+ACTIVE_RUN_STATUSES = ("queued", "in_progress", "requires_action", "cancelling")
+
+
+class RunCancelledError(Exception):
+    """Raised by a completion that was stopped with `Thread.cancel`."""
 
 
 class Thread:
@@ -21,12 +44,41 @@ class Thread:
     thread = None
     run = None
     stream = None
+    # wait for runs over the streaming API, falling back to polling with backoff if streaming is unavailable
+    use_streaming: bool = True
+    # fixed interval of the old polling loop, used to estimate how many polls each hop saved
+    legacy_poll_interval: float = 0.5
+    # maximum number of independent tool calls from one run step executed at the same time
+    max_tool_workers: int = 8
+    # seconds `cancel` waits for the cancelled run to stop
+    cancel_timeout: float = 30.0
+    # token counters of the threads this thread was switched away from, kept to restore them when switched back
+    max_token_counters: int = 1000
 
-    def __init__(self, agent: Literal[Agent, User], recipient_agent: Agent):
+    def __init__(self, agent: Literal[Agent, User], recipient_agent: Agent,
+                 on_created: Callable[["Thread"], None] = None):
         self.agent = agent
         self.recipient_agent = recipient_agent
+        # called once a new thread has been created on OpenAI, so its id can be persisted
+        self.on_created = on_created
 
         self.client = get_openai_client()
+        self._async_client = None
+        self.message_cache = get_message_cache()
+        self.tool_cache = get_tool_cache()
+        # shared state of the agency, used by the tools of this thread instead of the default one
+        self.shared_state = None
+        # running token count of this thread, used to project the size and cost of each run before it is created
+        self.token_counter = TokenCounter()
+        self.token_counters: "OrderedDict[str, TokenCounter]" = OrderedDict()
+        self.last_projection = None
+        # name of the model router route that picked the model of the current run
+        self.last_route = None
+
+        self.hop_stats = deque(maxlen=100)
+        self.tool_call_stats = deque(maxlen=100)
+        # set by `cancel`, so the completion running on this thread stops instead of going on with its run
+        self.cancel_requested = False
 
     def init_thread(self):
         if self.id:
@@ -35,12 +87,44 @@ class Thread:
             self.thread = self.client.beta.threads.create()
             self.id = self.thread.id
 
+            if self.on_created:
+                self.on_created(self)
+
             if self.recipient_agent.examples:
                 for example in self.recipient_agent.examples:
                     self.client.beta.threads.messages.create(
                         thread_id=self.id,
                         **example,
                     )
+                    self.token_counter.add_message(example["role"], example["content"])
+
+    def switch_thread(self, thread_id: Optional[str]):
+        """
+        Points this thread at another OpenAI thread, for example of another session. The thread is retrieved, or
+        created if there is no id, on the next message. The token counter of the previous thread is kept aside and
+        restored when switching back to it, so threads of sessions that alternate keep their own counts and summary.
+        """
+        changed = thread_id != self.id
+        if changed and self.id:
+            self.token_counters[self.id] = self.token_counter
+            self.token_counters.move_to_end(self.id)
+            while len(self.token_counters) > self.max_token_counters:
+                self.token_counters.popitem(last=False)
+        self.id = thread_id
+        self.thread = None
+        self.run = None
+        if not changed:
+            return
+        self.last_projection = None
+        self.last_route = None
+        if thread_id in self.token_counters:
+            self.token_counter = self.token_counters.pop(thread_id)
+            return
+        self.token_counter = TokenCounter()
+        # examples are posted when a thread is created, so an existing thread already contains them
+        if thread_id and self.recipient_agent.examples:
+            for example in self.recipient_agent.examples:
+                self.token_counter.add_message(example["role"], example["content"])
 
     def get_completion_stream(self,
                               message: str,
@@ -70,21 +154,26 @@ class Thread:
                        tool_choice: AssistantToolChoice = None,
                        yield_messages: bool = False
                        ):
+        with self._start_hop_span(recipient_agent):
+            return self._get_completion(message, message_files, attachments, recipient_agent,
+                                        additional_instructions, event_handler, tool_choice, yield_messages)
+
+    def _get_completion(self,
+                        message: str,
+                        message_files: List[str] = None,
+                        attachments: Optional[List[dict]] = None,
+                        recipient_agent=None,
+                        additional_instructions: str = None,
+                        event_handler: type(AgencyEventHandler) = None,
+                        tool_choice: AssistantToolChoice = None,
+                        yield_messages: bool = False
+                        ):
         if yield_messages:
             # warn that it is deprecated
             print("Warning: yield_messages is deprecated. Use get_completion_stream instead.")
 
-        if message_files:
-            recipient_tools = []
-
-            if FileSearch in self.recipient_agent.tools:
-                recipient_tools.append({"type": "file_search"})
-            if CodeInterpreter in self.recipient_agent.tools:
-                recipient_tools.append({"type": "code_interpreter"})
-
-            for file_id in message_files:
-                attachments.append({"file_id": file_id,
-                                    "tools": recipient_tools or [{"type": "file_search"}]})
+        self.cancel_requested = False
+        attachments = self._get_attachments(message_files, attachments)
 
         if not self.thread:
             self.init_thread()
@@ -96,182 +185,554 @@ class Thread:
             event_handler.agent_name = self.agent.name
             event_handler.recipient_agent_name = recipient_agent.name
 
-        # Determine the sender's name based on the agent type
-        sender_name = "user" if isinstance(self.agent, User) else self.agent.name
-        playground_url = f'https://platform.openai.com/playground?assistant={recipient_agent.assistant.id}&mode=assistant&thread={self.thread.id}'
-        print(f'THREAD:[ {sender_name} -> {recipient_agent.name} ]: URL {playground_url}')
+        self._print_thread_url(recipient_agent)
 
         # send message
-        self.client.beta.threads.messages.create(
-            thread_id=self.thread.id,
-            role="user",
-            content=message,
-            attachments=attachments
-        )
+        self._post_message(message, attachments=attachments)
 
         self._create_run(recipient_agent, additional_instructions, event_handler, tool_choice)
 
-        error_attempts = 0
-        validation_attempts = 0
+        retry_policy = self._get_retry_policy(recipient_agent)
+        retries = Counter()
         full_message = ""
         while True:
             self._run_until_done()
+            action = self._get_run_action()
 
             # function execution
-            if self.run.status == "requires_action":
+            if action == "submit_tool_outputs":
                 tool_calls = self.run.required_action.submit_tool_outputs.tool_calls
-                tool_outputs = []
-                tool_names = []
-                for tool_call in tool_calls:
-                    output = self.execute_tool(tool_call, recipient_agent, event_handler, tool_names)
-                    if inspect.isgenerator(output):
-                        try:
-                            while True:
-                                item = next(output)
-                        except StopIteration as e:
-                            output = e.value
-                    if event_handler:
-                        event_handler.agent_name = self.agent.name
-                        event_handler.recipient_agent_name = recipient_agent.name
-
-                    tool_outputs.append({"tool_call_id": tool_call.id, "output": str(output)})
-                    tool_names.append(tool_call.function.name)
+                tool_outputs = self._execute_tool_calls(tool_calls, recipient_agent, event_handler)
 
                 # submit tool outputs
                 try:
-                    self._submit_tool_outputs(tool_outputs, event_handler)
+                    self._submit_tool_outputs(tool_outputs, event_handler, recipient_agent)
                 except BadRequestError as e:
-                    if 'Runs in status "expired"' in e.message:
-                        self.client.beta.threads.messages.create(
-                            thread_id=self.thread.id,
-                            role="user",
-                            content="Please repeat the exact same function calls again in the same order."
-                        )
+                    if not self._retry_expired_run(retry_policy, retries, e):
+                        raise e
+                    self._post_message(REPEAT_TOOL_CALLS_MESSAGE)
+                    self._create_run(recipient_agent, additional_instructions, event_handler, tool_choice,
+                                     reason="expired")
+                    self._run_until_done()
+                    self._submit_tool_outputs(self._match_tool_outputs(tool_outputs), event_handler,
+                                              recipient_agent)
+            # error
+            elif action == "retry":
+                full_message += self._add_response(self._get_last_message_text()) + "\n"
+                delay, continue_message = self._retry_failed_run(retry_policy, retries)
+                time.sleep(delay)
+                if continue_message:
+                    self._post_message(CONTINUE_MESSAGE)
+                self._create_run(recipient_agent, additional_instructions, event_handler, tool_choice, reason="retry")
+            # return assistant message
+            else:
+                full_message += self._add_response(self._get_last_message_text())
 
-                        self._create_run(recipient_agent, additional_instructions, event_handler, tool_choice)
+                error = self._validate_response(recipient_agent, retry_policy, retries, full_message)
+                if error is None:
+                    return full_message
 
-                        self._run_until_done()
+                message = self._post_message(error)
+                if event_handler:
+                    handler = event_handler()
+                    handler.on_message_created(message)
+                    handler.on_message_done(message)
+                self._create_run(recipient_agent, additional_instructions, event_handler, tool_choice,
+                                 reason="validation")
 
-                        if self.run.status != "requires_action":
-                            raise Exception("Run Failed. Error: ", self.run.last_error)
+    def _get_attachments(self, message_files, attachments):
+        """Adds the files of the message to its attachments, with the tools of the recipient that can read them."""
+        if not message_files:
+            return attachments
 
-                        # change tool call ids
-                        tool_calls = self.run.required_action.submit_tool_outputs.tool_calls
-                        for i, tool_call in enumerate(tool_calls):
-                            tool_outputs[i]["tool_call_id"] = tool_call.id
+        recipient_tools = []
+        if FileSearch in self.recipient_agent.tools:
+            recipient_tools.append({"type": "file_search"})
+        if CodeInterpreter in self.recipient_agent.tools:
+            recipient_tools.append({"type": "code_interpreter"})
 
-                        self._submit_tool_outputs(tool_outputs, event_handler)
-                    else:
-                        raise e
-            # error
-            elif self.run.status == "failed":
-                full_message += self._get_last_message_text() + "\n"
-                # retry run 2 times
-                if error_attempts < 1 and "something went wrong" in self.run.last_error.message.lower():
-                    time.sleep(1)
-                    self._create_run(recipient_agent, additional_instructions, event_handler, tool_choice)
-                    error_attempts += 1
-                elif 1 <= error_attempts < 5 and "something went wrong" in self.run.last_error.message.lower():
-                    self.client.beta.threads.messages.create(
-                        thread_id=self.thread.id,
-                        role="user",
-                        content="Continue."
-                    )
-                    self._create_run(recipient_agent, additional_instructions, event_handler, tool_choice)
-                    error_attempts += 1
-                else:
-                    raise Exception("OpenAI Run Failed. Error: ", self.run.last_error.message)
-            # return assistant message
-            else:
-                full_message += self._get_last_message_text()
+        attachments = attachments or []
+        for file_id in message_files:
+            attachments.append({"file_id": file_id,
+                                "tools": recipient_tools or [{"type": "file_search"}]})
+        return attachments
 
-                if recipient_agent.response_validator:
-                    try:
-                        if isinstance(recipient_agent, Agent):
-                            recipient_agent.response_validator(message=full_message)
-                    except Exception as e:
-                        if validation_attempts < recipient_agent.validation_attempts:
-                            message = self.client.beta.threads.messages.create(
-                                thread_id=self.thread.id,
-                                role="user",
-                                content=str(e),
-                            )
+    def _print_thread_url(self, recipient_agent):
+        # Determine the sender's name based on the agent type
+        sender_name = "user" if isinstance(self.agent, User) else self.agent.name
+        playground_url = f'https://platform.openai.com/playground?assistant={recipient_agent.assistant.id}&mode=assistant&thread={self.thread.id}'
+        print(f'THREAD:[ {sender_name} -> {recipient_agent.name} ]: URL {playground_url}')
 
-                            if event_handler:
-                                handler = event_handler()
-                                handler.on_message_created(message)
-                                handler.on_message_done(message)
+    def _post_message(self, content, attachments=None):
+        message = self.client.beta.threads.messages.create(
+            thread_id=self.thread.id,
+            role="user",
+            content=content,
+            attachments=attachments
+        )
+        self.token_counter.add_message("user", content)
+        return message
 
-                            validation_attempts += 1
+    def _add_response(self, text):
+        self.token_counter.add_message("assistant", text)
+        return text
 
-                            self._create_run(recipient_agent, additional_instructions, event_handler, tool_choice)
+    def _get_run_action(self) -> str:
+        """
+        Returns what the completion loop does next with the stopped run: "submit_tool_outputs", "retry" after a
+        failure, or "respond" with the assistant's message.
+        """
+        self._check_cancelled()
+        if self.run.status == "requires_action":
+            return "submit_tool_outputs"
+        if self.run.status == "failed":
+            return "retry"
+        return "respond"
 
-                            continue
+    def _check_cancelled(self):
+        if self.cancel_requested:
+            raise RunCancelledError(f"The completion on thread {self.id} was cancelled.")
 
-                return full_message
+    def cancel(self, timeout: float = None) -> bool:
+        """
+        Stops the completion running on this thread from another thread, for example after a timeout: it creates no
+        more runs and submits no more tool outputs, and its current run is cancelled on OpenAI. Waits for up to
+        `timeout` seconds, `cancel_timeout` by default, until the run has stopped, so that new messages can be added
+        to the thread. Returns whether it stopped in time.
+        """
+        self.cancel_requested = True
+        if not self.id:
+            return True
+        runs = self.client.beta.threads.runs.list(thread_id=self.id, limit=1).data
+        run = runs[0] if runs else None
+        if not run or run.status not in ACTIVE_RUN_STATUSES:
+            return True
+        if run.status != "cancelling":
+            try:
+                run = self.client.beta.threads.runs.cancel(thread_id=self.id, run_id=run.id)
+            except BadRequestError:
+                # the run stopped in the meantime
+                pass
 
-    def _create_run(self, recipient_agent, additional_instructions, event_handler, tool_choice):
-        if event_handler:
-            with self.client.beta.threads.runs.stream(
-                    thread_id=self.thread.id,
-                    event_handler=event_handler(),
-                    assistant_id=recipient_agent.id,
-                    additional_instructions=additional_instructions,
-                    tool_choice=tool_choice,
-                    max_prompt_tokens=recipient_agent.max_prompt_tokens,
-                    max_completion_tokens=recipient_agent.max_completion_tokens,
-                    truncation_strategy=recipient_agent.truncation_strategy,
-            ) as stream:
-                stream.until_done()
-                self.run = stream.get_final_run()
-        else:
-            self.run = self.client.beta.threads.runs.create_and_poll(
-                thread_id=self.thread.id,
-                assistant_id=recipient_agent.id,
-                additional_instructions=additional_instructions,
-                tool_choice=tool_choice,
-                max_prompt_tokens=recipient_agent.max_prompt_tokens,
-                max_completion_tokens=recipient_agent.max_completion_tokens,
-                truncation_strategy=recipient_agent.truncation_strategy,
-            )
+        deadline = time.time() + (timeout if timeout is not None else self.cancel_timeout)
+        backoff = Backoff()
+        while run.status in ACTIVE_RUN_STATUSES:
+            if time.time() >= deadline:
+                return False
+            time.sleep(backoff.next_delay())
+            run = self.client.beta.threads.runs.retrieve(thread_id=self.id, run_id=run.id)
+        return True
+
+    def _retry_expired_run(self, retry_policy, retries, error) -> bool:
+        """Returns whether a run that expired while its tools were running is created again."""
+        if retry_policy.classify(error) != "expired" or \
+                retry_policy.next_retry("expired", retries["expired"], error) is None:
+            return False
+        retries["expired"] += 1
+        self._trace_retry("expired", retries["expired"], error.message)
+        return True
+
+    def _match_tool_outputs(self, tool_outputs):
+        """Moves tool outputs over to the calls of the run created again after the previous one expired."""
+        if self.run.status != "requires_action":
+            raise Exception("Run Failed. Error: ", self.run.last_error)
+
+        tool_calls = self.run.required_action.submit_tool_outputs.tool_calls
+        for i, tool_call in enumerate(tool_calls):
+            tool_outputs[i]["tool_call_id"] = tool_call.id
+        return tool_outputs
+
+    def _retry_failed_run(self, retry_policy, retries):
+        """
+        Records the failure of the current run and returns the seconds to wait before creating it again, and whether
+        to ask the assistant to continue first. Raises if the run is not retried.
+        """
+        category = retry_policy.classify(self.run.last_error)
+        self._record_run_failure(retry_policy, category)
+        delay = retry_policy.next_retry(category, retries[category], self.run.last_error)
+        if delay is None:
+            raise Exception("OpenAI Run Failed. Error: ", self.run.last_error.message)
+        retries[category] += 1
+        self._trace_retry(category, retries[category], self.run.last_error.message, delay)
+        # the failed run may have stopped halfway through its answer
+        return delay, category == "server_error" and retries[category] > 1
+
+    def _validate_response(self, recipient_agent, retry_policy, retries, full_message) -> Optional[str]:
+        """Returns the error to send back to the assistant if its response is rejected and retried, otherwise None."""
+        if not recipient_agent.response_validator or not isinstance(recipient_agent, Agent):
+            return None
+        try:
+            recipient_agent.response_validator(message=full_message)
+        except Exception as e:
+            if retry_policy.next_retry("validation", retries["validation"], e,
+                                       max_attempts=recipient_agent.validation_attempts) is None:
+                return None
+            retries["validation"] += 1
+            self._trace_retry("validation", retries["validation"], str(e))
+            return str(e)
+        return None
+
+    def _create_run(self, recipient_agent, additional_instructions, event_handler, tool_choice, reason="message"):
+        self._check_cancelled()
+        params = self._get_run_params(recipient_agent, additional_instructions, tool_choice, reason)
+
+        retry_policy = self._get_retry_policy(recipient_agent)
+        # the retry policy is the only retry layer of run creation, so its circuit counts every failed request
+        client = self.client.with_options(max_retries=0)
+        attempts = 0
+        while True:
+            retry_policy.check_circuit(self.last_projection["model"])
+            try:
+                self._wait_for_run(recipient_agent, event_handler,
+                                   stream=lambda handler: client.beta.threads.runs.stream(event_handler=handler,
+                                                                                          **params),
+                                   create=lambda: client.beta.threads.runs.create(**params))
+                break
+            except (RateLimitError, InternalServerError, APIConnectionError) as e:
+                delay = self._get_api_retry_delay(retry_policy, e, attempts)
+                if delay is None:
+                    raise e
+                attempts += 1
+                time.sleep(delay)
+        self._observe_run(recipient_agent)
+
+    def _get_run_params(self, recipient_agent, additional_instructions, tool_choice, reason="message"):
+        """
+        Returns the parameters of a new run. If the agent has a model router, it picks the model of the run first.
+        The size, cost and latency of the run are then projected and stored in `last_projection`. If the projected
+        prompt exceeds the agent's token budget, a truncation strategy is chosen and, with the "summarize" strategy,
+        a summary of the cut off messages is added to the instructions.
+        """
+        model, route = recipient_agent.model, None
+        if recipient_agent.model_router:
+            model, route = recipient_agent.model_router.route(
+                recipient_agent, reason, self.token_counter.get_last_message_tokens("user"), tool_choice)
+        self.last_route = route
+
+        projection = self.token_counter.project(recipient_agent, additional_instructions, model)
+        truncation_strategy = recipient_agent.truncation_strategy
+        if recipient_agent.token_budget:
+            budget_strategy = self.token_counter.apply_budget(recipient_agent, projection)
+            if budget_strategy:
+                truncation_strategy = budget_strategy
+                summary = self.token_counter.get_summary_instructions()
+                if summary:
+                    additional_instructions = "\n\n".join(filter(None, [additional_instructions, summary]))
+        projection["truncated"] = bool(truncation_strategy)
+        self.last_projection = projection
+
+        span = get_current_span()
+        if span:
+            span.set_attributes(model=model, route=route, projected_prompt_tokens=projection["prompt_tokens"],
+                                projected_cost=projection["cost"], projected_latency=projection["latency"],
+                                over_budget=projection["over_budget"])
+
+        return dict(
+            thread_id=self.thread.id,
+            assistant_id=recipient_agent.id,
+            additional_instructions=additional_instructions,
+            tool_choice=tool_choice,
+            max_prompt_tokens=recipient_agent.max_prompt_tokens,
+            max_completion_tokens=recipient_agent.max_completion_tokens,
+            truncation_strategy=truncation_strategy,
+            # only sent when the router picked another model, so runs keep following the assistant's model otherwise
+            **({"model": model} if model != recipient_agent.model else {}),
+        )
+
+    def _observe_run(self, recipient_agent):
+        """
+        Records the token usage of a run created by this thread, and its latency on the route that picked its model.
+        Completed runs had no tool calls.
+        """
+        usage = getattr(self.run, "usage", None)
+        self.token_counter.observe(self.last_projection, usage, single_step=self.run.status == "completed")
+        if self.last_route:
+            recipient_agent.model_router.record(self.last_route, recipient_agent.name, self.last_projection["model"],
+                                                self.hop_stats[-1]["latency"], self.run.status, usage)
+        # failed runs are recorded by the completion loop, which also sees runs that fail after tool outputs
+        if self.run.status != "failed":
+            self._get_retry_policy(recipient_agent).record_success(self.last_projection["model"])
+
+    @staticmethod
+    def _get_retry_policy(recipient_agent) -> RetryPolicy:
+        return recipient_agent.retry_policy or get_retry_policy()
+
+    def _get_api_retry_delay(self, retry_policy, error, attempts):
+        """
+        Records a rate limit, server or connection error raised when creating a run, and returns the seconds to wait
+        before creating it again, or None to give up.
+        """
+        category = retry_policy.classify(error)
+        retry_policy.record_failure(self.last_projection["model"])
+        delay = retry_policy.next_retry(category, attempts, error)
+        if delay is not None:
+            self._trace_retry(category, attempts + 1, str(error), delay)
+        return delay
+
+    def _record_run_failure(self, retry_policy, category):
+        if category in TRANSIENT_ERRORS:
+            retry_policy.record_failure(self.last_projection["model"])
+
+    def project_run(self, recipient_agent=None, additional_instructions: str = None) -> dict:
+        """
+        Returns the projected prompt and completion tokens, cost in dollars and latency in seconds of the next run on
+        this thread, and whether it exceeds the recipient agent's token budget.
+        """
+        return self.token_counter.project(recipient_agent or self.recipient_agent, additional_instructions)
 
     def _run_until_done(self):
+        """Polls the current run with exponential backoff and jitter until it stops. Returns the number of polls."""
+        backoff = Backoff()
+        polls = 0
         while self.run.status in ['queued', 'in_progress', "cancelling"]:
-            time.sleep(0.5)
+            if self.cancel_requested and self.run.status != "cancelling":
+                # the run was created while the completion was being cancelled
+                try:
+                    self.run = self.client.beta.threads.runs.cancel(thread_id=self.thread.id, run_id=self.run.id)
+                except BadRequestError:
+                    pass
+            time.sleep(backoff.next_delay())
             self.run = self.client.beta.threads.runs.retrieve(
                 thread_id=self.thread.id,
                 run_id=self.run.id
             )
+            polls += 1
+        return polls
 
-    def _submit_tool_outputs(self, tool_outputs, event_handler):
-        if not event_handler:
-            self.run = self.client.beta.threads.runs.submit_tool_outputs_and_poll(
-                thread_id=self.thread.id,
-                run_id=self.run.id,
-                tool_outputs=tool_outputs
-            )
-        else:
-            with self.client.beta.threads.runs.submit_tool_outputs_stream(
-                    thread_id=self.thread.id,
-                    run_id=self.run.id,
-                    tool_outputs=tool_outputs,
-                    event_handler=event_handler()
-            ) as stream:
-                stream.until_done()
-                self.run = stream.get_final_run()
+    def _submit_tool_outputs(self, tool_outputs, event_handler, recipient_agent=None):
+        self._check_cancelled()
+        if not recipient_agent:
+            recipient_agent = self.recipient_agent
+
+        params = dict(
+            thread_id=self.thread.id,
+            run_id=self.run.id,
+            tool_outputs=tool_outputs
+        )
+
+        self._wait_for_run(recipient_agent, event_handler,
+                           stream=lambda handler: self.client.beta.threads.runs.submit_tool_outputs_stream(
+                               event_handler=handler, **params),
+                           create=lambda: self.client.beta.threads.runs.submit_tool_outputs(**params))
+
+    def _wait_for_run(self, recipient_agent, event_handler, stream, create):
+        """
+        Starts a run (or resumes it with tool outputs) and blocks until it stops.
+
+        The run is streamed whenever possible, so the call returns as soon as the run finishes or requires action,
+        without any polling. If streaming is not available, the run is created normally and polled with exponential
+        backoff. Latency and poll counts for each hop are recorded in `hop_stats`.
+        """
+        with get_tracer().start_span("run", recipient=recipient_agent.name, thread_id=self.id):
+            start = time.time()
+            polls = 0
+            mode = "stream"
+
+            if event_handler or self.use_streaming:
+                handler = event_handler() if event_handler else TracingEventHandler()
+                try:
+                    with stream(handler) as s:
+                        s.until_done()
+                        self.run = s.get_final_run()
+                        try:
+                            messages = s.get_final_messages()
+                        except RuntimeError:
+                            messages = []
+                        self._cache_messages(messages)
+                except Exception as e:
+                    # API and connection errors before the run started are retried by the retry policy
+                    if event_handler or (not handler.current_run and isinstance(e, (APIStatusError,
+                                                                                     APIConnectionError))):
+                        raise e
+                    if handler.current_run:
+                        # stream broke after the run has started, so finish waiting by polling
+                        self.run = handler.current_run
+                    else:
+                        print(f"Warning: streaming is not available ({e}). Falling back to polling.")
+                        self.use_streaming = False
+                        self.run = create()
+                    polls = self._run_until_done()
+                    mode = "poll"
+            else:
+                self.run = create()
+                polls = self._run_until_done()
+                mode = "poll"
+
+            self._record_hop(recipient_agent, start, polls, mode)
+
+    def _record_hop(self, recipient_agent, start, polls, mode):
+        latency = time.time() - start
+        self.hop_stats.append({
+            "sender": self.agent.name,
+            "recipient": recipient_agent.name,
+            "run_id": self.run.id,
+            "status": self.run.status,
+            "mode": mode,
+            "latency": latency,
+            "polls": polls,
+            "polls_saved": max(int(latency / self.legacy_poll_interval) - polls, 0),
+        })
+
+        span = get_current_span()
+        if span:
+            span.set_attributes(run_id=self.run.id, status=self.run.status, mode=mode, polls=polls)
+            usage = getattr(self.run, "usage", None)
+            if usage:
+                span.set_attributes(prompt_tokens=usage.prompt_tokens, completion_tokens=usage.completion_tokens,
+                                    total_tokens=usage.total_tokens)
+            last_error = getattr(self.run, "last_error", None)
+            if last_error:
+                span.set_status("error", last_error.message)
+
+    def get_hop_stats(self):
+        """Returns the totals of the recorded hops: number of hops, total latency, polls made and polls saved."""
+        return {
+            "hops": len(self.hop_stats),
+            "latency": sum(hop["latency"] for hop in self.hop_stats),
+            "polls": sum(hop["polls"] for hop in self.hop_stats),
+            "polls_saved": sum(hop["polls_saved"] for hop in self.hop_stats),
+        }
+
+    def _start_hop_span(self, recipient_agent):
+        recipient_agent = recipient_agent or self.recipient_agent
+        return get_tracer().start_span("agent_hop",
+                                       sender="user" if isinstance(self.agent, User) else self.agent.name,
+                                       recipient=recipient_agent.name,
+                                       thread_id=self.id)
+
+    @staticmethod
+    def _trace_retry(reason, attempts=None, error=None, delay=None):
+        """Records a retry on the active hop span. Errors of failed runs are recorded on their run spans."""
+        span = get_current_span()
+        if span:
+            span.add_event("retry", reason=reason, error=error, delay=delay)
+            if attempts is not None:
+                span.set_attribute(reason, attempts)
 
     def _get_last_message_text(self):
+        text = self.message_cache.get_last_text(self.id, self.run.id) if self.run else None
+        if text is not None:
+            return text
+
         messages = self.client.beta.threads.messages.list(
             thread_id=self.id,
             limit=1
         )
+        self._cache_messages(messages.data)
 
         if len(messages.data) == 0 or len(messages.data[0].content) == 0:
             return ""
 
         return messages.data[0].content[0].text.value
 
+    def _cache_messages(self, messages):
+        for message in messages:
+            # messages of failed or cancelled runs may be incomplete
+            if getattr(message, "status", "completed") == "completed":
+                self.message_cache.add(message)
+
+    def _execute_tool_calls(self, tool_calls, recipient_agent, event_handler):
+        """
+        Executes all tool calls of a run step and returns the tool outputs in the same order as the calls.
+
+        Independent calls run concurrently in a bounded thread pool. Tools with `one_call_at_a_time` are executed one
+        by one in the current thread, while the pool works through the rest. Timings of each call are recorded in
+        `tool_call_stats`.
+        """
+        outputs = [None] * len(tool_calls)
+        parallel = []
+        sequential = []
+        for i, tool_call in enumerate(tool_calls):
+            tool_names = [call.function.name for call in tool_calls[:i]]
+            if self._is_one_call_at_a_time(tool_call, recipient_agent):
+                sequential.append((i, tool_call, tool_names))
+            else:
+                parallel.append((i, tool_call, tool_names))
+
+        def execute(i, tool_call, tool_names, is_parallel):
+            start = time.time()
+            with get_tracer().start_span("tool", tool=tool_call.function.name, tool_call_id=tool_call.id,
+                                         parallel=is_parallel) as span, use_shared_state(self.shared_state):
+                output = self.execute_tool(tool_call, recipient_agent, event_handler, tool_names)
+                if inspect.isgenerator(output):
+                    try:
+                        while True:
+                            item = next(output)
+                    except StopIteration as e:
+                        output = e.value
+                if isinstance(output, str) and output.startswith("Error:"):
+                    span.set_status("error", output)
+            self.tool_call_stats.append({
+                "tool": tool_call.function.name,
+                "tool_call_id": tool_call.id,
+                "duration": time.time() - start,
+                "parallel": is_parallel,
+            })
+            outputs[i] = output
+
+        if len(parallel) > 1 and self.max_tool_workers > 1:
+            with ThreadPoolExecutor(max_workers=min(self.max_tool_workers, len(parallel))) as executor:
+                # each call gets a copy of the current context, so its spans are nested under the current one
+                futures = [executor.submit(contextvars.copy_context().run, execute, *call, True) for call in parallel]
+                for call in sequential:
+                    execute(*call, False)
+                for future in futures:
+                    future.result()
+        else:
+            for call in sorted(parallel + sequential, key=lambda call: call[0]):
+                execute(*call, False)
+
+        if event_handler:
+            event_handler.agent_name = self.agent.name
+            event_handler.recipient_agent_name = recipient_agent.name
+
+        return [{"tool_call_id": tool_call.id, "output": str(output)} for tool_call, output in zip(tool_calls, outputs)]
+
+    @staticmethod
+    def _is_one_call_at_a_time(tool_call, recipient_agent):
+        func = next((func for func in recipient_agent.functions if func.__name__ == tool_call.function.name), None)
+        if not func or "one_call_at_a_time" not in func.model_fields:
+            return False
+        return bool(func.model_fields["one_call_at_a_time"].default)
+
     def execute_tool(self, tool_call, recipient_agent=None, event_handler=None, tool_names=[]):
+        func = self._init_tool(tool_call, recipient_agent, event_handler, tool_names)
+        if isinstance(func, str):
+            return func
+
+        key, hit, output = self._read_tool_cache(func)
+        if hit:
+            return output
+
+        try:
+            # get outputs from the tool
+            output = func.run()
+
+            # streaming tools return generators, which are consumed by the caller and can't be cached
+            if not inspect.isgenerator(output):
+                self._write_tool_cache(func, key, output)
+            return output
+        except Exception as e:
+            return self._format_tool_error(e)
+
+    def _read_tool_cache(self, func):
+        """Returns the cache key of a cacheable tool, whether its output is cached and the output."""
+        if not func.cacheable:
+            return None, False, None
+        key = self.tool_cache.get_key(func)
+        hit, output = self.tool_cache.get(key, tool_name=type(func).__name__)
+        span = get_current_span()
+        if span:
+            span.set_attribute("cache_hit", hit)
+        return key, hit, output
+
+    def _write_tool_cache(self, func, key, output):
+        if key is None or (isinstance(output, str) and output.startswith("Error:")):
+            return
+        self.tool_cache.set(key, output, ttl=func.cache_ttl, tool_name=type(func).__name__)
+
+    def _init_tool(self, tool_call, recipient_agent=None, event_handler=None, tool_names=[]):
+        """Validates the tool call arguments and returns the initialized tool, or an error message for the model."""
         if not recipient_agent:
             recipient_agent = self.recipient_agent
 
@@ -292,12 +753,315 @@ class Thread:
                     return f"Error: Function {tool_call.function.name} is already called. You can only call this function once at a time. Please wait for the previous call to finish before calling it again."
             func.caller_agent = recipient_agent
             func.event_handler = event_handler
-            # get outputs from the tool
-            output = func.run()
+            return func
+        except Exception as e:
+            return self._format_tool_error(e)
+
+    @staticmethod
+    def _format_tool_error(e):
+        error_message = f"Error: {e}"
+        if "For further information visit" in error_message:
+            error_message = error_message.split("For further information visit")[0]
+        return error_message
+
+    # --- Async Methods ---
+
+    @property
+    def async_client(self):
+        if self._async_client is None:
+            self._async_client = get_async_openai_client()
+        return self._async_client
+
+    async def ainit_thread(self):
+        if self.id:
+            self.thread = await self.async_client.beta.threads.retrieve(self.id)
+        else:
+            self.thread = await self.async_client.beta.threads.create()
+            self.id = self.thread.id
+
+            if self.on_created:
+                self.on_created(self)
+
+            if self.recipient_agent.examples:
+                for example in self.recipient_agent.examples:
+                    await self.async_client.beta.threads.messages.create(
+                        thread_id=self.id,
+                        **example,
+                    )
+                    self.token_counter.add_message(example["role"], example["content"])
+
+    async def aget_completion(self,
+                              message: str,
+                              message_files: List[str] = None,
+                              attachments: Optional[List[dict]] = None,
+                              recipient_agent=None,
+                              additional_instructions: str = None,
+                              tool_choice: AssistantToolChoice = None
+                              ):
+        """
+        Coroutine version of get_completion, built on the async OpenAI client. Many conversations can be driven
+        concurrently from a single event loop. Tools are awaited through their `arun` method if they define one,
+        otherwise their `run` method is executed in a worker thread. Streaming event handlers are not supported here.
+        """
+        with self._start_hop_span(recipient_agent):
+            return await self._aget_completion(message, message_files, attachments, recipient_agent,
+                                               additional_instructions, tool_choice)
+
+    async def _aget_completion(self,
+                               message: str,
+                               message_files: List[str] = None,
+                               attachments: Optional[List[dict]] = None,
+                               recipient_agent=None,
+                               additional_instructions: str = None,
+                               tool_choice: AssistantToolChoice = None
+                               ):
+        self.cancel_requested = False
+        attachments = self._get_attachments(message_files, attachments)
+
+        if not self.thread:
+            await self.ainit_thread()
+
+        if not recipient_agent:
+            recipient_agent = self.recipient_agent
+
+        self._print_thread_url(recipient_agent)
+
+        # send message
+        await self._apost_message(message, attachments=attachments)
+
+        await self._acreate_run(recipient_agent, additional_instructions, tool_choice)
+
+        retry_policy = self._get_retry_policy(recipient_agent)
+        retries = Counter()
+        full_message = ""
+        while True:
+            await self._arun_until_done()
+            action = self._get_run_action()
+
+            if action == "submit_tool_outputs":
+                tool_calls = self.run.required_action.submit_tool_outputs.tool_calls
+                tool_outputs = await self._aexecute_tool_calls(tool_calls, recipient_agent)
+                try:
+                    await self._asubmit_tool_outputs(tool_outputs, recipient_agent)
+                except BadRequestError as e:
+                    if not self._retry_expired_run(retry_policy, retries, e):
+                        raise e
+                    await self._apost_message(REPEAT_TOOL_CALLS_MESSAGE)
+                    await self._acreate_run(recipient_agent, additional_instructions, tool_choice, reason="expired")
+                    await self._arun_until_done()
+                    await self._asubmit_tool_outputs(self._match_tool_outputs(tool_outputs), recipient_agent)
+            elif action == "retry":
+                full_message += self._add_response(await self._aget_last_message_text()) + "\n"
+                delay, continue_message = self._retry_failed_run(retry_policy, retries)
+                await asyncio.sleep(delay)
+                if continue_message:
+                    await self._apost_message(CONTINUE_MESSAGE)
+                await self._acreate_run(recipient_agent, additional_instructions, tool_choice, reason="retry")
+            else:
+                full_message += self._add_response(await self._aget_last_message_text())
+
+                error = self._validate_response(recipient_agent, retry_policy, retries, full_message)
+                if error is None:
+                    return full_message
+
+                await self._apost_message(error)
+                await self._acreate_run(recipient_agent, additional_instructions, tool_choice, reason="validation")
+
+    async def _apost_message(self, content, attachments=None):
+        message = await self.async_client.beta.threads.messages.create(
+            thread_id=self.thread.id,
+            role="user",
+            content=content,
+            attachments=attachments
+        )
+        self.token_counter.add_message("user", content)
+        return message
+
+    async def _acreate_run(self, recipient_agent, additional_instructions, tool_choice, reason="message"):
+        self._check_cancelled()
+        if recipient_agent.token_budget and recipient_agent.token_budget.strategy == "summarize":
+            # summarizing calls the API, so keep it off the event loop
+            params = await asyncio.to_thread(self._get_run_params, recipient_agent, additional_instructions,
+                                             tool_choice, reason)
+        else:
+            params = self._get_run_params(recipient_agent, additional_instructions, tool_choice, reason)
+
+        retry_policy = self._get_retry_policy(recipient_agent)
+        client = self.async_client.with_options(max_retries=0)
+        attempts = 0
+        while True:
+            retry_policy.check_circuit(self.last_projection["model"])
+            try:
+                await self._await_run(recipient_agent,
+                                      stream=lambda handler: client.beta.threads.runs.stream(
+                                          event_handler=handler, **params),
+                                      create=lambda: client.beta.threads.runs.create(**params))
+                break
+            except (RateLimitError, InternalServerError, APIConnectionError) as e:
+                delay = self._get_api_retry_delay(retry_policy, e, attempts)
+                if delay is None:
+                    raise e
+                attempts += 1
+                await asyncio.sleep(delay)
+        self._observe_run(recipient_agent)
+
+    async def _asubmit_tool_outputs(self, tool_outputs, recipient_agent=None):
+        self._check_cancelled()
+        if not recipient_agent:
+            recipient_agent = self.recipient_agent
+
+        params = dict(
+            thread_id=self.thread.id,
+            run_id=self.run.id,
+            tool_outputs=tool_outputs
+        )
+
+        await self._await_run(recipient_agent,
+                              stream=lambda handler: self.async_client.beta.threads.runs.submit_tool_outputs_stream(
+                                  event_handler=handler, **params),
+                              create=lambda: self.async_client.beta.threads.runs.submit_tool_outputs(**params))
+
+    async def _await_run(self, recipient_agent, stream, create):
+        """Async counterpart of _wait_for_run."""
+        with get_tracer().start_span("run", recipient=recipient_agent.name, thread_id=self.id):
+            start = time.time()
+            polls = 0
+            mode = "stream"
+
+            if self.use_streaming:
+                handler = AsyncAssistantEventHandler()
+                try:
+                    async with stream(handler) as s:
+                        await s.until_done()
+                        self.run = await s.get_final_run()
+                        try:
+                            messages = await s.get_final_messages()
+                        except RuntimeError:
+                            messages = []
+                        self._cache_messages(messages)
+                except Exception as e:
+                    if not handler.current_run and isinstance(e, (APIStatusError, APIConnectionError)):
+                        raise e
+                    if handler.current_run:
+                        self.run = handler.current_run
+                    else:
+                        print(f"Warning: streaming is not available ({e}). Falling back to polling.")
+                        self.use_streaming = False
+                        self.run = await create()
+                    polls = await self._arun_until_done()
+                    mode = "poll"
+            else:
+                self.run = await create()
+                polls = await self._arun_until_done()
+                mode = "poll"
+
+            self._record_hop(recipient_agent, start, polls, mode)
+
+    async def acancel(self, timeout: float = None) -> bool:
+        """Async counterpart of cancel, for completions awaited with aget_completion."""
+        self.cancel_requested = True
+        if not self.id:
+            return True
+        runs = (await self.async_client.beta.threads.runs.list(thread_id=self.id, limit=1)).data
+        run = runs[0] if runs else None
+        if not run or run.status not in ACTIVE_RUN_STATUSES:
+            return True
+        if run.status != "cancelling":
+            try:
+                run = await self.async_client.beta.threads.runs.cancel(thread_id=self.id, run_id=run.id)
+            except BadRequestError:
+                pass
+
+        deadline = time.time() + (timeout if timeout is not None else self.cancel_timeout)
+        backoff = Backoff()
+        while run.status in ACTIVE_RUN_STATUSES:
+            if time.time() >= deadline:
+                return False
+            await asyncio.sleep(backoff.next_delay())
+            run = await self.async_client.beta.threads.runs.retrieve(thread_id=self.id, run_id=run.id)
+        return True
+
+    async def _arun_until_done(self):
+        backoff = Backoff()
+        polls = 0
+        while self.run.status in ['queued', 'in_progress', "cancelling"]:
+            await asyncio.sleep(backoff.next_delay())
+            self.run = await self.async_client.beta.threads.runs.retrieve(
+                thread_id=self.thread.id,
+                run_id=self.run.id
+            )
+            polls += 1
+        return polls
+
+    async def _aget_last_message_text(self):
+        text = self.message_cache.get_last_text(self.id, self.run.id) if self.run else None
+        if text is not None:
+            return text
+
+        messages = await self.async_client.beta.threads.messages.list(
+            thread_id=self.id,
+            limit=1
+        )
+        self._cache_messages(messages.data)
+
+        if len(messages.data) == 0 or len(messages.data[0].content) == 0:
+            return ""
+
+        return messages.data[0].content[0].text.value
+
+    async def _aexecute_tool_calls(self, tool_calls, recipient_agent):
+        """Async counterpart of _execute_tool_calls. Independent calls are gathered concurrently."""
+        semaphore = asyncio.Semaphore(self.max_tool_workers)
+        sequential_lock = asyncio.Lock()
+
+        async def execute(tool_call, tool_names, is_parallel):
+            start = time.time()
+            with get_tracer().start_span("tool", tool=tool_call.function.name, tool_call_id=tool_call.id,
+                                         parallel=is_parallel) as span, use_shared_state(self.shared_state):
+                output = await self.aexecute_tool(tool_call, recipient_agent, tool_names)
+                if isinstance(output, str) and output.startswith("Error:"):
+                    span.set_status("error", output)
+            self.tool_call_stats.append({
+                "tool": tool_call.function.name,
+                "tool_call_id": tool_call.id,
+                "duration": time.time() - start,
+                "parallel": is_parallel,
+            })
+            return {"tool_call_id": tool_call.id, "output": str(output)}
+
+        async def schedule(i, tool_call):
+            tool_names = [call.function.name for call in tool_calls[:i]]
+            if self._is_one_call_at_a_time(tool_call, recipient_agent):
+                async with sequential_lock:
+                    return await execute(tool_call, tool_names, False)
+            async with semaphore:
+                return await execute(tool_call, tool_names, len(tool_calls) > 1)
+
+        return list(await asyncio.gather(*[schedule(i, tool_call) for i, tool_call in enumerate(tool_calls)]))
+
+    async def aexecute_tool(self, tool_call, recipient_agent=None, tool_names=[]):
+        func = self._init_tool(tool_call, recipient_agent, None, tool_names)
+        if isinstance(func, str):
+            return func
+
+        key, hit, output = self._read_tool_cache(func)
+        if hit:
+            return output
+
+        try:
+            if inspect.iscoroutinefunction(getattr(func, "arun", None)):
+                output = await func.arun()
+            else:
+                output = await asyncio.to_thread(func.run)
+
+            if inspect.isgenerator(output):
+                try:
+                    while True:
+                        next(output)
+                except StopIteration as e:
+                    output = e.value
 
+            self._write_tool_cache(func, key, output)
             return output
         except Exception as e:
-            error_message = f"Error: {e}"
-            if "For further information visit" in error_message:
-                error_message = error_message.split("For further information visit")[0]
-            return error_message
+            return self._format_tool_error(e)
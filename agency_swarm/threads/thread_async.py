@@ -1,18 +1,27 @@
-import threading
-from typing import Literal, Optional, List
+from collections import deque
+from typing import Callable, Literal, Optional, List
 
 from openai.types.beta import AssistantToolChoice
 
 from agency_swarm.agents import Agent
 from agency_swarm.threads import Thread
 from agency_swarm.user import User
+from agency_swarm.util.worker_pool import QueueFullError, WorkerPool, get_worker_pool
 
 
 class ThreadAsync(Thread):
-    def __init__(self, agent: Literal[Agent, User], recipient_agent: Agent):
-        super().__init__(agent, recipient_agent)
-        self.pythread = None
+    def __init__(self, agent: Literal[Agent, User], recipient_agent: Agent,
+                 on_created: Callable[[Thread], None] = None):
+        super().__init__(agent, recipient_agent, on_created)
         self.response = None
+        # pool of the agency, set when the agency creates its threads; falls back to the shared pool
+        self.worker_pool: Optional[WorkerPool] = None
+        # messages sent to the recipient, as jobs of the worker pool
+        self.jobs = deque(maxlen=100)
+
+    @property
+    def pool(self) -> WorkerPool:
+        return self.worker_pool or get_worker_pool()
 
     def worker(self,
                message: str,
@@ -41,26 +50,40 @@ class ThreadAsync(Thread):
                              additional_instructions: str = None,
                              tool_choice: AssistantToolChoice = None,
                              ):
-        if self.pythread and self.pythread.is_alive():
-            return "System Notification: 'Agent is busy, so your message was not received. Please always use 'GetResponse' tool to check for status first, before using 'SendMessage' tool again for the same agent.'"
-        elif self.pythread and not self.pythread.is_alive():
-            self.pythread.join()
-            self.pythread = None
-            self.response = None
-
-        run = self.get_last_run()
+        # messages to a busy recipient are queued by the pool, so only runs started elsewhere make it busy
+        if not any(not job.done for job in self.jobs):
+            run = self.get_last_run()
 
-        if run and run.status in ['queued', 'in_progress', 'requires_action']:
-            return "System Notification: 'Agent is busy, so your message was not received. Please always use 'GetResponse' tool to check for status first, before using 'SendMessage' tool again for the same agent.'"
+            if run and run.status in ['queued', 'in_progress', 'requires_action']:
+                return "System Notification: 'Agent is busy, so your message was not received. Please always use 'GetResponse' tool to check for status first, before using 'SendMessage' tool again for the same agent.'"
 
-        self.pythread = threading.Thread(target=self.worker,
-                                         args=(message, message_files, attachments, recipient_agent, additional_instructions, tool_choice))
+        # messages to the same recipient are processed one at a time, in the order they were sent
+        try:
+            job = self.pool.submit(self.recipient_agent.name, self.worker, message, message_files, attachments,
+                                   recipient_agent, additional_instructions, tool_choice)
+        except QueueFullError:
+            return "System Notification: 'The agency is overloaded, so your message was not received. Please tell the user to try again later.'"
+        self.jobs.append(job)
 
-        self.pythread.start()
+        position = self.pool.get_position(job)
+        if position:
+            return f"System Notification: 'Agent is busy, so your message was queued at position {position}. It will be processed after the previous messages. Please notify the user that they can tell you to check the status later. You can do this with the 'GetResponse' tool, after you have been instructed to do so. Don't mention the tool itself to the user. "
 
         return "System Notification: 'Task has started. Please notify the user that they can tell you to check the status later. You can do this with the 'GetResponse' tool, after you have been instructed to do so. Don't mention the tool itself to the user. "
 
     def check_status(self, run=None):
+        if self.jobs:
+            job = self.jobs[-1]
+            position = self.pool.get_position(job)
+            if position:
+                return f"System Notification: 'Task is queued at position {position}, behind the previous messages to this agent. Please tell the user to wait and try again later.'"
+            if job.status == "queued":
+                return "System Notification: 'Task is queued and will start as soon as a worker is free. Please tell the user to wait and try again later.'"
+            if job.status == "running":
+                return "System Notification: 'Task is not completed yet. Please tell the user to wait and try again later.'"
+            if job.status == "failed":
+                return f"System Notification: 'Agent run failed with error: {job.error}. You may send another message with the 'SendMessage' tool.'"
+
         if not run:
             run = self.get_last_run()
 
@@ -74,19 +97,25 @@ class ThreadAsync(Thread):
         if run.status == "failed":
             return f"System Notification: 'Agent run failed with error: {run.last_error.message}. You may send another message with the 'SendMessage' tool.'"
 
-        messages = self.client.beta.threads.messages.list(
-            thread_id=self.id,
-            order="desc",
-        )
+        text = self.message_cache.get_last_text(self.id, run.id)
+        if text is None:
+            messages = self.client.beta.threads.messages.list(
+                thread_id=self.id,
+                order="desc",
+                limit=1,
+            )
+            self._cache_messages(messages.data)
+            text = messages.data[0].content[0].text.value
 
-        return f"""{self.recipient_agent.name}'s Response: '{messages.data[0].content[0].text.value}'"""
+        return f"""{self.recipient_agent.name}'s Response: '{text}'"""
 
     def get_last_run(self):
-        if not self.thread:
-            self.init_thread()
+        # threads are created on the first message, so there can't be any runs yet
+        if not self.id:
+            return None
 
         runs = self.client.beta.threads.runs.list(
-            thread_id=self.thread.id,
+            thread_id=self.id,
             order="desc",
         )
 
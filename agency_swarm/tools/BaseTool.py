@@ -1,3 +1,6 @@
+import copy
+import threading
+import weakref
 from abc import ABC, abstractmethod
 from typing import Optional, Any, ClassVar
 
@@ -5,26 +8,29 @@ from instructor import OpenAISchema
 
 from pydantic import Field
 
-class SharedState:
-    def __init__(self):
-        self.data = {}
+from agency_swarm.util.shared_state import ContextSharedState, SharedState
 
-    def set(self, key, value):
-        if not isinstance(key, str):
-            raise ValueError("Key must be a string")
-        self.data[key] = value
+# tool class -> (docstring, pydantic core schema, openai schema), see BaseTool.openai_schema
+_schema_cache = weakref.WeakKeyDictionary()
+_schema_cache_lock = threading.Lock()
 
-    def get(self, key, default=None):
-        if not isinstance(key, str):
-            raise ValueError("Key must be a string")
-        return self.data.get(key, default)
+
+def clear_schema_cache():
+    """Forgets the cached schemas of all tools."""
+    with _schema_cache_lock:
+        _schema_cache.clear()
 
 
 class BaseTool(OpenAISchema, ABC):
-    shared_state: ClassVar[SharedState] = SharedState()
+    # state of the agency the tool runs in, see agency_swarm.util.shared_state
+    shared_state: ClassVar[SharedState] = ContextSharedState()
     caller_agent: Any = None
     event_handler: Any = None
     one_call_at_a_time: bool = False
+    # repeated calls with the same arguments are answered from the tool cache, see agency_swarm.util.tool_cache
+    cacheable: ClassVar[bool] = False
+    # seconds a cached result stays valid, None to keep it until it is evicted
+    cache_ttl: ClassVar[Optional[float]] = None
 
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
@@ -34,6 +40,24 @@ class BaseTool(OpenAISchema, ABC):
     @classmethod
     @property
     def openai_schema(cls):
+        """
+        The function schema of the tool. Generated once per class and cached, since every agent using the tool needs
+        it several times during init. The cache entry is dropped when the docstring or the fields of the class change,
+        and each access returns a copy, so callers can modify it.
+        """
+        core_schema = cls.__dict__.get("__pydantic_core_schema__")
+        with _schema_cache_lock:
+            cached = _schema_cache.get(cls)
+        if cached and cached[0] == cls.__doc__ and cached[1] is core_schema:
+            return copy.deepcopy(cached[2])
+
+        schema = cls._generate_openai_schema()
+        with _schema_cache_lock:
+            _schema_cache[cls] = (cls.__doc__, core_schema, schema)
+        return copy.deepcopy(schema)
+
+    @classmethod
+    def _generate_openai_schema(cls):
         schema = super(BaseTool, cls).openai_schema
 
         properties = schema.get("parameters", {}).get("properties", {})
@@ -1,18 +1,43 @@
+import hashlib
 import importlib.util
 import inspect
 import json
 import os
 import sys
+import threading
 from importlib import import_module
-from typing import Any, Dict, List, Type, Union
+from typing import Any, Dict, List, Tuple, Type, Union
 
 import jsonref
-from jsonref import requests
-from pydantic import create_model, Field
+from pydantic import BaseModel, create_model, Field
 
 from .BaseTool import BaseTool
+from ..util.http import HTTPClientPool, get_http_pool
+from ..util.openapi import validate_openapi_spec
 from ..util.schema import reference_schema
 
+# hash of an openai schema -> pydantic model with its fields, shared by all tools created from the same schema
+_model_cache: Dict[str, Type[BaseModel]] = {}
+_model_cache_lock = threading.Lock()
+
+# absolute path of a tool file -> (modification time and size of the file, imported tool class)
+_file_cache: Dict[str, Tuple[Tuple[int, int], Type[BaseTool]]] = {}
+# (absolute path of a schema file, headers and params) -> (modification time and size of the file, tools)
+_schema_file_cache: Dict[Tuple[str, str], Tuple[Tuple[int, int], List[Type[BaseTool]]]] = {}
+_file_cache_lock = threading.Lock()
+
+
+def _get_file_version(file_path: str) -> Tuple[int, int]:
+    stat = os.stat(file_path)
+    return stat.st_mtime_ns, stat.st_size
+
+
+def clear_file_cache():
+    """Forgets all tool files and schema files loaded by ToolFactory, so they are imported and parsed again."""
+    with _file_cache_lock:
+        _file_cache.clear()
+        _schema_file_cache.clear()
+
 
 class ToolFactory:
 
@@ -70,13 +95,14 @@ class ToolFactory:
 
 
     @staticmethod
-    def from_openai_schema(schema: Dict[str, Any], callback: Any) -> Type[BaseTool]:
+    def from_openai_schema(schema: Dict[str, Any], callback: Any, async_callback: Any = None) -> Type[BaseTool]:
         """
         Converts an OpenAI schema into a BaseTool. Nested propoerties without refs are not supported yet.
 
         Parameters:
             schema: The OpenAI schema to convert.
             callback: The function to run when the tool is called.
+            async_callback: Optional coroutine function used as `arun` when the tool is called from an async thread.
 
         Returns:
             A BaseTool.
@@ -159,36 +185,54 @@ class ToolFactory:
 
         name = schema['name']
         description = schema['description']
-        properties = schema['parameters']['properties']
-        required_fields = schema['parameters'].get('required', [])
 
-        # Add definitions ($defs) to type_mapping
-        defs = {k: create_model(k, **create_fields(v['properties'], type_mapping, v.get('required', []), {})) for k, v
-                in schema['parameters'].get('$defs', {}).items()}
-        type_mapping.update(defs)
+        # models only depend on the schema, so agents loading the same tools don't build them again
+        key = hashlib.sha256(json.dumps(schema, sort_keys=True, default=str).encode()).hexdigest()
+        with _model_cache_lock:
+            model = _model_cache.get(key)
+
+        if model is None:
+            properties = schema['parameters']['properties']
+            required_fields = schema['parameters'].get('required', [])
+
+            # Add definitions ($defs) to type_mapping
+            defs = {k: create_model(k, **create_fields(v['properties'], type_mapping, v.get('required', []), {}))
+                    for k, v in schema['parameters'].get('$defs', {}).items()}
+            type_mapping.update(defs)
 
-        fields = create_fields(properties, type_mapping, required_fields, defs)
+            fields = create_fields(properties, type_mapping, required_fields, defs)
 
-        # Dynamically creating the Pydantic model
-        model = create_model(name, **fields)
+            # Dynamically creating the Pydantic model
+            model = create_model(name, **fields)
+            with _model_cache_lock:
+                _model_cache[key] = model
 
-        tool = type(name, (BaseTool, model), {
+        attributes = {
             "__doc__": description,
             "run": callback,
-        })
+        }
+        if async_callback:
+            attributes["arun"] = async_callback
+
+        tool = type(name, (BaseTool, model), attributes)
 
         return tool
 
     @staticmethod
-    def from_openapi_schema(schema: Union[str, dict], headers: Dict[str, str] = None, params: Dict[str, Any] = None) \
-            -> List[Type[BaseTool]]:
+    def from_openapi_schema(schema: Union[str, dict], headers: Dict[str, str] = None, params: Dict[str, Any] = None,
+                            http_pool: HTTPClientPool = None, cache_ttl: float = None) -> List[Type[BaseTool]]:
         """
         Converts an OpenAPI schema into a list of BaseTools.
 
+        Tools send their requests through a pooled HTTP client per server, so connections are reused between calls.
+        Each tool also gets an async `arun` method, used when the tool is called from an async thread.
+
         Parameters:
             schema: The OpenAPI schema to convert.
             headers: The headers to use for requests.
             params: The parameters to use for requests.
+            http_pool: The HTTP client pool to send requests with. Defaults to the shared pool from `get_http_pool`.
+            cache_ttl: If set, results of GET operations are cached for this many seconds, see `BaseTool.cacheable`.
 
         Returns:
             A list of BaseTools.
@@ -200,41 +244,47 @@ class ToolFactory:
             openapi_spec = jsonref.loads(schema)
         tools = []
         headers = headers or {}
+
+        def get_server_url():
+            # resolved when a tool is called, so schemas without servers can still be converted
+            try:
+                return openapi_spec["servers"][0]["url"]
+            except (KeyError, IndexError, TypeError):
+                raise ValueError("The OpenAPI schema has no server url, add one to its 'servers' to call its tools.")
+
+        def create_callbacks(path: str, method: str):
+            def prepare_request(tool):
+                url = get_server_url() + path
+                parameters = tool.model_dump().get('parameters', {})
+                # replace all parameters in url
+                for param, value in parameters.items():
+                    if "{" + str(param) + "}" in url:
+                        url = url.replace(f"{{{param}}}", str(value))
+                        parameters[param] = None
+                url = url.rstrip("/")
+                parameters = {k: v for k, v in parameters.items() if v is not None}
+                parameters = {**parameters, **params} if params else parameters
+                return url, {"params": parameters, "headers": headers,
+                             "json": tool.model_dump().get('requestBody', None)}
+
+            def callback(self):
+                url, kwargs = prepare_request(self)
+                endpoint = f"{method.upper()} {get_server_url()}{path}"
+                pool = http_pool or get_http_pool()
+                return pool.request(method.upper(), url, endpoint=endpoint, **kwargs).json()
+
+            async def async_callback(self):
+                url, kwargs = prepare_request(self)
+                endpoint = f"{method.upper()} {get_server_url()}{path}"
+                pool = http_pool or get_http_pool()
+                return (await pool.arequest(method.upper(), url, endpoint=endpoint, **kwargs)).json()
+
+            return callback, async_callback
+
         for path, methods in openapi_spec["paths"].items():
             for method, spec_with_ref in methods.items():
-                def callback(self):
-                    url = openapi_spec["servers"][0]["url"] + path
-                    parameters = self.model_dump().get('parameters', {})
-                    # replace all parameters in url
-                    for param, value in parameters.items():
-                        if "{" + str(param) + "}" in url:
-                            url = url.replace(f"{{{param}}}", str(value))
-                            parameters[param] = None
-                    url = url.rstrip("/")
-                    parameters = {k: v for k, v in parameters.items() if v is not None}
-                    parameters = {**parameters, **params} if params else parameters
-                    if method == "get":
-                        return requests.get(url, params=parameters, headers=headers,
-                                            json=self.model_dump().get('requestBody', None)
-                                            ).json()
-                    elif method == "post":
-                        return requests.post(url,
-                                             params=parameters,
-                                             json=self.model_dump().get('requestBody', None),
-                                             headers=headers
-                                             ).json()
-                    elif method == "put":
-                        return requests.put(url,
-                                            params=parameters,
-                                            json=self.model_dump().get('requestBody', None),
-                                            headers=headers
-                                            ).json()
-                    elif method == "delete":
-                        return requests.delete(url,
-                                               params=parameters,
-                                               json=self.model_dump().get('requestBody', None),
-                                               headers=headers
-                                               ).json()
+                # bind path and method now, otherwise every tool would call the last endpoint in the spec
+                callback, async_callback = create_callbacks(path, method)
 
                 # 1. Resolve JSON references.
                 spec = jsonref.replace_refs(spec_with_ref)
@@ -280,42 +330,106 @@ class ToolFactory:
                     "parameters": schema,
                 }
 
-                tools.append(ToolFactory.from_openai_schema(function, callback))
+                tool = ToolFactory.from_openai_schema(function, callback, async_callback)
+                if cache_ttl is not None and method.lower() == "get":
+                    tool.cacheable = True
+                    tool.cache_ttl = cache_ttl
+                tools.append(tool)
 
         return tools
 
+    @staticmethod
+    def from_openapi_file(file_path: str, headers: Dict[str, str] = None,
+                          params: Dict[str, Any] = None) -> List[Type[BaseTool]]:
+        """
+        Validates and converts an OpenAPI schema file into a list of BaseTools. The tools are cached per process, so
+        agents loading the same schema with the same headers and params share them, until the file changes.
+
+        Parameters:
+            file_path: The path to the OpenAPI schema file.
+            headers: The headers to use for the requests.
+            params: The parameters to use for the requests.
+
+        Returns:
+            A list of BaseTools.
+        """
+        file_path = os.path.abspath(file_path)
+        version = _get_file_version(file_path)
+        key = (file_path, json.dumps([headers, params], sort_keys=True, default=str))
+        with _file_cache_lock:
+            cached = _schema_file_cache.get(key)
+        if cached and cached[0] == version:
+            return list(cached[1])
+
+        with open(file_path, 'r') as f:
+            openapi_spec = f.read()
+        validate_openapi_spec(openapi_spec)
+        tools = ToolFactory.from_openapi_schema(openapi_spec, headers=headers, params=params)
+
+        with _file_cache_lock:
+            _schema_file_cache[key] = (version, tools)
+        return list(tools)
+
     @staticmethod
     def from_file(file_path: str) -> Type[BaseTool]:
         """Dynamically imports a BaseTool class from a Python file within a package structure.
 
+        The class is cached per process and imported again only when the file changes.
+
         Parameters:
             file_path: The file path to the Python file containing the BaseTool class.
 
         Returns:
             The imported BaseTool class.
         """
-        file_path = os.path.relpath(file_path)
-        # Normalize the file path to be absolute and extract components
-        directory, file_name = os.path.split(file_path)
-        import_path = os.path.splitext(file_path)[0].replace(os.sep, ".")
-        class_name = os.path.splitext(file_name)[0]
-
-        exec_globals = globals()
+        file_path = os.path.abspath(file_path)
+        version = _get_file_version(file_path)
+        with _file_cache_lock:
+            cached = _file_cache.get(file_path)
+        if cached and cached[0] == version:
+            return cached[1]
 
-        sys.path.append(os.getcwd())
+        class_name = os.path.splitext(os.path.basename(file_path))[0]
+        module = ToolFactory._import_file(file_path, reload=cached is not None)
 
-        exec(f"from {import_path} import {class_name}", exec_globals)
-
-        imported_class = exec_globals.get(class_name)
+        imported_class = getattr(module, class_name, None)
         if not imported_class:
-            raise ImportError(f"Could not import {class_name} from {import_path}")
+            raise ImportError(f"Could not import {class_name} from {module.__name__}")
 
         # Check if the imported class is a subclass of BaseTool
-        if not issubclass(imported_class, BaseTool):
+        if not inspect.isclass(imported_class) or not issubclass(imported_class, BaseTool):
             raise TypeError(f"Class {class_name} must be a subclass of BaseTool")
 
+        with _file_cache_lock:
+            _file_cache[file_path] = (version, imported_class)
         return imported_class
 
+    @staticmethod
+    def _import_file(file_path: str, reload: bool = False):
+        """
+        Imports the module of a file by its path relative to the working directory, so that relative imports within
+        the package keep working. Files outside of the working directory are loaded under a name derived from their
+        path.
+        """
+        import_path = os.path.splitext(os.path.relpath(file_path))[0].replace(os.sep, ".")
+        if all(part.isidentifier() for part in import_path.split(".")):
+            cwd = os.getcwd()
+            if cwd not in sys.path:
+                sys.path.append(cwd)
+            # the file may have been created after its folder was first searched
+            importlib.invalidate_caches()
+            module = import_module(import_path)
+            return importlib.reload(module) if reload else module
+
+        module_name = "agency_swarm_tool_" + hashlib.sha1(file_path.encode()).hexdigest()[:12]
+        spec = importlib.util.spec_from_file_location(module_name, file_path)
+        if spec is None:
+            raise ImportError(f"Could not import {file_path}")
+        module = importlib.util.module_from_spec(spec)
+        sys.modules[module_name] = module
+        spec.loader.exec_module(module)
+        return module
+
     @staticmethod
     def get_openapi_schema(tools: List[Type[BaseTool]], url: str, title="Agent Tools",
                            description="A collection of tools.") -> str:
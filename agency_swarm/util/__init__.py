@@ -1,3 +1,4 @@
 from .cli.create_agent_template import create_agent_template
 from .cli.import_agent import import_agent
-from .oai import set_openai_key, get_openai_client, set_openai_client
\ No newline at end of file
+from .oai import set_openai_key, get_openai_client, set_openai_client, get_async_openai_client, \
+    set_async_openai_client
\ No newline at end of file
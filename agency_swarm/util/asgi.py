@@ -0,0 +1,367 @@
+import asyncio
+import json
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+from urllib.parse import parse_qs
+
+from agency_swarm.util.event_bus import StreamEvent, StreamEventBus
+from agency_swarm.util.http import LatencyHistogram
+from agency_swarm.util.session_registry import SessionRegistry
+
+
+class _StreamRun:
+    """A completion running in the executor of the app, with the subscription its connection reads from."""
+
+    def __init__(self, app: "AgencyStreamApp", session_id: str, request: dict):
+        loop = asyncio.get_running_loop()
+        self.session_id = session_id
+        self.ready = asyncio.Event()
+
+        def notify():
+            try:
+                loop.call_soon_threadsafe(self.ready.set)
+            except RuntimeError:
+                # the event loop is already closed
+                pass
+
+        self.bus = StreamEventBus(app.max_delay, app.max_chars, app.max_queue_size)
+        self.subscription = self.bus.subscribe(notify=notify)
+        self.lock = threading.Lock()
+        # agency running the completion, set by the worker while it holds it
+        self.agency = None
+        self.cancelled = False
+        self.cancelling = None
+        self.future = loop.run_in_executor(app.executor, app._run_completion, self, request)
+
+    async def events(self, heartbeat: float):
+        """Yields the events of the completion, and None every `heartbeat` seconds without events."""
+        while True:
+            self.ready.clear()
+            events = self.subscription.get_batch(timeout=0)
+            if events:
+                for event in events:
+                    yield event
+                continue
+            if self.subscription.closed:
+                break
+            try:
+                await asyncio.wait_for(self.ready.wait(), heartbeat)
+            except asyncio.TimeoutError:
+                yield None
+
+        if self.subscription.overflowed:
+            yield StreamEvent("error", text="The client is reading too slowly, the stream was closed.")
+
+    def close(self):
+        self.subscription.close()
+
+    def cancel(self):
+        """Stops the completion, for example because its client disconnected, and cancels its runs on OpenAI."""
+        self.close()
+        with self.lock:
+            if self.cancelled:
+                return
+            self.cancelled = True
+            if self.agency is not None:
+                # cancelling waits for the runs to stop, so it runs in the background
+                self.cancelling = threading.Thread(target=self.agency.cancel, daemon=True)
+                self.cancelling.start()
+
+
+class AgencyStreamApp:
+    """
+    ASGI app that streams agency completions to clients as Server-Sent Events or WebSocket frames.
+
+    - `GET /stream?message=...` or `POST /stream` with a JSON body streams one completion as Server-Sent Events.
+    - `/ws` accepts WebSocket connections. Every JSON message sent by the client starts a completion, whose events
+      are sent back as JSON frames. Messages sent while a completion is streaming are handled after it.
+
+    Requests have a `message` and optional `recipient_agent` and `additional_instructions` fields. Events are
+    "message_start" (a message, tool call or tool output from `sender_name` to `receiver_name`), "delta",
+    "message_end", "error" and "end". Each connection reads from its own bounded subscription of a
+    `StreamEventBus`, so a slow client gets larger deltas and is disconnected once more than `max_queue_size`
+    events are waiting, without slowing down the completion.
+
+    Every connection is a conversation of its own, stored as a session of a `SessionRegistry`. Clients continue a
+    conversation by sending back the `x-session-id` header of the response as `session_id`, in the request of an
+    SSE stream or in the query string of a WebSocket. When a client disconnects, the runs of its completion are
+    cancelled. Completions of different sessions run at the same time on up to `max_workers` agencies created by
+    an agency factory; a single agency runs one completion at a time, other requests wait in order.
+    """
+
+    def __init__(self, agency, max_queue_size: int = 1000, max_delay: Optional[float] = 0.05,
+                 max_chars: int = 1024, heartbeat: float = 15.0, max_workers: int = 4,
+                 registry: SessionRegistry = None, lock_timeout: Optional[float] = 600):
+        """
+        Parameters:
+            agency: The agency to serve, or a function without arguments that creates one, called once per worker.
+            max_workers: Completions running at the same time, if `agency` is a function.
+            registry: Registry of the sessions. Defaults to one stored in `./sessions.db`.
+            lock_timeout: Seconds a request waits for another completion of its session to finish.
+        """
+        if callable(agency):
+            self.agency_factory = agency
+            self.agency = agency()
+        else:
+            self.agency_factory = None
+            self.agency = agency
+            # threads of an agency can't run two completions at the same time
+            max_workers = 1
+        self.max_queue_size = max_queue_size
+        self.max_delay = max_delay
+        self.max_chars = max_chars
+        self.heartbeat = heartbeat
+        self.registry = registry or SessionRegistry("./sessions.db")
+        self.lock_timeout = lock_timeout
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="agency-stream")
+        self.lock = threading.Lock()
+        # agencies not running a completion, there are never more than `max_workers`
+        self.agencies = [self.agency]
+        self.closed = False
+        self.first_token_latency = LatencyHistogram()
+        self.streams = 0
+        self.errors = 0
+        self.overflows = 0
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self._handle_lifespan(receive, send)
+            return
+
+        path = scope.get("path", "")
+        root_path = scope.get("root_path", "")
+        if root_path and path.startswith(root_path):
+            path = path[len(root_path):]
+        path = path.rstrip("/")
+
+        if scope["type"] == "websocket" and path == "/ws":
+            await self._handle_websocket(scope, receive, send)
+        elif scope["type"] == "websocket":
+            await send({"type": "websocket.close", "code": 1008})
+        elif path == "/stream":
+            await self._handle_sse(scope, receive, send)
+        else:
+            await self._send_json(send, 404, {"detail": "Not Found"})
+
+    def get_stats(self) -> dict:
+        return {
+            "streams": self.streams,
+            "errors": self.errors,
+            "overflows": self.overflows,
+            "first_token_latency": self.first_token_latency.snapshot(),
+        }
+
+    def _parse_request(self, params) -> dict:
+        if not isinstance(params, dict) or not params.get("message"):
+            raise ValueError("The request must have a 'message'.")
+
+        recipient_agent = params.get("recipient_agent") or None
+        if recipient_agent and recipient_agent not in [agent.name for agent in self.agency.main_recipients]:
+            raise ValueError(f"Unknown recipient agent '{recipient_agent}'.")
+
+        return {
+            "message": str(params["message"]),
+            "recipient_agent": recipient_agent,
+            "additional_instructions": params.get("additional_instructions"),
+        }
+
+    @staticmethod
+    def _get_session_id(params: dict) -> str:
+        return str(params.get("session_id") or uuid.uuid4().hex)
+
+    def _run_completion(self, run: _StreamRun, request: dict):
+        agency = None
+        try:
+            agency = self._acquire_agency()
+            with self.registry.lock(run.session_id, timeout=self.lock_timeout):
+                with run.lock:
+                    if run.cancelled:
+                        return
+                    run.agency = agency
+                try:
+                    agency.set_threads_store(self.registry.get_threads_store(run.session_id))
+                    recipient_agent = next((agent for agent in agency.main_recipients
+                                            if agent.name == request["recipient_agent"]), None)
+                    agency.get_completion_stream(event_handler=run.bus.create_event_handler(),
+                                                 **{**request, "recipient_agent": recipient_agent})
+                finally:
+                    with run.lock:
+                        run.agency = None
+                    # the agency is reused only once the runs of a cancelled completion have stopped
+                    if run.cancelling:
+                        run.cancelling.join()
+        except Exception as e:
+            if not run.cancelled:
+                self.errors += 1
+            run.bus.publish(StreamEvent("error", text=str(e)))
+        finally:
+            run.bus.close()
+            if agency is not None:
+                self._release_agency(agency)
+
+    def _acquire_agency(self):
+        with self.lock:
+            if self.agencies:
+                return self.agencies.pop()
+        return self.agency_factory()
+
+    def _release_agency(self, agency):
+        with self.lock:
+            if not self.closed:
+                self.agencies.append(agency)
+                return
+        agency.shutdown(wait=False)
+
+    def close(self):
+        """Stops the workers of the app and of its agencies. Completions that are running finish first."""
+        with self.lock:
+            self.closed = True
+            agencies, self.agencies = self.agencies, []
+        self.executor.shutdown(wait=False)
+        for agency in agencies:
+            agency.shutdown(wait=False)
+
+    def _stream(self, session_id: str, request: dict):
+        """Starts a completion and returns it, with an async iterator over its events that records the TTFT."""
+        run = _StreamRun(self, session_id, request)
+        self.streams += 1
+        started = time.perf_counter()
+
+        async def events():
+            first_token = True
+            async for event in run.events(self.heartbeat):
+                if first_token and event is not None and event.type == "delta":
+                    self.first_token_latency.observe(time.perf_counter() - started)
+                    first_token = False
+                if event is not None and event.type == "error" and run.subscription.overflowed:
+                    self.overflows += 1
+                yield event
+
+        return run, events()
+
+    async def _handle_sse(self, scope, receive, send):
+        try:
+            if scope["method"] == "GET":
+                params = {key: values[-1] for key, values in parse_qs(scope["query_string"].decode()).items()}
+            elif scope["method"] == "POST":
+                params = json.loads(await self._read_body(receive) or b"{}")
+            else:
+                await self._send_json(send, 405, {"detail": "Method Not Allowed"})
+                return
+            request = self._parse_request(params)
+        except ValueError as e:
+            await self._send_json(send, 400, {"detail": str(e)})
+            return
+        session_id = self._get_session_id(params)
+
+        await send({
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [
+                (b"content-type", b"text/event-stream"),
+                (b"cache-control", b"no-cache"),
+                # disable response buffering in nginx
+                (b"x-accel-buffering", b"no"),
+                (b"x-session-id", session_id.encode()),
+            ],
+        })
+
+        run, events = self._stream(session_id, request)
+
+        async def wait_for_disconnect():
+            while (await receive())["type"] != "http.disconnect":
+                pass
+            run.cancel()
+
+        watcher = asyncio.ensure_future(wait_for_disconnect())
+        try:
+            async for event in events:
+                if event is None:
+                    frame = b": keep-alive\n\n"
+                else:
+                    data = json.dumps({key: value for key, value in event.to_dict().items() if key != "type"})
+                    frame = f"event: {event.type}\ndata: {data}\n\n".encode()
+                await send({"type": "http.response.body", "body": frame, "more_body": True})
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+        finally:
+            watcher.cancel()
+            run.close()
+
+    async def _handle_websocket(self, scope, receive, send):
+        if (await receive())["type"] != "websocket.connect":
+            return
+        params = {key: values[-1] for key, values in parse_qs(scope.get("query_string", b"").decode()).items()}
+        session_id = self._get_session_id(params)
+        await send({"type": "websocket.accept", "headers": [(b"x-session-id", session_id.encode())]})
+
+        # messages received while a completion is streaming
+        pending = deque()
+        while True:
+            message = pending.popleft() if pending else await receive()
+            if message["type"] == "websocket.disconnect":
+                return
+            if message["type"] != "websocket.receive":
+                continue
+
+            try:
+                request = self._parse_request(json.loads(message.get("text") or message.get("bytes") or "null"))
+            except ValueError as e:
+                await send({"type": "websocket.send", "text": json.dumps({"type": "error", "text": str(e)})})
+                continue
+
+            run, events = self._stream(session_id, request)
+            disconnected = False
+
+            async def wait_for_disconnect():
+                nonlocal disconnected
+                while (message := await receive())["type"] != "websocket.disconnect":
+                    pending.append(message)
+                disconnected = True
+                run.cancel()
+
+            watcher = asyncio.ensure_future(wait_for_disconnect())
+            try:
+                async for event in events:
+                    frame = {"type": "ping"} if event is None else event.to_dict()
+                    await send({"type": "websocket.send", "text": json.dumps(frame)})
+            except Exception:
+                # the client went away while sending
+                run.cancel()
+                return
+            finally:
+                watcher.cancel()
+                run.close()
+
+            if disconnected:
+                return
+
+    async def _handle_lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                self.close()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    @staticmethod
+    async def _read_body(receive) -> bytes:
+        body = b""
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                return body
+            body += message.get("body", b"")
+            if not message.get("more_body"):
+                return body
+
+    @staticmethod
+    async def _send_json(send, status: int, content: dict):
+        await send({"type": "http.response.start", "status": status,
+                    "headers": [(b"content-type", b"application/json")]})
+        await send({"type": "http.response.body", "body": json.dumps(content).encode()})
@@ -0,0 +1,33 @@
+import random
+
+
+class Backoff:
+    """
+    Exponential backoff with jitter.
+
+    Each call to `next_delay` returns the number of seconds to wait before the next attempt. Delays start at
+    `initial` and grow by `multiplier` up to `maximum`. With jitter enabled, half of every delay is randomized so that
+    many threads waiting on the API don't retry in lockstep.
+    """
+
+    def __init__(self, initial: float = 0.1, maximum: float = 2.0, multiplier: float = 1.5, jitter: bool = True):
+        self.initial = initial
+        self.maximum = maximum
+        self.multiplier = multiplier
+        self.jitter = jitter
+        self.attempts = 0
+
+    def next_delay(self) -> float:
+        delay = self.get_delay(self.attempts)
+        self.attempts += 1
+        return delay
+
+    def get_delay(self, attempts: int) -> float:
+        """Returns the delay after the given number of attempts, without counting an attempt."""
+        delay = min(self.initial * (self.multiplier ** attempts), self.maximum)
+        if self.jitter:
+            delay = delay / 2 + random.uniform(0, delay / 2)
+        return delay
+
+    def reset(self):
+        self.attempts = 0
@@ -0,0 +1,324 @@
+import json
+import threading
+import time
+from collections import deque
+from typing import Callable, Deque, Dict, List, Optional
+
+from typing_extensions import override
+
+from agency_swarm.util.streaming import AgencyEventHandler
+
+
+class StreamEvent:
+    """
+    An event published on a `StreamEventBus`.
+
+    `type` is one of "message_start", "delta", "message_end", "error" or "end". Message events carry the id, type,
+    sender and receiver of the message they belong to, and `text` holds the initial content or the coalesced text of
+    a delta.
+    """
+    __slots__ = ("type", "message_id", "msg_type", "sender_name", "receiver_name", "text")
+
+    def __init__(self, type: str, message_id: int = None, msg_type: str = None, sender_name: str = None,
+                 receiver_name: str = None, text: str = ""):
+        self.type = type
+        self.message_id = message_id
+        self.msg_type = msg_type
+        self.sender_name = sender_name
+        self.receiver_name = receiver_name
+        self.text = text
+
+    def to_dict(self) -> dict:
+        return {name: getattr(self, name) for name in self.__slots__ if getattr(self, name) is not None}
+
+    def __repr__(self):
+        return f"StreamEvent({self.to_dict()!r})"
+
+
+class Subscription:
+    """
+    A subscriber of a `StreamEventBus`.
+
+    Without a callback, events wait in a queue until they are read with `get_batch` or by iterating over the
+    subscription. Deltas of the same message that are still waiting are merged, so a slow reader gets fewer, larger
+    deltas instead of a growing backlog. If more than `max_queue_size` events are still waiting, the subscription is
+    closed and `overflowed` is set. `notify` is called whenever events are waiting, for example to wake up an event
+    loop. With a callback, events are passed to it as soon as they are published.
+    """
+
+    def __init__(self, bus: "StreamEventBus", callback: Callable[[StreamEvent], None] = None,
+                 max_queue_size: int = 1000, notify: Callable[[], None] = None):
+        self.bus = bus
+        self.callback = callback
+        self.max_queue_size = max_queue_size
+        self.notify = notify
+        self.events: Deque[StreamEvent] = deque()
+        self.condition = threading.Condition()
+        self.closed = False
+        self.overflowed = False
+
+    def get_batch(self, timeout: float = None) -> List[StreamEvent]:
+        """
+        Returns all waiting events, waiting for at least one for up to `timeout` seconds. Returns an empty list on
+        timeout, or once the subscription is closed and all its events were read.
+        """
+        with self.condition:
+            if not self.events and not self.closed:
+                self.condition.wait(timeout)
+            events = list(self.events)
+            self.events.clear()
+            return events
+
+    def __iter__(self):
+        while True:
+            events = self.get_batch()
+            if not events:
+                return
+            yield from events
+
+    def close(self):
+        self.bus.unsubscribe(self)
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+        if self.notify:
+            self.notify()
+
+    def _put(self, event: StreamEvent):
+        if self.callback:
+            self.callback(event)
+            return
+
+        with self.condition:
+            if self.closed:
+                return
+            if event.type == "delta" and self.events:
+                last = self.events[-1]
+                if last.type == "delta" and last.message_id == event.message_id:
+                    # events are shared between subscribers, so the merged delta is a new one
+                    self.events[-1] = StreamEvent("delta", event.message_id, text=last.text + event.text)
+                    return
+            if len(self.events) >= self.max_queue_size:
+                self.overflowed = True
+                self.closed = True
+            else:
+                self.events.append(event)
+            self.condition.notify_all()
+        if self.notify:
+            self.notify()
+
+
+class _Buffer:
+    __slots__ = ("parts", "size", "started")
+
+    def __init__(self, started: float):
+        self.parts = []
+        self.size = 0
+        self.started = started
+
+
+class StreamEventBus:
+    """
+    Coalesces streamed text deltas and fans them out to any number of subscribers.
+
+    Deltas of a message are collected in a buffer and published as a single delta once the buffer holds `max_chars`
+    characters or its oldest delta is `max_delay` seconds old, so subscribers are woken up once per batch instead of
+    once per token. Starting or ending a message publishes its buffered text first, so every subscriber sees the
+    events of a message in order.
+    """
+
+    def __init__(self, max_delay: Optional[float] = 0.05, max_chars: int = 1024, max_queue_size: int = 1000):
+        self.max_delay = max_delay
+        self.max_chars = max_chars
+        self.max_queue_size = max_queue_size
+        # held while publishing, so events reach every subscriber in the same order
+        self.lock = threading.RLock()
+        self.subscriptions: List[Subscription] = []
+        self.buffers: Dict[int, _Buffer] = {}
+        self.closed = False
+        self.deltas = 0
+        self.batches = 0
+        self._next_id = 0
+        self._flusher: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    def subscribe(self, callback: Callable[[StreamEvent], None] = None, max_queue_size: int = None,
+                  notify: Callable[[], None] = None) -> Subscription:
+        subscription = Subscription(self, callback, max_queue_size or self.max_queue_size, notify)
+        with self.lock:
+            if self.closed:
+                subscription.closed = True
+            else:
+                self.subscriptions.append(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        with self.lock:
+            if subscription in self.subscriptions:
+                self.subscriptions.remove(subscription)
+
+    def start_message(self, msg_type: str, sender_name: str, receiver_name: str, content: str = "") -> int:
+        """Publishes the start of a new message and returns its id."""
+        with self.lock:
+            self._next_id += 1
+            self._publish(StreamEvent("message_start", self._next_id, msg_type, str(sender_name),
+                                      str(receiver_name), str(content)))
+            return self._next_id
+
+    def publish_delta(self, message_id: int, text: str):
+        if not text:
+            return
+        with self.lock:
+            buffer = self.buffers.get(message_id)
+            if buffer is None:
+                buffer = self.buffers[message_id] = _Buffer(time.monotonic())
+                self._start_flusher()
+            buffer.parts.append(text)
+            buffer.size += len(text)
+            self.deltas += 1
+            if buffer.size >= self.max_chars or \
+                    (self.max_delay is not None and time.monotonic() - buffer.started >= self.max_delay):
+                self._flush_buffer(message_id)
+
+    def publish(self, event: StreamEvent):
+        """Publishes an event as is, for example an "error" event."""
+        with self.lock:
+            self._publish(event)
+
+    def end_message(self, message_id: int):
+        with self.lock:
+            self._flush_buffer(message_id)
+            self._publish(StreamEvent("message_end", message_id))
+
+    def flush(self, max_age: float = 0):
+        """Publishes the buffered text of every message whose oldest delta is at least `max_age` seconds old."""
+        with self.lock:
+            now = time.monotonic()
+            for message_id, buffer in list(self.buffers.items()):
+                if now - buffer.started >= max_age:
+                    self._flush_buffer(message_id)
+
+    def close(self):
+        """Publishes all buffered text and an "end" event, then closes every subscription."""
+        with self.lock:
+            if self.closed:
+                return
+            self.flush()
+            self._publish(StreamEvent("end"))
+            self.closed = True
+            subscriptions = list(self.subscriptions)
+        self._stop.set()
+        for subscription in subscriptions:
+            subscription.close()
+
+    def get_stats(self) -> dict:
+        with self.lock:
+            return {
+                "subscribers": len(self.subscriptions),
+                "deltas": self.deltas,
+                "batches": self.batches,
+                "buffered_messages": len(self.buffers),
+            }
+
+    def create_event_handler(self) -> type:
+        """Returns an event handler class for `get_completion_stream` that publishes the stream on this bus."""
+        return type("BoundEventBusHandler", (EventBusHandler,), {"bus": self})
+
+    def _flush_buffer(self, message_id: int):
+        buffer = self.buffers.pop(message_id, None)
+        if buffer is None:
+            return
+        self.batches += 1
+        self._publish(StreamEvent("delta", message_id, text="".join(buffer.parts)))
+
+    def _publish(self, event: StreamEvent):
+        for subscription in list(self.subscriptions):
+            try:
+                subscription._put(event)
+            except Exception as e:
+                print(f"Warning: Removing stream subscriber after an error: {e}")
+                self.subscriptions.remove(subscription)
+
+    def _start_flusher(self):
+        # publishes the text of messages that stopped streaming before their buffer was full
+        if self.max_delay is None or self._flusher is not None:
+            return
+        self._flusher = threading.Thread(target=self._flush_loop, name="stream-event-bus", daemon=True)
+        self._flusher.start()
+
+    def _flush_loop(self):
+        while not self._stop.wait(self.max_delay):
+            self.flush(self.max_delay)
+
+
+class EventBusHandler(AgencyEventHandler):
+    """
+    Publishes the messages, tool calls and tool outputs of a stream on a `StreamEventBus`. Use
+    `StreamEventBus.create_event_handler` to get a handler class bound to a bus.
+    """
+    bus: StreamEventBus = None
+    message_id = None
+
+    def _end_message(self):
+        if self.message_id is not None:
+            self.bus.end_message(self.message_id)
+            self.message_id = None
+
+    @override
+    def on_message_created(self, message) -> None:
+        self._end_message()
+        if message.role == "user":
+            self.message_id = self.bus.start_message("text", self.agent_name, self.recipient_agent_name,
+                                                     message.content[0].text.value)
+        else:
+            self.message_id = self.bus.start_message("text", self.recipient_agent_name, self.agent_name)
+
+    @override
+    def on_text_delta(self, delta, snapshot):
+        if self.message_id is not None:
+            self.bus.publish_delta(self.message_id, delta.value)
+
+    @override
+    def on_message_done(self, message) -> None:
+        self._end_message()
+
+    @override
+    def on_tool_call_created(self, tool_call):
+        self._end_message()
+        if tool_call.type == "function":
+            self.message_id = self.bus.start_message("function", self.recipient_agent_name, self.agent_name)
+
+    @override
+    def on_tool_call_done(self, snapshot):
+        if snapshot.type == "function" and self.message_id is not None:
+            self.bus.publish_delta(self.message_id, str(snapshot.function))
+        self._end_message()
+
+        if snapshot.type == "function" and snapshot.function.name == "SendMessage":
+            try:
+                args = json.loads(snapshot.function.arguments)
+                message_id = self.bus.start_message("text", self.recipient_agent_name, args["recipient"],
+                                                    args["message"])
+                self.bus.end_message(message_id)
+            except Exception:
+                pass
+
+    @override
+    def on_run_step_done(self, run_step) -> None:
+        if run_step.type != "tool_calls":
+            return
+        for tool_call in run_step.step_details.tool_calls:
+            if tool_call.type != "function" or tool_call.function.name == "SendMessage":
+                continue
+            message_id = self.bus.start_message("function_output", tool_call.function.name,
+                                                self.recipient_agent_name, tool_call.function.output)
+            self.bus.end_message(message_id)
+
+    @override
+    def on_end(self):
+        self._end_message()
+
+    @override
+    @classmethod
+    def on_all_streams_end(cls):
+        cls.bus.close()
@@ -0,0 +1,120 @@
+import hashlib
+import json
+import os
+import threading
+from typing import Dict, List, Optional
+
+from agency_swarm.util.atomic import atomic_write_json
+
+_caches: Dict[str, "FileUploadCache"] = {}
+_caches_lock = threading.Lock()
+
+
+class FileUploadCache:
+    """
+    Local manifest of files uploaded to OpenAI.
+
+    Files are identified by the SHA-256 hash of their content, so a file is uploaded only once, no matter where it is
+    copied or how it is renamed. Hashes are remembered per path together with the file size and modification time,
+    which means unchanged files are recognized with a single stat call and never re-read.
+
+    The manifest also records which files were attached to each vector store, or code interpreter, from a files
+    folder, so syncing the folder only ever detaches those and keeps files attached in other ways.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.lock = threading.RLock()
+        # content hash -> {"file_id", "name", "size"}
+        self.files: Dict[str, dict] = {}
+        # absolute path -> {"size", "mtime", "sha256"}
+        self.paths: Dict[str, dict] = {}
+        # vector store id, or "<assistant id>/code_interpreter" -> ids of the files attached from a files folder
+        self.attached: Dict[str, List[str]] = {}
+        self._dirty = False
+        self._load()
+
+    def get_hash(self, f_path: str) -> str:
+        f_path = os.path.abspath(f_path)
+        stat = os.stat(f_path)
+        with self.lock:
+            entry = self.paths.get(f_path)
+            if entry and entry["size"] == stat.st_size and entry["mtime"] == stat.st_mtime:
+                return entry["sha256"]
+
+        sha256 = hashlib.sha256()
+        with open(f_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                sha256.update(chunk)
+        file_hash = sha256.hexdigest()
+
+        with self.lock:
+            self.paths[f_path] = {"size": stat.st_size, "mtime": stat.st_mtime, "sha256": file_hash}
+            self._dirty = True
+        return file_hash
+
+    def get_file_id(self, f_path: str) -> Optional[str]:
+        """Returns the id of the uploaded file with the same content, or None if it has not been uploaded yet."""
+        file_hash = self.get_hash(f_path)
+        with self.lock:
+            entry = self.files.get(file_hash)
+            return entry["file_id"] if entry else None
+
+    def add(self, f_path: str, file_id: str):
+        file_hash = self.get_hash(f_path)
+        with self.lock:
+            self.files[file_hash] = {
+                "file_id": file_id,
+                "name": os.path.basename(f_path),
+                "size": os.path.getsize(f_path),
+            }
+            self._dirty = True
+
+    def remove_file_ids(self, file_ids: List[str]):
+        file_ids = set(file_ids)
+        with self.lock:
+            for file_hash in [h for h, entry in self.files.items() if entry["file_id"] in file_ids]:
+                del self.files[file_hash]
+                self._dirty = True
+
+    def get_attached(self, resource_id: str) -> List[str]:
+        with self.lock:
+            return list(self.attached.get(resource_id, []))
+
+    def set_attached(self, resource_id: str, file_ids: List[str]):
+        with self.lock:
+            if list(file_ids) == self.attached.get(resource_id, []):
+                return
+            if file_ids:
+                self.attached[resource_id] = list(file_ids)
+            else:
+                self.attached.pop(resource_id, None)
+            self._dirty = True
+
+    def save(self):
+        with self.lock:
+            if not self._dirty:
+                return
+            atomic_write_json(self.path, {"files": self.files, "paths": self.paths, "attached": self.attached})
+            self._dirty = False
+
+    def _load(self):
+        if not os.path.isfile(self.path):
+            return
+        try:
+            with open(self.path, 'r') as f:
+                data = json.load(f)
+            self.files = data.get("files", {})
+            self.paths = data.get("paths", {})
+            self.attached = data.get("attached", {})
+        except (json.JSONDecodeError, OSError) as e:
+            print(f"Warning: could not read files cache '{self.path}' ({e}). Starting with an empty cache.")
+
+
+def get_file_cache(path: str) -> FileUploadCache:
+    """Returns the shared cache for the given manifest path, so agents in one process don't overwrite each other."""
+    path = os.path.abspath(path)
+    with _caches_lock:
+        if path not in _caches:
+            _caches[path] = FileUploadCache(path)
+        return _caches[path]
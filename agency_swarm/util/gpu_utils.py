@@ -1,34 +1,124 @@
+import gc
+import os
+import sys
+import threading
 from typing import Any, Optional
-import torch
-import torch_directml
 
-def get_device() -> torch.device:
-    """Get the best available device (DirectML GPU or CPU)."""
-    try:
-        return torch_directml.device()
-    except:
-        return torch.device('cpu')
+_accelerator = None
+_accelerator_lock = threading.Lock()
 
-def move_to_device(data: Any, device: Optional[torch.device] = None) -> Any:
+
+class Accelerator:
+    """
+    Backend that places tensors on a device. This base class is the CPU backend: it leaves data where it is and
+    needs no third party packages. Subclass it and pass an instance to `set_accelerator` to plug in another backend.
+    """
+    name = "cpu"
+
+    @property
+    def device(self) -> Any:
+        return "cpu"
+
+    def move(self, data: Any, device: Any = None) -> Any:
+        return data
+
+    def optimize_memory(self):
+        pass
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}(device={self.device})"
+
+
+class TorchAccelerator(Accelerator):
+    """
+    PyTorch backend. Uses a DirectML GPU if `torch_directml` is installed, then CUDA, then the CPU. A broken CUDA
+    runtime, which makes the probe fail, also falls back to the CPU.
+    """
+    name = "torch"
+
+    def __init__(self):
+        import torch
+        self.torch = torch
+        self._device = None
+        try:
+            import torch_directml
+            self._device = torch_directml.device()
+        except Exception:
+            pass
+        if self._device is None:
+            try:
+                cuda = torch.cuda.is_available()
+            except (RuntimeError, OSError):
+                cuda = False
+            self._device = torch.device('cuda' if cuda else 'cpu')
+
+    @property
+    def device(self) -> Any:
+        return self._device
+
+    def move(self, data: Any, device: Any = None) -> Any:
+        device = device or self._device
+        if isinstance(data, self.torch.Tensor):
+            return data.to(device)
+        elif isinstance(data, dict):
+            return {k: self.move(v, device) for k, v in data.items()}
+        elif isinstance(data, list):
+            return [self.move(item, device) for item in data]
+        elif isinstance(data, tuple):
+            return tuple(self.move(item, device) for item in data)
+        return data
+
+    def optimize_memory(self):
+        """Optimize GPU memory usage by clearing cache."""
+        if str(self._device) == 'cpu':
+            return
+        if self.torch.cuda.is_available():
+            self.torch.cuda.empty_cache()
+        # DirectML doesn't have explicit memory management functions
+        # but we can force garbage collection
+        gc.collect()
+
+
+def get_accelerator() -> Accelerator:
+    """
+    Returns the accelerator, creating it on first use. The backend can be chosen with the `AGENCY_SWARM_ACCELERATOR`
+    environment variable (`torch` or `cpu`). By default PyTorch is used if it is installed, otherwise the CPU backend.
+    """
+    global _accelerator
+    with _accelerator_lock:
+        if _accelerator is None:
+            backend = os.getenv("AGENCY_SWARM_ACCELERATOR", "torch").lower()
+            _accelerator = Accelerator()
+            if backend == "torch":
+                try:
+                    _accelerator = TorchAccelerator()
+                except (ImportError, RuntimeError, OSError):
+                    # torch is missing, or can't load its native libraries
+                    pass
+        return _accelerator
+
+
+def set_accelerator(accelerator: Optional[Accelerator]):
+    """Replaces the accelerator. Pass None to choose a backend again on next use."""
+    global _accelerator
+    with _accelerator_lock:
+        _accelerator = accelerator
+
+
+def get_device() -> Any:
+    """Get the best available device (DirectML GPU, CUDA or CPU). Imports the accelerator backend if needed."""
+    return get_accelerator().device
+
+
+def move_to_device(data: Any, device: Any = None) -> Any:
     """Move data to the specified device."""
-    if device is None:
-        device = get_device()
-    
-    if isinstance(data, torch.Tensor):
-        return data.to(device)
-    elif isinstance(data, dict):
-        return {k: move_to_device(v, device) for k, v in data.items()}
-    elif isinstance(data, list):
-        return [move_to_device(item, device) for item in data]
-    elif isinstance(data, tuple):
-        return tuple(move_to_device(item, device) for item in data)
-    return data
+    if _accelerator is None and "torch" not in sys.modules:
+        # without torch there can't be any tensors, so there is no need to load a backend
+        return data
+    return get_accelerator().move(data, device)
+
 
 def optimize_memory():
-    """Optimize GPU memory usage by clearing cache."""
-    if torch.cuda.is_available():
-        torch.cuda.empty_cache()
-    # DirectML doesn't have explicit memory management functions
-    # but we can force garbage collection
-    import gc
-    gc.collect()
+    """Optimize GPU memory usage. Does nothing if no accelerator has been loaded yet."""
+    if _accelerator is not None:
+        _accelerator.optimize_memory()
@@ -0,0 +1,230 @@
+import asyncio
+import bisect
+import importlib.util
+import threading
+import time
+import weakref
+from typing import Dict, Optional
+from urllib.parse import urlsplit
+
+import httpx
+
+from agency_swarm.util.backoff import Backoff
+from agency_swarm.util.tracing import get_tracer
+
+_http_pool = None
+_http_pool_lock = threading.Lock()
+
+
+class LatencyHistogram:
+    """Cumulative latency histogram in the style of Prometheus, with bucket bounds in seconds."""
+
+    default_buckets = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+    def __init__(self, buckets: tuple = default_buckets):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.lock = threading.Lock()
+
+    def observe(self, seconds: float):
+        with self.lock:
+            self.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+            self.count += 1
+            self.sum += seconds
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Upper bound of the bucket that contains the given quantile."""
+        with self.lock:
+            if not self.count:
+                return None
+            rank = q * self.count
+            total = 0
+            for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+                total += count
+                if total >= rank:
+                    return bound
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            cumulative = 0
+            buckets = {}
+            for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+                cumulative += count
+                buckets["+Inf" if bound == float("inf") else str(bound)] = cumulative
+            count, total = self.count, self.sum
+        return {"count": count, "sum": total, "buckets": buckets, "p50": self.quantile(0.5),
+                "p95": self.quantile(0.95)}
+
+
+class HTTPClientPool:
+    """
+    Pooled HTTP clients for tools that call external APIs, one per server.
+
+    Clients follow redirects, keep connections alive between calls and use HTTP/2 if the `h2` package is installed.
+    Connection errors are retried by the transport, and responses with a retryable status code are retried with
+    exponential backoff. Only idempotent methods are retried on a status code, so a POST or PATCH that reached the
+    server, for example before a 502 from a proxy, doesn't run twice. The latency of every request is recorded in a
+    histogram per endpoint.
+    """
+
+    retry_statuses = (429, 502, 503, 504)
+    retry_methods = ("GET", "HEAD", "OPTIONS", "PUT", "DELETE")
+
+    def __init__(self,
+                 timeout: float = 30.0,
+                 connect_timeout: float = 5.0,
+                 max_retries: int = 2,
+                 max_connections: int = 20,
+                 http2: bool = None,
+                 retry_methods: tuple = None,
+                 transport: httpx.BaseTransport = None,
+                 async_transport: httpx.AsyncBaseTransport = None):
+        """
+        Parameters:
+            timeout: Seconds to wait for a response.
+            connect_timeout: Seconds to wait for a connection.
+            max_retries: Retries of failed connections and of responses with a retryable status code.
+            max_connections: Connections kept open per server.
+            http2: Whether to use HTTP/2. Defaults to True if the `h2` package is installed.
+            retry_methods: Methods retried on a retryable status code. Defaults to the idempotent methods.
+            transport: Transport for sync clients, replacing the default connection pool. Mainly for testing.
+            async_transport: Transport for async clients, replacing the default connection pool.
+        """
+        self.timeout = httpx.Timeout(timeout, connect=connect_timeout)
+        self.max_retries = max_retries
+        self.limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+        self.http2 = importlib.util.find_spec("h2") is not None if http2 is None else http2
+        if retry_methods is not None:
+            self.retry_methods = tuple(method.upper() for method in retry_methods)
+        self.transport = transport
+        self.async_transport = async_transport
+        self.lock = threading.Lock()
+        self.clients: Dict[str, httpx.Client] = {}
+        # async clients are bound to the event loop they were created in
+        self.async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, httpx.AsyncClient]]" = \
+            weakref.WeakKeyDictionary()
+        self.histograms: Dict[str, LatencyHistogram] = {}
+
+    def get_client(self, url: str) -> httpx.Client:
+        server = self._get_server(url)
+        with self.lock:
+            if server not in self.clients:
+                self.clients[server] = httpx.Client(
+                    timeout=self.timeout, limits=self.limits, http2=self.http2, follow_redirects=True,
+                    transport=self.transport or httpx.HTTPTransport(retries=self.max_retries, http2=self.http2,
+                                                                    limits=self.limits))
+            return self.clients[server]
+
+    def get_async_client(self, url: str) -> httpx.AsyncClient:
+        server = self._get_server(url)
+        loop = asyncio.get_running_loop()
+        with self.lock:
+            clients = self.async_clients.setdefault(loop, {})
+            if server not in clients:
+                clients[server] = httpx.AsyncClient(
+                    timeout=self.timeout, limits=self.limits, http2=self.http2, follow_redirects=True,
+                    transport=self.async_transport or httpx.AsyncHTTPTransport(retries=self.max_retries,
+                                                                               http2=self.http2, limits=self.limits))
+            return clients[server]
+
+    def request(self, method: str, url: str, endpoint: str = None, **kwargs) -> httpx.Response:
+        """
+        Sends a request with the pooled client of its server. `endpoint` names the histogram the latency is recorded
+        in, for example the path template of an OpenAPI operation. Defaults to the method and the URL without query.
+        """
+        endpoint = endpoint or self._get_endpoint(method, url)
+        client = self.get_client(url)
+        backoff = Backoff(initial=0.5, maximum=8.0)
+        max_retries = self._get_max_retries(method)
+        with get_tracer().start_span("http_request", endpoint=endpoint) as span:
+            for attempt in range(max_retries + 1):
+                start = time.perf_counter()
+                response = client.request(method, url, **kwargs)
+                self._observe(endpoint, time.perf_counter() - start)
+                if response.status_code not in self.retry_statuses or attempt == max_retries:
+                    break
+                time.sleep(self._get_retry_delay(response, backoff))
+            span.set_attributes(status_code=response.status_code, attempts=attempt + 1)
+        return response
+
+    async def arequest(self, method: str, url: str, endpoint: str = None, **kwargs) -> httpx.Response:
+        """Async counterpart of `request`. Concurrent calls to the same server share one connection pool."""
+        endpoint = endpoint or self._get_endpoint(method, url)
+        client = self.get_async_client(url)
+        backoff = Backoff(initial=0.5, maximum=8.0)
+        max_retries = self._get_max_retries(method)
+        with get_tracer().start_span("http_request", endpoint=endpoint) as span:
+            for attempt in range(max_retries + 1):
+                start = time.perf_counter()
+                response = await client.request(method, url, **kwargs)
+                self._observe(endpoint, time.perf_counter() - start)
+                if response.status_code not in self.retry_statuses or attempt == max_retries:
+                    break
+                await asyncio.sleep(self._get_retry_delay(response, backoff))
+            span.set_attributes(status_code=response.status_code, attempts=attempt + 1)
+        return response
+
+    def get_latency_histograms(self) -> Dict[str, dict]:
+        """Returns a snapshot of the latency histogram of every endpoint."""
+        with self.lock:
+            histograms = dict(self.histograms)
+        return {endpoint: histogram.snapshot() for endpoint, histogram in histograms.items()}
+
+    def close(self):
+        with self.lock:
+            clients, self.clients = list(self.clients.values()), {}
+            self.async_clients = weakref.WeakKeyDictionary()
+        for client in clients:
+            client.close()
+
+    async def aclose(self):
+        """Closes the async clients of the running event loop."""
+        with self.lock:
+            clients = self.async_clients.pop(asyncio.get_running_loop(), {})
+        for client in clients.values():
+            await client.aclose()
+
+    def _observe(self, endpoint: str, seconds: float):
+        with self.lock:
+            if endpoint not in self.histograms:
+                self.histograms[endpoint] = LatencyHistogram()
+            histogram = self.histograms[endpoint]
+        histogram.observe(seconds)
+
+    def _get_max_retries(self, method: str) -> int:
+        return self.max_retries if method.upper() in self.retry_methods else 0
+
+    @staticmethod
+    def _get_retry_delay(response: httpx.Response, backoff: Backoff) -> float:
+        retry_after = response.headers.get("retry-after")
+        try:
+            return min(float(retry_after), 60.0)
+        except (TypeError, ValueError):
+            return backoff.next_delay()
+
+    @staticmethod
+    def _get_server(url: str) -> str:
+        parts = urlsplit(url)
+        return f"{parts.scheme}://{parts.netloc}"
+
+    @staticmethod
+    def _get_endpoint(method: str, url: str) -> str:
+        parts = urlsplit(url)
+        return f"{method.upper()} {parts.scheme}://{parts.netloc}{parts.path}"
+
+
+def get_http_pool() -> HTTPClientPool:
+    global _http_pool
+    with _http_pool_lock:
+        if _http_pool is None:
+            _http_pool = HTTPClientPool()
+        return _http_pool
+
+
+def set_http_pool(pool: HTTPClientPool):
+    """Replaces the shared pool, for example to change timeouts or retries of all OpenAPI tools."""
+    global _http_pool
+    with _http_pool_lock:
+        _http_pool = pool
@@ -0,0 +1,136 @@
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+_message_cache = None
+_message_cache_lock = threading.Lock()
+
+
+class MessageCache:
+    """
+    Local copy of the latest messages of each thread, so the final message of a run or a status check can be read
+    without listing the thread again.
+
+    Messages are added from the results of streamed runs and from `messages.list` responses. Memory
+    is bounded: at most `max_messages` are kept per thread, and the least recently used threads are evicted once
+    there are more than `max_threads`. If a `path` is given, messages are also written to an SQLite database and
+    threads evicted from memory are read back from it.
+    """
+
+    def __init__(self, max_threads: int = 256, max_messages: int = 20, path: str = None):
+        self.max_threads = max_threads
+        self.max_messages = max_messages
+        self.path = path
+        self.lock = threading.RLock()
+        # thread id -> message id -> {"id", "run_id", "role", "text", "created_at"}
+        self.threads: "OrderedDict[str, OrderedDict[str, dict]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+        if self.path:
+            conn = self._connect()
+            try:
+                with conn:
+                    conn.execute("CREATE TABLE IF NOT EXISTS messages (id TEXT PRIMARY KEY, thread_id TEXT NOT NULL, "
+                                 "run_id TEXT, role TEXT, text TEXT, created_at INTEGER)")
+                    conn.execute("CREATE INDEX IF NOT EXISTS messages_thread ON messages (thread_id, created_at)")
+            finally:
+                conn.close()
+
+    def add(self, message):
+        """Adds an OpenAI `Message` to the cache."""
+        if not message or not getattr(message, "thread_id", None):
+            return
+        entry = {
+            "id": message.id,
+            "run_id": message.run_id,
+            "role": message.role,
+            "text": self._get_text(message),
+            "created_at": message.created_at,
+        }
+        with self.lock:
+            messages = self._get_thread(message.thread_id, create=True)
+            messages[message.id] = entry
+            messages.move_to_end(message.id)
+            while len(messages) > self.max_messages:
+                messages.popitem(last=False)
+
+        if self.path:
+            conn = self._connect()
+            try:
+                with conn:
+                    conn.execute("INSERT OR REPLACE INTO messages (id, thread_id, run_id, role, text, created_at) "
+                                 "VALUES (?, ?, ?, ?, ?, ?)",
+                                 (entry["id"], message.thread_id, entry["run_id"], entry["role"], entry["text"],
+                                  entry["created_at"]))
+            finally:
+                conn.close()
+
+    def get_last_text(self, thread_id: str, run_id: str) -> Optional[str]:
+        """
+        Returns the text of the latest message that the given run added to the thread, or None if it is not cached.
+        """
+        with self.lock:
+            messages = self._get_thread(thread_id)
+            for entry in reversed(messages.values() if messages else []):
+                if entry["run_id"] == run_id:
+                    self.hits += 1
+                    return entry["text"]
+            self.misses += 1
+            return None
+
+    def get_stats(self):
+        with self.lock:
+            return {"threads": len(self.threads), "hits": self.hits, "misses": self.misses}
+
+    def _get_thread(self, thread_id: str, create: bool = False) -> Optional["OrderedDict[str, dict]"]:
+        if thread_id not in self.threads:
+            messages = self._read(thread_id)
+            if not messages and not create:
+                return None
+            self.threads[thread_id] = messages
+            while len(self.threads) > self.max_threads:
+                self.threads.popitem(last=False)
+        self.threads.move_to_end(thread_id)
+        return self.threads[thread_id]
+
+    def _read(self, thread_id: str) -> "OrderedDict[str, dict]":
+        messages = OrderedDict()
+        if not self.path:
+            return messages
+        conn = self._connect()
+        try:
+            rows = conn.execute("SELECT id, run_id, role, text, created_at FROM messages WHERE thread_id = ? "
+                                "ORDER BY created_at DESC, rowid DESC LIMIT ?", (thread_id, self.max_messages))
+            for message_id, run_id, role, text, created_at in reversed(rows.fetchall()):
+                messages[message_id] = {"id": message_id, "run_id": run_id, "role": role, "text": text,
+                                        "created_at": created_at}
+        finally:
+            conn.close()
+        return messages
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    @staticmethod
+    def _get_text(message) -> str:
+        text = getattr(message.content[0], "text", None) if message.content else None
+        return text.value if text else ""
+
+
+def get_message_cache() -> MessageCache:
+    global _message_cache
+    with _message_cache_lock:
+        if _message_cache is None:
+            _message_cache = MessageCache()
+        return _message_cache
+
+
+def set_message_cache(cache: MessageCache):
+    """Replaces the cache shared by all threads, for example with one that persists messages to disk."""
+    global _message_cache
+    with _message_cache_lock:
+        _message_cache = cache
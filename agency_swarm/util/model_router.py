@@ -0,0 +1,150 @@
+import math
+import threading
+from collections import Counter, defaultdict, deque
+from typing import List, Optional, Tuple
+
+from agency_swarm.util.token_budget import get_cost
+
+
+class RouteRule:
+    """
+    Runs that meet every given condition of a rule use its model instead of the agent's model.
+
+    Conditions:
+        agents: names of the agents the rule applies to.
+        reasons: why the run is created: "message" for a new message, "validation" after a failed response validation,
+            "retry" after a failed run and "expired" after a run expired while waiting for tool outputs.
+        min_message_tokens, max_message_tokens: size of the latest message sent to the agent.
+        tool_only: whether the run is expected to only call tools, because `tool_choice` requires a tool or most
+            recent runs of the agent stopped for tool calls.
+        max_latency: the rule is skipped while the `latency_percentile` of the recent runs of its model is above this
+            number of seconds, so the next rule or the agent's model takes over.
+    """
+
+    def __init__(self,
+                 model: str,
+                 name: str = None,
+                 agents: List[str] = None,
+                 reasons: List[str] = None,
+                 min_message_tokens: int = None,
+                 max_message_tokens: int = None,
+                 tool_only: bool = None,
+                 max_latency: float = None,
+                 latency_percentile: float = 95):
+        self.model = model
+        self.name = name or model
+        self.agents = agents
+        self.reasons = reasons
+        self.min_message_tokens = min_message_tokens
+        self.max_message_tokens = max_message_tokens
+        self.tool_only = tool_only
+        self.max_latency = max_latency
+        self.latency_percentile = latency_percentile
+
+    def matches(self, context: dict, router: "ModelRouter") -> bool:
+        if self.agents is not None and context["agent"] not in self.agents:
+            return False
+        if self.reasons is not None and context["reason"] not in self.reasons:
+            return False
+        if self.min_message_tokens is not None and context["message_tokens"] < self.min_message_tokens:
+            return False
+        if self.max_message_tokens is not None and context["message_tokens"] > self.max_message_tokens:
+            return False
+        if self.tool_only is not None and context["tool_only"] != self.tool_only:
+            return False
+        if self.max_latency is not None:
+            latency = router.get_latency_percentile(self.model, self.latency_percentile)
+            if latency is not None and latency > self.max_latency:
+                return False
+        return True
+
+
+class ModelRouter:
+    """
+    Picks the model of each run from a list of rules, so that cheap and fast models handle simple hops, like a CEO
+    forwarding a message, and the agent's own model handles the rest. The first matching rule wins.
+
+    Latency, token usage, cost and errors are recorded per route, and the latencies of the last `window` runs of each
+    model are kept to evaluate `max_latency` conditions. A router can be shared by all agents of an agency.
+    """
+
+    def __init__(self, rules: List[RouteRule], window: int = 200, tool_only_threshold: float = 0.8,
+                 min_samples: int = 10):
+        self.rules = list(rules)
+        self.window = window
+        # share of recent runs of an agent that must have stopped for tool calls to expect a tool only run
+        self.tool_only_threshold = tool_only_threshold
+        # runs needed before latencies and tool call rates are used
+        self.min_samples = min_samples
+        self.lock = threading.Lock()
+        self.latencies = defaultdict(lambda: deque(maxlen=self.window))
+        self.tool_calls = defaultdict(lambda: deque(maxlen=self.window))
+        self.routes = {}
+
+    def route(self, agent, reason: str = "message", message_tokens: int = 0, tool_choice=None) -> Tuple[str, str]:
+        """Returns the model for the next run of the agent and the name of the route that picked it."""
+        context = {
+            "agent": agent.name,
+            "reason": reason,
+            "message_tokens": message_tokens,
+            "tool_only": isinstance(tool_choice, dict) or self.is_tool_only(agent.name),
+        }
+        for rule in self.rules:
+            if rule.matches(context, self):
+                return rule.model, rule.name
+        return agent.model, "default"
+
+    def record(self, route: str, agent_name: str, model: str, latency: float, status: str, usage=None):
+        """Records a run created with the given route, until it completed, failed or stopped for tool calls."""
+        with self.lock:
+            self.latencies[model].append(latency)
+            self.tool_calls[agent_name].append(status == "requires_action")
+            stats = self.routes.setdefault(route, {"runs": 0, "errors": 0, "tool_calls": 0, "latency": 0.0,
+                                                   "prompt_tokens": 0, "completion_tokens": 0, "cost": 0.0,
+                                                   "models": Counter(), "latencies": deque(maxlen=self.window)})
+            stats["runs"] += 1
+            stats["errors"] += status in ("failed", "expired", "cancelled", "incomplete")
+            stats["tool_calls"] += status == "requires_action"
+            stats["latency"] += latency
+            stats["models"][model] += 1
+            stats["latencies"].append(latency)
+            if usage:
+                stats["prompt_tokens"] += usage.prompt_tokens
+                stats["completion_tokens"] += usage.completion_tokens
+                stats["cost"] += get_cost(model, usage.prompt_tokens, usage.completion_tokens)
+
+    def is_tool_only(self, agent_name: str) -> bool:
+        with self.lock:
+            runs = self.tool_calls.get(agent_name)
+            if not runs or len(runs) < self.min_samples:
+                return False
+            return sum(runs) / len(runs) >= self.tool_only_threshold
+
+    def get_latency_percentile(self, model: str, percentile: float = 95) -> Optional[float]:
+        """Returns a percentile of the latencies of the recent runs of a model, or None without enough runs."""
+        with self.lock:
+            latencies = self.latencies.get(model)
+            if not latencies or len(latencies) < self.min_samples:
+                return None
+            return self._percentile(latencies, percentile)
+
+    def get_stats(self) -> dict:
+        """Returns the runs, errors, tool calls, latency percentiles, tokens and cost of each route."""
+        with self.lock:
+            return {route: {"runs": stats["runs"],
+                            "errors": stats["errors"],
+                            "tool_calls": stats["tool_calls"],
+                            "latency_p50": self._percentile(stats["latencies"], 50),
+                            "latency_p95": self._percentile(stats["latencies"], 95),
+                            "prompt_tokens": stats["prompt_tokens"],
+                            "completion_tokens": stats["completion_tokens"],
+                            "cost": stats["cost"],
+                            "models": dict(stats["models"])}
+                    for route, stats in self.routes.items()}
+
+    @staticmethod
+    def _percentile(values, percentile: float) -> Optional[float]:
+        if not values:
+            return None
+        values = sorted(values)
+        return values[max(math.ceil(percentile / 100 * len(values)) - 1, 0)]
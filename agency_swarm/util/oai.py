@@ -10,6 +10,7 @@ load_dotenv()
 
 client_lock = threading.Lock()
 client = None
+async_client = None
 
 
 def get_openai_client():
@@ -28,16 +29,38 @@ def get_openai_client():
     return client
 
 
+def get_async_openai_client():
+    global async_client
+    with client_lock:
+        if async_client is None:
+            # Check if the API key is set
+            api_key = openai.api_key or os.getenv('OPENAI_API_KEY')
+            if api_key is None:
+                raise ValueError("OpenAI API key is not set. Please set it using set_openai_key.")
+            async_client = openai.AsyncOpenAI(api_key=api_key,
+                                              timeout=httpx.Timeout(60.0, read=30, connect=5.0),
+                                              max_retries=5,
+                                              default_headers={"OpenAI-Beta": "assistants=v2"})
+    return async_client
+
+
 def set_openai_client(new_client):
     global client
     with client_lock:
         client = instructor.patch(new_client)
 
 
+def set_async_openai_client(new_client):
+    global async_client
+    with client_lock:
+        async_client = new_client
+
+
 def set_openai_key(key):
     if not key:
         raise ValueError("Invalid API key. The API key cannot be empty.")
     openai.api_key = key
-    global client
+    global client, async_client
     with client_lock:
         client = None
+        async_client = None
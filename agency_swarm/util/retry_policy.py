@@ -0,0 +1,181 @@
+import re
+import threading
+import time
+from collections import Counter
+from typing import Dict, Optional
+
+from openai import APIConnectionError, APIStatusError, BadRequestError, RateLimitError
+
+from agency_swarm.util.backoff import Backoff
+
+_retry_policy = None
+_retry_policy_lock = threading.Lock()
+
+# errors that say nothing about the request itself, so the same run can succeed later
+TRANSIENT_ERRORS = ("rate_limit", "server_error")
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of creating a run while the circuit of its model is open after repeated failures."""
+
+    def __init__(self, model: str, retry_in: float):
+        super().__init__(f"Runs with {model} are paused for {retry_in:.0f}s after repeated rate limit or server "
+                         f"errors.")
+        self.model = model
+        self.retry_in = retry_in
+
+
+class RetryPolicy:
+    """
+    Decides whether and when failed runs are retried.
+
+    Errors are classified as "rate_limit", "server_error", "expired" (the run expired while tools were running),
+    "validation" (the response validator rejected the answer) or "fatal". Each class is retried up to its number of
+    `max_attempts`. Rate limit and server errors wait with exponential backoff and jitter, or as long as the
+    Retry-After header or the error message asks, up to `max_retry_after` seconds.
+
+    Runs of a model fail fast with `CircuitOpenError` once `failure_threshold` rate limit or server errors happened in a
+    row, until `recovery_timeout` seconds have passed. The next run then probes the model, while other runs are still
+    rejected: it closes the circuit if it succeeds and opens it again if it fails. A probe that records neither is
+    replaced by another one after `recovery_timeout` seconds. A policy can be shared by all agents of an agency, so
+    that a failure storm pauses every thread using the model.
+    """
+
+    default_max_attempts = {"rate_limit": 5, "server_error": 5, "expired": 1, "validation": 1, "fatal": 0}
+
+    def __init__(self,
+                 max_attempts: Dict[str, int] = None,
+                 backoff: Backoff = None,
+                 max_retry_after: float = 120.0,
+                 failure_threshold: int = 5,
+                 recovery_timeout: float = 30.0):
+        self.max_attempts = {**self.default_max_attempts, **(max_attempts or {})}
+        self.backoff = backoff or Backoff(initial=1.0, maximum=30.0, multiplier=2.0)
+        self.max_retry_after = max_retry_after
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.lock = threading.Lock()
+        # model -> {"failures": consecutive transient failures, "opened_at": time the circuit opened or None,
+        #           "probing_since": time the run probing the model was let through, or None}
+        self.circuits = {}
+        self.retries = Counter()
+        self.gave_up = Counter()
+        self.delay = 0.0
+        self.rejected = 0
+
+    @staticmethod
+    def classify(error) -> str:
+        """Returns the class of an API exception or of the `last_error` of a failed run."""
+        if isinstance(error, RateLimitError):
+            return "rate_limit"
+        if isinstance(error, BadRequestError):
+            return "expired" if 'Runs in status "expired"' in error.message else "fatal"
+        if isinstance(error, APIStatusError):
+            return "server_error" if error.status_code >= 500 else "fatal"
+        if isinstance(error, APIConnectionError):
+            return "server_error"
+        code = getattr(error, "code", None)
+        if code == "rate_limit_exceeded":
+            return "rate_limit"
+        if code == "server_error" or "something went wrong" in str(getattr(error, "message", error)).lower():
+            return "server_error"
+        return "fatal"
+
+    @staticmethod
+    def get_retry_after(error) -> Optional[float]:
+        """Returns the seconds the API asked to wait, from the Retry-After header or from the error message."""
+        response = getattr(error, "response", None)
+        if response is not None:
+            retry_after_ms = response.headers.get("retry-after-ms")
+            retry_after = response.headers.get("retry-after")
+            try:
+                if retry_after_ms is not None:
+                    return float(retry_after_ms) / 1000
+                if retry_after is not None:
+                    return float(retry_after)
+            except ValueError:
+                pass
+        match = re.search(r"try again in (\d+(?:\.\d+)?)\s*(ms|s)\b", str(getattr(error, "message", "")))
+        if match:
+            return float(match.group(1)) / (1000 if match.group(2) == "ms" else 1)
+        return None
+
+    def next_retry(self, category: str, attempts: int, error=None, max_attempts: int = None) -> Optional[float]:
+        """
+        Returns the seconds to wait before retrying after `attempts` retries of this class, or None to give up.
+        `max_attempts` overrides the limit of the policy, for example with the agent's `validation_attempts`.
+        """
+        limit = max_attempts if max_attempts is not None else self.max_attempts.get(category, 0)
+        with self.lock:
+            if attempts >= limit:
+                self.gave_up[category] += 1
+                return None
+            self.retries[category] += 1
+
+        delay = 0.0
+        if category in TRANSIENT_ERRORS:
+            retry_after = self.get_retry_after(error) if error is not None else None
+            delay = min(retry_after, self.max_retry_after) if retry_after is not None \
+                else self.backoff.get_delay(attempts)
+        with self.lock:
+            self.delay += delay
+        return delay
+
+    def check_circuit(self, model: str):
+        """Raises CircuitOpenError if runs of the model are paused."""
+        with self.lock:
+            circuit = self.circuits.get(model)
+            if not circuit or circuit["opened_at"] is None:
+                return
+            now = time.time()
+            retry_in = circuit["opened_at"] + self.recovery_timeout - now
+            probing_since = circuit.get("probing_since")
+            if retry_in <= 0 and probing_since is not None:
+                # another run is probing the model
+                retry_in = probing_since + self.recovery_timeout - now
+            if retry_in > 0:
+                self.rejected += 1
+                raise CircuitOpenError(model, retry_in)
+            # half open: let this run through and keep rejecting the others until it succeeds or fails
+            circuit["probing_since"] = now
+
+    def record_success(self, model: str):
+        with self.lock:
+            self.circuits.pop(model, None)
+
+    def record_failure(self, model: str):
+        """Records a rate limit or server error of a model's run, opening its circuit after too many in a row."""
+        with self.lock:
+            circuit = self.circuits.setdefault(model, {"failures": 0, "opened_at": None, "probing_since": None})
+            circuit["failures"] += 1
+            if circuit.get("probing_since") is not None:
+                # the probe failed, so the circuit opens again for another `recovery_timeout`
+                circuit["opened_at"] = time.time()
+                circuit["probing_since"] = None
+            elif circuit["failures"] >= self.failure_threshold and circuit["opened_at"] is None:
+                circuit["opened_at"] = time.time()
+
+    def get_stats(self) -> dict:
+        """Returns the retries and give-ups per error class, the total delay, rejected runs and the open circuits."""
+        with self.lock:
+            now = time.time()
+            return {"retries": dict(self.retries), "gave_up": dict(self.gave_up), "delay": self.delay,
+                    "rejected": self.rejected,
+                    "open_circuits": {model: max(circuit["opened_at"] + self.recovery_timeout - now, 0.0)
+                                      for model, circuit in self.circuits.items()
+                                      if circuit["opened_at"] is not None}}
+
+
+def get_retry_policy() -> RetryPolicy:
+    global _retry_policy
+    with _retry_policy_lock:
+        if _retry_policy is None:
+            _retry_policy = RetryPolicy()
+        return _retry_policy
+
+
+def set_retry_policy(policy: RetryPolicy):
+    """Replaces the policy used by agents without their own, for example to allow more retries of rate limits."""
+    global _retry_policy
+    with _retry_policy_lock:
+        _retry_policy = policy
@@ -0,0 +1,141 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Dict, List
+
+from agency_swarm.util.backoff import Backoff
+from agency_swarm.util.threads_store import ThreadsStore
+
+
+class SessionLockTimeout(TimeoutError):
+    """Raised when the lock of a session could not be acquired in time."""
+
+
+class SessionRegistry:
+    """
+    Thread ids and locks of conversations, stored in SQLite so they can be shared by several processes.
+
+    Each session is one conversation with the agency, with its own threads between the user and the agents. The
+    thread ids of a session are stored in the same format as threads.json. `lock` makes sure that a session is used
+    by a single run at a time, across all processes that share the database. Locks expire after `lock_ttl` seconds,
+    so a crashed process doesn't block a session forever; locks held by live processes are renewed in the background.
+    The threads stores of the `max_threads_stores` most recently used sessions are kept, so a long running server
+    doesn't create one per request.
+    """
+
+    def __init__(self, path: str, lock_ttl: float = 60.0, max_threads_stores: int = 1000):
+        self.path = path
+        self.lock_ttl = lock_ttl
+        self.max_threads_stores = max_threads_stores
+        self.local = threading.local()
+        self.threads_stores: "OrderedDict[str, ThreadsStore]" = OrderedDict()
+        self.threads_stores_lock = threading.Lock()
+        conn = self._connect()
+        conn.execute("CREATE TABLE IF NOT EXISTS session_threads (session_id TEXT PRIMARY KEY, thread_ids TEXT NOT NULL)")
+        conn.execute("CREATE TABLE IF NOT EXISTS session_locks "
+                     "(session_id TEXT PRIMARY KEY, owner TEXT NOT NULL, expires_at REAL NOT NULL)")
+
+    def get_thread_ids(self, session_id: str) -> Dict:
+        row = self._connect().execute("SELECT thread_ids FROM session_threads WHERE session_id = ?",
+                                      (session_id,)).fetchone()
+        return json.loads(row[0]) if row else {}
+
+    def save_thread_ids(self, session_id: str, thread_ids: Dict):
+        self._connect().execute("INSERT OR REPLACE INTO session_threads (session_id, thread_ids) VALUES (?, ?)",
+                                (session_id, json.dumps(thread_ids)))
+
+    def get_sessions(self) -> List[str]:
+        return [row[0] for row in self._connect().execute("SELECT session_id FROM session_threads")]
+
+    def delete_session(self, session_id: str):
+        self._connect().execute("DELETE FROM session_threads WHERE session_id = ?", (session_id,))
+
+    def get_threads_store(self, session_id: str) -> ThreadsStore:
+        """Returns the threads store that reads and writes the thread ids of the session."""
+        with self.threads_stores_lock:
+            store = self.threads_stores.get(session_id)
+            if store is not None:
+                self.threads_stores.move_to_end(session_id)
+                return store
+            store = ThreadsStore(callbacks={
+                "load": lambda: self.get_thread_ids(session_id),
+                "save": lambda thread_ids: self.save_thread_ids(session_id, thread_ids),
+            }, debounce=0)
+            self.threads_stores[session_id] = store
+            if len(self.threads_stores) > self.max_threads_stores:
+                self.threads_stores.popitem(last=False)
+            return store
+
+    def try_acquire(self, session_id: str, owner: str) -> bool:
+        conn = self._connect()
+        # lock the database for writing before reading, so no other process can take the lock in between
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT owner, expires_at FROM session_locks WHERE session_id = ?",
+                               (session_id,)).fetchone()
+            if row and row[0] != owner and row[1] > time.time():
+                conn.execute("ROLLBACK")
+                return False
+            conn.execute("INSERT OR REPLACE INTO session_locks (session_id, owner, expires_at) VALUES (?, ?, ?)",
+                         (session_id, owner, time.time() + self.lock_ttl))
+            conn.execute("COMMIT")
+            return True
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def release(self, session_id: str, owner: str):
+        self._connect().execute("DELETE FROM session_locks WHERE session_id = ? AND owner = ?", (session_id, owner))
+
+    def release_process(self, pid: int):
+        """Releases all locks held by a process, for example one that crashed."""
+        self._connect().execute("DELETE FROM session_locks WHERE owner LIKE ?", (f"{pid}-%",))
+
+    def is_locked(self, session_id: str) -> bool:
+        row = self._connect().execute("SELECT expires_at FROM session_locks WHERE session_id = ?",
+                                      (session_id,)).fetchone()
+        return bool(row) and row[0] > time.time()
+
+    @contextmanager
+    def lock(self, session_id: str, timeout: float = None):
+        """
+        Holds the lock of the session for the duration of the block. Waits for up to `timeout` seconds, or forever
+        without a timeout, then raises `SessionLockTimeout`.
+        """
+        owner = f"{os.getpid()}-{uuid.uuid4().hex}"
+        deadline = None if timeout is None else time.time() + timeout
+        backoff = Backoff(initial=0.01, maximum=0.5)
+        while not self.try_acquire(session_id, owner):
+            delay = backoff.next_delay()
+            if deadline is not None and time.time() + delay > deadline:
+                raise SessionLockTimeout(f"Session '{session_id}' is busy with another run.")
+            time.sleep(delay)
+
+        stop = threading.Event()
+        renewal = threading.Thread(target=self._renew, args=(session_id, owner, stop), daemon=True)
+        renewal.start()
+        try:
+            yield
+        finally:
+            stop.set()
+            renewal.join()
+            self.release(session_id, owner)
+
+    def _renew(self, session_id: str, owner: str, stop: threading.Event):
+        while not stop.wait(self.lock_ttl / 3):
+            self._connect().execute("UPDATE session_locks SET expires_at = ? WHERE session_id = ? AND owner = ?",
+                                    (time.time() + self.lock_ttl, session_id, owner))
+
+    def _connect(self) -> sqlite3.Connection:
+        # one connection per thread, in autocommit mode
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self.local.conn = conn
+        return conn
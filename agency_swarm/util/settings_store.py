@@ -0,0 +1,215 @@
+import json
+import os
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+from agency_swarm.util.atomic import FileLock, atomic_write_json
+
+_stores: Dict[str, "SettingsStore"] = {}
+_stores_lock = threading.Lock()
+
+
+class SettingsStore(ABC):
+    """
+    Stores the settings of all assistants in an agency, indexed in memory by assistant id and name.
+
+    Changes are kept as pending until they are flushed. Outside of a `batch()` block every change is flushed right
+    away, inside of it all changes are written at once when the outermost block exits. Flushing re-reads the stored
+    settings under a lock and only applies the pending changes, so several processes can share the same store.
+    """
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self._settings: Optional[Dict[str, dict]] = None
+        self._pending: Dict[str, Optional[dict]] = {}
+        self._batch_depth = 0
+
+    @abstractmethod
+    def _read(self) -> List[dict]:
+        pass
+
+    @abstractmethod
+    def _write(self, settings: List[dict], pending: Dict[str, Optional[dict]]):
+        pass
+
+    @contextmanager
+    def _exclusive(self):
+        yield
+
+    def _is_stale(self) -> bool:
+        return False
+
+    def load(self) -> List[dict]:
+        with self.lock:
+            if self._settings is None or self._is_stale():
+                self._settings = {s['id']: s for s in self._read()}
+                for assistant_id, assistant_settings in self._pending.items():
+                    if assistant_settings is None:
+                        self._settings.pop(assistant_id, None)
+                    else:
+                        self._settings[assistant_id] = assistant_settings
+            return list(self._settings.values())
+
+    def get_by_id(self, assistant_id: str) -> Optional[dict]:
+        with self.lock:
+            self.load()
+            return self._settings.get(assistant_id)
+
+    def get_by_name(self, name: str) -> List[dict]:
+        with self.lock:
+            return [s for s in self.load() if s['name'] == name]
+
+    def save(self, assistant_settings: dict):
+        with self.lock:
+            self.load()
+            self._settings[assistant_settings['id']] = assistant_settings
+            self._pending[assistant_settings['id']] = assistant_settings
+            self._flush_if_needed()
+
+    def delete(self, assistant_id: str):
+        with self.lock:
+            self.load()
+            self._settings.pop(assistant_id, None)
+            self._pending[assistant_id] = None
+            self._flush_if_needed()
+
+    @contextmanager
+    def batch(self):
+        """Collects all changes made inside the block and writes them with a single write."""
+        with self.lock:
+            self._batch_depth += 1
+        try:
+            yield self
+        finally:
+            with self.lock:
+                self._batch_depth -= 1
+                self._flush_if_needed()
+
+    def flush(self):
+        with self.lock:
+            if not self._pending:
+                return
+            with self._exclusive():
+                settings = {s['id']: s for s in self._read()}
+                for assistant_id, assistant_settings in self._pending.items():
+                    if assistant_settings is None:
+                        settings.pop(assistant_id, None)
+                    else:
+                        settings[assistant_id] = assistant_settings
+                self._write(list(settings.values()), self._pending)
+            self._settings = settings
+            self._pending = {}
+
+    def _flush_if_needed(self):
+        if self._batch_depth == 0:
+            self.flush()
+
+
+class JSONSettingsStore(SettingsStore):
+    """Settings store backed by a JSON file, written atomically under a file lock."""
+
+    def __init__(self, path: str):
+        super().__init__()
+        self.path = path
+        self.file_lock = FileLock(path)
+        self._signature = None
+
+    def _get_signature(self):
+        try:
+            stat = os.stat(self.path)
+            return stat.st_mtime_ns, stat.st_size
+        except FileNotFoundError:
+            return None
+
+    def _is_stale(self) -> bool:
+        # the file was changed by another process or by hand since it was last read
+        return self._get_signature() != self._signature
+
+    def _read(self) -> List[dict]:
+        self._signature = self._get_signature()
+        if self._signature is None:
+            return []
+        with open(self.path, 'r') as f:
+            content = f.read()
+        return json.loads(content) if content.strip() else []
+
+    def _write(self, settings: List[dict], pending: Dict[str, Optional[dict]]):
+        atomic_write_json(self.path, settings)
+        self._signature = self._get_signature()
+
+    @contextmanager
+    def _exclusive(self):
+        with self.file_lock:
+            yield
+
+
+class SQLiteSettingsStore(SettingsStore):
+    """Settings store backed by SQLite, for deployments where several processes share the same settings."""
+
+    def __init__(self, path: str):
+        super().__init__()
+        self.path = path
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute("CREATE TABLE IF NOT EXISTS assistant_settings "
+                             "(id TEXT PRIMARY KEY, name TEXT, settings TEXT NOT NULL)")
+        finally:
+            conn.close()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def _read(self) -> List[dict]:
+        conn = self._connect()
+        try:
+            return [json.loads(row[0]) for row in conn.execute("SELECT settings FROM assistant_settings")]
+        finally:
+            conn.close()
+
+    def _write(self, settings: List[dict], pending: Dict[str, Optional[dict]]):
+        conn = self._connect()
+        try:
+            with conn:
+                for assistant_id, assistant_settings in pending.items():
+                    if assistant_settings is None:
+                        conn.execute("DELETE FROM assistant_settings WHERE id = ?", (assistant_id,))
+                    else:
+                        conn.execute("INSERT OR REPLACE INTO assistant_settings (id, name, settings) VALUES (?, ?, ?)",
+                                     (assistant_id, assistant_settings['name'], json.dumps(assistant_settings)))
+        finally:
+            conn.close()
+
+
+class CallbackSettingsStore(SettingsStore):
+    """Settings store that loads and saves settings with user provided callbacks, for example from a database."""
+
+    def __init__(self, callbacks):
+        super().__init__()
+        self.callbacks = callbacks
+
+    def _read(self) -> List[dict]:
+        return self.callbacks["load"]() or []
+
+    def _write(self, settings: List[dict], pending: Dict[str, Optional[dict]]):
+        self.callbacks["save"](settings)
+
+
+def get_settings_store(path: str) -> SettingsStore:
+    """
+    Returns the shared settings store for the given path. Paths ending with `.db`, `.sqlite` or `.sqlite3` use the
+    SQLite backend, all other paths a JSON file.
+    """
+    path = os.path.abspath(path)
+    with _stores_lock:
+        if path not in _stores:
+            if os.path.splitext(path)[1] in (".db", ".sqlite", ".sqlite3"):
+                _stores[path] = SQLiteSettingsStore(path)
+            else:
+                _stores[path] = JSONSettingsStore(path)
+        return _stores[path]
@@ -0,0 +1,270 @@
+import contextvars
+import json
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from typing import Any, Callable, List, Optional
+
+_shared_state = None
+_shared_state_lock = threading.Lock()
+# shared state of the agency whose tools are running in the current context, see use_shared_state
+_current_shared_state: contextvars.ContextVar[Optional["SharedState"]] = \
+    contextvars.ContextVar("agency_swarm_shared_state", default=None)
+
+
+class _Missing:
+    def __repr__(self):
+        return "MISSING"
+
+
+# expected value for compare_and_set when the key must not exist yet
+MISSING = _Missing()
+
+
+class SharedState(ABC):
+    """
+    Key-value state shared between tools, across all agents. All methods are thread safe.
+
+    `compare_and_set` and `update` change a value atomically, so tools running in parallel can build on each other's
+    changes without losing any. `namespace` returns a view with its own keys, so several agencies can share one store.
+    """
+
+    @abstractmethod
+    def get(self, key: str, default: Any = None) -> Any:
+        pass
+
+    @abstractmethod
+    def set(self, key: str, value: Any):
+        pass
+
+    @abstractmethod
+    def delete(self, key: str):
+        pass
+
+    @abstractmethod
+    def compare_and_set(self, key: str, expected: Any, value: Any) -> bool:
+        """
+        Sets the key to `value` only if its current value equals `expected`. Pass `MISSING` as `expected` to set the
+        key only if it doesn't exist. Returns whether the value was set.
+        """
+        pass
+
+    @abstractmethod
+    def keys(self) -> List[str]:
+        pass
+
+    def update(self, key: str, func: Callable[[Any], Any], default: Any = None) -> Any:
+        """Atomically replaces the value of the key with `func(value)` and returns the new value."""
+        while True:
+            current = self.get(key, MISSING)
+            value = func(default if current is MISSING else current)
+            if self.compare_and_set(key, current, value):
+                return value
+
+    def namespace(self, name: str) -> "SharedState":
+        """Returns a view of this state in which all keys are prefixed with the namespace."""
+        return NamespacedSharedState(self, name)
+
+    @staticmethod
+    def _check_key(key):
+        if not isinstance(key, str):
+            raise ValueError("Key must be a string")
+
+
+class InMemorySharedState(SharedState):
+    """
+    Shared state of the current process. Writes lock one of `stripes` locks, chosen by the key, so tools writing
+    different keys rarely wait for each other.
+    """
+
+    def __init__(self, stripes: int = 16):
+        self.data = {}
+        self.locks = [threading.Lock() for _ in range(stripes)]
+
+    def get(self, key, default=None):
+        self._check_key(key)
+        return self.data.get(key, default)
+
+    def set(self, key, value):
+        self._check_key(key)
+        with self._lock(key):
+            self.data[key] = value
+
+    def delete(self, key):
+        self._check_key(key)
+        with self._lock(key):
+            self.data.pop(key, None)
+
+    def compare_and_set(self, key, expected, value):
+        self._check_key(key)
+        with self._lock(key):
+            if self.data.get(key, MISSING) != expected:
+                return False
+            self.data[key] = value
+            return True
+
+    def keys(self):
+        return list(self.data)
+
+    def _lock(self, key: str) -> threading.Lock:
+        return self.locks[hash(key) % len(self.locks)]
+
+
+class SQLiteSharedState(SharedState):
+    """
+    Shared state stored in an SQLite database, so it survives restarts and can be shared by several processes.
+    Values are stored as JSON.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.local = threading.local()
+        conn = self._connect()
+        conn.execute("CREATE TABLE IF NOT EXISTS state (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+
+    def get(self, key, default=None):
+        self._check_key(key)
+        row = self._connect().execute("SELECT value FROM state WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def set(self, key, value):
+        self._check_key(key)
+        self._connect().execute("INSERT OR REPLACE INTO state (key, value) VALUES (?, ?)", (key, json.dumps(value)))
+
+    def delete(self, key):
+        self._check_key(key)
+        self._connect().execute("DELETE FROM state WHERE key = ?", (key,))
+
+    def compare_and_set(self, key, expected, value):
+        self._check_key(key)
+        conn = self._connect()
+        # lock the database for writing before reading, so no other process can change the value in between
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT value FROM state WHERE key = ?", (key,)).fetchone()
+            if (json.loads(row[0]) if row else MISSING) != expected:
+                conn.execute("ROLLBACK")
+                return False
+            conn.execute("INSERT OR REPLACE INTO state (key, value) VALUES (?, ?)", (key, json.dumps(value)))
+            conn.execute("COMMIT")
+            return True
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def keys(self):
+        return [row[0] for row in self._connect().execute("SELECT key FROM state")]
+
+    def _connect(self) -> sqlite3.Connection:
+        # one connection per thread, in autocommit mode
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self.local.conn = conn
+        return conn
+
+
+class NamespacedSharedState(SharedState):
+    """View of another shared state, whose keys are prefixed with `{namespace}/`."""
+
+    def __init__(self, state: SharedState, namespace: str):
+        self.state = state
+        self.prefix = namespace + "/"
+
+    def get(self, key, default=None):
+        self._check_key(key)
+        return self.state.get(self.prefix + key, default)
+
+    def set(self, key, value):
+        self._check_key(key)
+        self.state.set(self.prefix + key, value)
+
+    def delete(self, key):
+        self._check_key(key)
+        self.state.delete(self.prefix + key)
+
+    def compare_and_set(self, key, expected, value):
+        self._check_key(key)
+        return self.state.compare_and_set(self.prefix + key, expected, value)
+
+    def keys(self):
+        return [key[len(self.prefix):] for key in self.state.keys() if key.startswith(self.prefix)]
+
+
+class ContextSharedState(SharedState):
+    """
+    Forwards to the shared state of the agency whose tool is running, or to the default one outside of agencies.
+    This is `BaseTool.shared_state`, so tools don't need to know which agency they belong to.
+    """
+
+    def get(self, key, default=None):
+        return get_shared_state().get(key, default)
+
+    def set(self, key, value):
+        get_shared_state().set(key, value)
+
+    def delete(self, key):
+        get_shared_state().delete(key)
+
+    def compare_and_set(self, key, expected, value):
+        return get_shared_state().compare_and_set(key, expected, value)
+
+    def keys(self):
+        return get_shared_state().keys()
+
+    def namespace(self, name):
+        return get_shared_state().namespace(name)
+
+    @property
+    def data(self) -> dict:
+        """
+        Values of the current shared state as a dict, for tools that use `data` directly. With an in-memory state
+        this is its own dict; other states return a copy, so change them with `set` or by assigning `data`.
+        """
+        state = get_shared_state()
+        if isinstance(state, InMemorySharedState):
+            return state.data
+        return {key: state.get(key) for key in state.keys()}
+
+    @data.setter
+    def data(self, data: dict):
+        state = get_shared_state()
+        for key in state.keys():
+            if key not in data:
+                state.delete(key)
+        for key, value in data.items():
+            state.set(key, value)
+
+
+def get_shared_state() -> SharedState:
+    """Returns the shared state of the current agency, or the default one."""
+    state = _current_shared_state.get()
+    if state is not None:
+        return state
+    global _shared_state
+    with _shared_state_lock:
+        if _shared_state is None:
+            _shared_state = InMemorySharedState()
+        return _shared_state
+
+
+def set_shared_state(state: SharedState):
+    """Replaces the default shared state, for example with one that persists to SQLite."""
+    global _shared_state
+    with _shared_state_lock:
+        _shared_state = state
+
+
+@contextmanager
+def use_shared_state(state: Optional[SharedState]):
+    """Makes tools use the given shared state in the current context. Does nothing if it is None."""
+    if state is None:
+        yield
+        return
+    token = _current_shared_state.set(state)
+    try:
+        yield
+    finally:
+        _current_shared_state.reset(token)
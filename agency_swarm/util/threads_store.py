@@ -0,0 +1,114 @@
+import atexit
+import json
+import os
+import threading
+import weakref
+from typing import Dict, Optional
+
+from agency_swarm.util.atomic import FileLock, atomic_write_json
+
+# stores with debounced writes, flushed together on interpreter exit
+_debounced_stores = weakref.WeakSet()
+_atexit_lock = threading.Lock()
+_atexit_registered = False
+
+
+def _flush_all():
+    for store in list(_debounced_stores):
+        store.flush()
+
+
+def _register_for_exit(store: "ThreadsStore"):
+    global _atexit_registered
+    with _atexit_lock:
+        _debounced_stores.add(store)
+        if not _atexit_registered:
+            atexit.register(_flush_all)
+            _atexit_registered = True
+
+
+class ThreadsStore:
+    """
+    Keeps the ids of the threads between agents, in the `{agent_name: {recipient_name: thread_id}, "main_thread": id}`
+    format of threads.json.
+
+    Threads are created lazily, so ids are recorded one at a time as they appear. Writes are debounced: a change
+    schedules a write `debounce` seconds later and all changes made in the meantime are written together. Pending
+    changes are also written on interpreter exit.
+    """
+
+    def __init__(self, path: str = None, callbacks=None, debounce: float = 0.5):
+        # resolve the path now, so a write scheduled before the working directory changes still lands in the right file
+        self.path = os.path.abspath(path) if path else None
+        self.callbacks = callbacks
+        self.debounce = debounce
+        self.lock = threading.RLock()
+        self.file_lock = FileLock(self.path) if self.path and not callbacks else None
+        self.thread_ids: Dict = {}
+        self._pending: Dict = {}
+        self._timer: Optional[threading.Timer] = None
+        # stores without debounce write every change right away, so they have nothing left to write on exit
+        if debounce > 0:
+            _register_for_exit(self)
+
+    def load(self) -> Dict:
+        with self.lock:
+            self.thread_ids = self._read()
+            return self.thread_ids
+
+    def get(self, agent_name: str, recipient_name: str = None) -> Optional[str]:
+        with self.lock:
+            if recipient_name is None:
+                return self.thread_ids.get(agent_name)
+            return self.thread_ids.get(agent_name, {}).get(recipient_name)
+
+    def set(self, agent_name: str, recipient_name: str = None, thread_id: str = None):
+        """Records a thread id. Pass no recipient name for top level entries like `main_thread`."""
+        with self.lock:
+            for ids in (self.thread_ids, self._pending):
+                if recipient_name is None:
+                    ids[agent_name] = thread_id
+                else:
+                    ids.setdefault(agent_name, {})[recipient_name] = thread_id
+            self._schedule()
+
+    def flush(self):
+        with self.lock:
+            if self._timer:
+                self._timer.cancel()
+                self._timer = None
+            if not self._pending:
+                return
+            if self.callbacks:
+                self.callbacks["save"](self._merge(dict(self.thread_ids)))
+            elif self.path:
+                with self.file_lock:
+                    # merge with the file, in case another process has created threads in the meantime
+                    self.thread_ids = self._merge(self._read())
+                    atomic_write_json(self.path, self.thread_ids)
+            self._pending = {}
+
+    def _schedule(self):
+        if self.debounce <= 0:
+            self.flush()
+        elif not self._timer:
+            self._timer = threading.Timer(self.debounce, self.flush)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _merge(self, thread_ids: Dict) -> Dict:
+        for key, value in self._pending.items():
+            if isinstance(value, dict):
+                thread_ids[key] = {**thread_ids.get(key, {}), **value}
+            else:
+                thread_ids[key] = value
+        return thread_ids
+
+    def _read(self) -> Dict:
+        if self.callbacks:
+            return self.callbacks["load"]() or {}
+        if not self.path or not os.path.isfile(self.path):
+            return {}
+        with open(self.path, 'r') as f:
+            content = f.read()
+        return json.loads(content) if content.strip() else {}
@@ -0,0 +1,249 @@
+import json
+import threading
+from functools import lru_cache
+from typing import Callable, List, Literal, Optional
+
+# price in dollars per million prompt and completion tokens, and the generation speed in tokens per second.
+# Models are matched by the longest prefix, so dated versions like "gpt-4-turbo-2024-04-09" use their family's entry.
+MODEL_PROFILES = {
+    "gpt-4o": {"prompt": 5.0, "completion": 15.0, "tokens_per_second": 80},
+    "gpt-4-turbo": {"prompt": 10.0, "completion": 30.0, "tokens_per_second": 35},
+    "gpt-4-1106-preview": {"prompt": 10.0, "completion": 30.0, "tokens_per_second": 35},
+    "gpt-4-0125-preview": {"prompt": 10.0, "completion": 30.0, "tokens_per_second": 35},
+    "gpt-4": {"prompt": 30.0, "completion": 60.0, "tokens_per_second": 25},
+    "gpt-3.5-turbo": {"prompt": 0.5, "completion": 1.5, "tokens_per_second": 90},
+}
+
+# tokens added by the API around every message of a thread
+MESSAGE_OVERHEAD = 4
+# seconds from creating a run to its first token, and prompt tokens processed per second
+RUN_OVERHEAD = 1.0
+PROMPT_TOKENS_PER_SECOND = 5000
+# completion tokens assumed for a run before any run of the thread has been observed
+DEFAULT_COMPLETION_TOKENS = 256
+
+SUMMARY_PROMPT = ("Summarize the following conversation between a user and an assistant. Keep every fact, decision, "
+                  "open task and file or tool reference that could matter later. Reply with the summary only.")
+
+
+@lru_cache(maxsize=None)
+def _get_encoding(model: str):
+    try:
+        import tiktoken
+    except ImportError:
+        return None
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception:
+        # the encoding files could not be downloaded
+        return None
+
+
+@lru_cache(maxsize=4096)
+def count_tokens(text: str, model: str = "gpt-4-turbo") -> int:
+    """
+    Returns the number of tokens of a text. Uses `tiktoken` if it is installed, otherwise estimates about 4 characters
+    per token, which is close enough for English text to plan a budget.
+    """
+    if not text:
+        return 0
+    encoding = _get_encoding(model)
+    if encoding is None:
+        return (len(text) + 3) // 4
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def get_model_profile(model: str) -> dict:
+    """Returns the price and speed of a model, or those of gpt-4-turbo for unknown models."""
+    matches = [name for name in MODEL_PROFILES if model and model.startswith(name)]
+    return MODEL_PROFILES[max(matches, key=len)] if matches else MODEL_PROFILES["gpt-4-turbo"]
+
+
+def get_cost(model: str, prompt_tokens: int, completion_tokens: int) -> float:
+    profile = get_model_profile(model)
+    return (prompt_tokens * profile["prompt"] + completion_tokens * profile["completion"]) / 1_000_000
+
+
+def summarize_messages(messages: List[dict], previous_summary: str = None, model: str = "gpt-3.5-turbo") -> str:
+    """Default summarizer of a `TokenBudget`. Summarizes the messages, and the previous summary, with a chat model."""
+    from agency_swarm.util.oai import get_openai_client
+
+    transcript = "\n".join(f"{message['role']}: {message['text']}" for message in messages)
+    if previous_summary:
+        transcript = f"Summary of the earlier conversation: {previous_summary}\n{transcript}"
+    completion = get_openai_client().chat.completions.create(
+        model=model,
+        messages=[{"role": "system", "content": SUMMARY_PROMPT}, {"role": "user", "content": transcript}],
+    )
+    return completion.choices[0].message.content
+
+
+class TokenBudget:
+    """
+    Prompt budget of an agent's runs, checked locally before each run is created.
+
+    When the projected prompt of a run is larger than `max_prompt_tokens`, only the latest messages that fit into the
+    budget are sent, with a `last_messages` truncation strategy. With the "summarize" strategy, the messages that are
+    cut off are summarized by `summarizer` and the summary is added to the run's additional instructions. The summary
+    is extended as more messages are cut off, so each message is summarized once. If the agent has its own
+    `truncation_strategy`, the budget only records the projection.
+    """
+
+    def __init__(self,
+                 max_prompt_tokens: int,
+                 strategy: Literal["truncate", "summarize"] = "truncate",
+                 min_last_messages: int = 2,
+                 summary_tokens: int = 500,
+                 summary_model: str = "gpt-3.5-turbo",
+                 summarizer: Callable[[List[dict], Optional[str]], str] = None):
+        if strategy not in ("truncate", "summarize"):
+            raise ValueError("strategy must be 'truncate' or 'summarize'")
+        self.max_prompt_tokens = max_prompt_tokens
+        self.strategy = strategy
+        self.min_last_messages = min_last_messages
+        # tokens kept free for the summary when the "summarize" strategy is used
+        self.summary_tokens = summary_tokens
+        self.summary_model = summary_model
+        self.summarizer = summarizer or (lambda messages, previous_summary: summarize_messages(
+            messages, previous_summary, self.summary_model))
+
+
+class TokenCounter:
+    """
+    Running token count of one thread: the size of every message this process has added to or read from it.
+
+    Messages sent before the thread was loaded are unknown, so after each single step run the difference between the
+    prompt tokens reported by the API and the local estimate is kept as an offset. Projections then include the
+    agent's instructions and tool schemas, the offset and the expected completion.
+    """
+
+    def __init__(self, max_messages: int = 500):
+        self.max_messages = max_messages
+        self.lock = threading.Lock()
+        # {"role", "text", "tokens"} of each message, oldest first
+        self.messages: List[dict] = []
+        # tokens of the thread that were not counted locally, learnt from run usage
+        self.offset = 0
+        self.summary = None
+        # number of messages, from the start of `messages`, covered by `summary`
+        self.summarized = 0
+        self.completion_tokens = []
+        self.usage = {"runs": 0, "prompt_tokens": 0, "completion_tokens": 0, "cost": 0.0}
+
+    def add_message(self, role: str, text: str, model: str = "gpt-4-turbo"):
+        if not isinstance(text, str):
+            text = json.dumps(text, default=str)
+        with self.lock:
+            self.messages.append({"role": role, "text": text, "tokens": count_tokens(text, model) + MESSAGE_OVERHEAD})
+            if len(self.messages) > self.max_messages:
+                dropped = self.messages[:len(self.messages) - self.max_messages]
+                self.offset += sum(message["tokens"] for message in dropped)
+                self.summarized = max(self.summarized - len(dropped), 0)
+                del self.messages[:len(dropped)]
+
+    def get_last_message_tokens(self, role: str = "user") -> int:
+        """Returns the tokens of the latest message with the given role, or 0 if there is none."""
+        with self.lock:
+            return next((message["tokens"] for message in reversed(self.messages) if message["role"] == role), 0)
+
+    @property
+    def total_tokens(self) -> int:
+        with self.lock:
+            return self.offset + sum(message["tokens"] for message in self.messages)
+
+    def project(self, agent, additional_instructions: str = None, model: str = None) -> dict:
+        """
+        Returns the expected prompt and completion tokens, cost and latency of the next run of the agent on this
+        thread, and whether its prompt exceeds the agent's token budget.
+        """
+        model = model or agent.model
+        base_tokens = self._get_base_tokens(agent, additional_instructions, model)
+        with self.lock:
+            thread_tokens = self.offset + sum(message["tokens"] for message in self.messages)
+            observed = self.completion_tokens[-20:]
+        completion_tokens = sum(observed) // len(observed) if observed else DEFAULT_COMPLETION_TOKENS
+        if agent.max_completion_tokens:
+            completion_tokens = min(completion_tokens, agent.max_completion_tokens)
+        prompt_tokens = base_tokens + thread_tokens
+        if agent.max_prompt_tokens:
+            prompt_tokens = min(prompt_tokens, agent.max_prompt_tokens)
+
+        budget = agent.token_budget
+        profile = get_model_profile(model)
+        return {
+            "model": model,
+            "base_tokens": base_tokens,
+            "thread_tokens": thread_tokens,
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "cost": get_cost(model, prompt_tokens, completion_tokens),
+            "latency": (RUN_OVERHEAD + prompt_tokens / PROMPT_TOKENS_PER_SECOND
+                        + completion_tokens / profile["tokens_per_second"]),
+            "over_budget": bool(budget and prompt_tokens > budget.max_prompt_tokens),
+        }
+
+    def apply_budget(self, agent, projection: dict) -> Optional[dict]:
+        """
+        Returns the truncation strategy that keeps the next run within the agent's token budget, or None if the
+        projected prompt fits. With the "summarize" strategy, the summary of the cut off messages is updated first.
+        """
+        budget = agent.token_budget
+        if not projection["over_budget"] or agent.truncation_strategy:
+            return None
+
+        reserved = budget.summary_tokens if budget.strategy == "summarize" else 0
+        available = budget.max_prompt_tokens - projection["base_tokens"] - reserved
+        with self.lock:
+            kept = 0
+            used = 0
+            for message in reversed(self.messages):
+                if kept >= budget.min_last_messages and used + message["tokens"] > available:
+                    break
+                kept += 1
+                used += message["tokens"]
+            cut_off = self.messages[self.summarized:len(self.messages) - kept]
+
+        if budget.strategy == "summarize" and cut_off:
+            summary = budget.summarizer([{"role": m["role"], "text": m["text"]} for m in cut_off], self.summary)
+            with self.lock:
+                self.summary = summary
+                self.summarized += len(cut_off)
+
+        return {"type": "last_messages", "last_messages": kept}
+
+    def get_summary_instructions(self) -> Optional[str]:
+        if not self.summary:
+            return None
+        return f"Summary of the earlier conversation, which is no longer shown: {self.summary}"
+
+    def observe(self, projection: dict, usage, single_step: bool):
+        """
+        Records the token usage of a finished run. Single step runs without truncation also correct the offset, as
+        their prompt tokens are the actual size of the thread. Runs with tool calls report the sum over all steps.
+        """
+        if not usage:
+            return
+        with self.lock:
+            self.usage["runs"] += 1
+            self.usage["prompt_tokens"] += usage.prompt_tokens
+            self.usage["completion_tokens"] += usage.completion_tokens
+            self.usage["cost"] += get_cost(projection["model"], usage.prompt_tokens, usage.completion_tokens)
+            if single_step:
+                self.completion_tokens = self.completion_tokens[-19:] + [usage.completion_tokens]
+                if not projection.get("truncated"):
+                    error = usage.prompt_tokens - projection["base_tokens"] - projection["thread_tokens"]
+                    self.offset = max(self.offset + error, 0)
+
+    def get_stats(self) -> dict:
+        with self.lock:
+            return {"messages": len(self.messages),
+                    "tokens": self.offset + sum(message["tokens"] for message in self.messages),
+                    "summarized": self.summarized, **self.usage}
+
+    @staticmethod
+    def _get_base_tokens(agent, additional_instructions: str, model: str) -> int:
+        tools = json.dumps(agent.get_oai_tools(), sort_keys=True) if agent.tools else ""
+        return (count_tokens(agent.instructions or "", model) + count_tokens(additional_instructions or "", model)
+                + count_tokens(tools, model) + MESSAGE_OVERHEAD)
@@ -0,0 +1,160 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import Counter, OrderedDict
+from typing import Any, Optional, Tuple
+
+_tool_cache = None
+_tool_cache_lock = threading.Lock()
+
+# fields of BaseTool that are set by the thread and don't affect the output
+_excluded_fields = {"caller_agent", "event_handler", "one_call_at_a_time"}
+
+
+class ToolCache:
+    """
+    Results of tool calls, for tools that set `cacheable = True`. Repeated calls with the same validated arguments
+    are answered from the cache until the entry expires after the tool's `cache_ttl` seconds.
+
+    The least recently used entries are evicted once there are more than `max_entries` in memory. If a `path` is given,
+    results are also written to an SQLite database, which keeps up to `max_disk_entries` and survives restarts. Disk
+    entries are stored as JSON, so outputs that are not JSON serializable come back as their string form, which is
+    what is sent to the assistant anyway.
+    """
+
+    def __init__(self, max_entries: int = 1024, path: str = None, max_disk_entries: int = 10000):
+        self.max_entries = max_entries
+        self.path = path
+        self.max_disk_entries = max_disk_entries
+        self.lock = threading.RLock()
+        # key -> (output, expires_at)
+        self.entries: "OrderedDict[str, Tuple[Any, Optional[float]]]" = OrderedDict()
+        self.hits = Counter()
+        self.misses = Counter()
+        self.evictions = 0
+        self.expirations = 0
+
+        if self.path:
+            conn = self._connect()
+            try:
+                with conn:
+                    conn.execute("CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, tool TEXT, output TEXT, "
+                                 "expires_at REAL, accessed_at REAL)")
+                    conn.execute("CREATE INDEX IF NOT EXISTS results_accessed ON results (accessed_at)")
+            finally:
+                conn.close()
+
+    @staticmethod
+    def get_key(tool) -> str:
+        """Returns the cache key of an initialized tool: a hash of its schema and its arguments."""
+        arguments = tool.model_dump(exclude=_excluded_fields)
+        data = json.dumps([tool.openai_schema, arguments], sort_keys=True, default=str)
+        return hashlib.sha256(data.encode()).hexdigest()
+
+    def get(self, key: str, tool_name: str = None) -> Tuple[bool, Any]:
+        """Returns whether the key was found and its output."""
+        now = time.time()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None and self.path:
+                entry = self._read(key)
+                if entry is not None:
+                    self._add(key, entry)
+            if entry is not None and entry[1] is not None and entry[1] <= now:
+                self._delete(key)
+                self.expirations += 1
+                entry = None
+            if entry is None:
+                self.misses[tool_name] += 1
+                return False, None
+            self.entries.move_to_end(key)
+            self.hits[tool_name] += 1
+            return True, entry[0]
+
+    def set(self, key: str, output: Any, ttl: Optional[float] = None, tool_name: str = None):
+        """Stores the output of a tool call. With a `ttl` of None the entry only leaves the cache when evicted."""
+        expires_at = time.time() + ttl if ttl is not None else None
+        with self.lock:
+            self._add(key, (output, expires_at))
+            if self.path:
+                conn = self._connect()
+                try:
+                    with conn:
+                        conn.execute("INSERT OR REPLACE INTO results (key, tool, output, expires_at, accessed_at) "
+                                     "VALUES (?, ?, ?, ?, ?)",
+                                     (key, tool_name, json.dumps(output, default=str), expires_at, time.time()))
+                        conn.execute("DELETE FROM results WHERE key IN (SELECT key FROM results "
+                                     "ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)", (self.max_disk_entries,))
+                finally:
+                    conn.close()
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            if self.path:
+                conn = self._connect()
+                try:
+                    with conn:
+                        conn.execute("DELETE FROM results")
+                finally:
+                    conn.close()
+
+    def get_stats(self):
+        """Returns the number of entries, hits, misses, evictions and expirations, in total and per tool."""
+        with self.lock:
+            tools = {name: {"hits": self.hits[name], "misses": self.misses[name]}
+                     for name in set(self.hits) | set(self.misses) if name}
+            hits, misses = sum(self.hits.values()), sum(self.misses.values())
+            return {"entries": len(self.entries), "hits": hits, "misses": misses,
+                    "hit_rate": hits / (hits + misses) if hits + misses else 0.0,
+                    "evictions": self.evictions, "expirations": self.expirations, "tools": tools}
+
+    def _add(self, key: str, entry: Tuple[Any, Optional[float]]):
+        self.entries[key] = entry
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def _delete(self, key: str):
+        self.entries.pop(key, None)
+        if self.path:
+            conn = self._connect()
+            try:
+                with conn:
+                    conn.execute("DELETE FROM results WHERE key = ?", (key,))
+            finally:
+                conn.close()
+
+    def _read(self, key: str) -> Optional[Tuple[Any, Optional[float]]]:
+        conn = self._connect()
+        try:
+            with conn:
+                row = conn.execute("SELECT output, expires_at FROM results WHERE key = ?", (key,)).fetchone()
+                if row:
+                    conn.execute("UPDATE results SET accessed_at = ? WHERE key = ?", (time.time(), key))
+        finally:
+            conn.close()
+        return (json.loads(row[0]), row[1]) if row else None
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+
+def get_tool_cache() -> ToolCache:
+    global _tool_cache
+    with _tool_cache_lock:
+        if _tool_cache is None:
+            _tool_cache = ToolCache()
+        return _tool_cache
+
+
+def set_tool_cache(cache: ToolCache):
+    """Replaces the cache shared by all threads, for example with one that persists results to disk."""
+    global _tool_cache
+    with _tool_cache_lock:
+        _tool_cache = cache
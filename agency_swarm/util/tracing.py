@@ -0,0 +1,209 @@
+import contextvars
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import List, Optional
+
+from agency_swarm.util.streaming import AgencyEventHandler
+
+_current_span: contextvars.ContextVar[Optional["Span"]] = contextvars.ContextVar("agency_swarm_span", default=None)
+_tracer = None
+_tracer_lock = threading.Lock()
+
+
+class Span:
+    """
+    A timed operation in a trace, like an agent hop, a run or a tool call. Spans started while another span is active
+    become its children, across threads started by the agency and across coroutines.
+    """
+
+    def __init__(self, name: str, parent: Optional["Span"] = None, attributes: dict = None):
+        self.name = name
+        self.trace_id = parent.trace_id if parent else uuid.uuid4().hex
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent.span_id if parent else None
+        self.attributes = dict(attributes or {})
+        self.events = []
+        self.status = "ok"
+        self.status_description = None
+        self.start_time = time.time()
+        self.end_time = None
+
+    @property
+    def duration(self) -> Optional[float]:
+        return self.end_time - self.start_time if self.end_time else None
+
+    def set_attribute(self, key: str, value):
+        self.attributes[key] = value
+
+    def set_attributes(self, **attributes):
+        self.attributes.update(attributes)
+
+    def add_event(self, name: str, **attributes):
+        self.events.append({"name": name, "time": time.time(), "attributes": attributes})
+
+    def set_status(self, status: str, description: str = None):
+        self.status = status
+        self.status_description = description
+
+    def end(self):
+        if self.end_time is None:
+            self.end_time = time.time()
+
+    def to_dict(self) -> dict:
+        return {
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start_time": self.start_time,
+            "end_time": self.end_time,
+            "duration": self.duration,
+            "status": self.status,
+            "status_description": self.status_description,
+            "attributes": self.attributes,
+            "events": self.events,
+        }
+
+
+class SpanExporter:
+    """Receives every span once it has ended. Subclass it to send spans to your own backend."""
+
+    def export(self, span: Span):
+        raise NotImplementedError
+
+    def shutdown(self):
+        pass
+
+
+class InMemoryExporter(SpanExporter):
+    """Keeps finished spans in a list, for tests and for inspecting traces interactively."""
+
+    def __init__(self):
+        self.spans: List[Span] = []
+        self.lock = threading.Lock()
+
+    def export(self, span: Span):
+        with self.lock:
+            self.spans.append(span)
+
+    def get_spans(self, name: str = None) -> List[Span]:
+        with self.lock:
+            return [span for span in self.spans if name is None or span.name == name]
+
+
+class JSONLExporter(SpanExporter):
+    """Appends each finished span as one JSON line to a local file."""
+
+    def __init__(self, path: str = "./traces.jsonl"):
+        self.path = path
+        self.lock = threading.Lock()
+        self._file = None
+
+    def export(self, span: Span):
+        line = json.dumps(span.to_dict(), default=str)
+        with self.lock:
+            if self._file is None:
+                directory = os.path.dirname(os.path.abspath(self.path))
+                os.makedirs(directory, exist_ok=True)
+                self._file = open(self.path, 'a')
+            self._file.write(line + "\n")
+            self._file.flush()
+
+    def shutdown(self):
+        with self.lock:
+            if self._file:
+                self._file.close()
+                self._file = None
+
+
+class Tracer:
+    """
+    Records hierarchical traces of agency requests. Without exporters spans are still created, so the active span can
+    be annotated, but they are discarded when they end.
+    """
+
+    def __init__(self, exporters: List[SpanExporter] = None):
+        self.exporters = list(exporters or [])
+
+    def add_exporter(self, exporter: SpanExporter):
+        self.exporters.append(exporter)
+
+    @contextmanager
+    def start_span(self, name: str, **attributes):
+        span = Span(name, _current_span.get(), attributes)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.set_status("error", str(e))
+            raise
+        finally:
+            span.end()
+            _current_span.reset(token)
+            for exporter in self.exporters:
+                try:
+                    exporter.export(span)
+                except Exception as e:
+                    print(f"Warning: could not export span '{span.name}' ({e}).")
+
+    def shutdown(self):
+        for exporter in self.exporters:
+            exporter.shutdown()
+
+
+class TracingEventHandler(AgencyEventHandler):
+    """
+    Event handler that adds streaming events to the active run span: time to the first token, created messages and
+    tool calls, and errors. Subclass it instead of `AgencyEventHandler` to keep these events when streaming.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._first_token = False
+
+    def on_text_delta(self, delta, snapshot):
+        if not self._first_token:
+            self._first_token = True
+            span = get_current_span()
+            if span:
+                span.add_event("first_token")
+                span.set_attribute("time_to_first_token", time.time() - span.start_time)
+
+    def on_message_done(self, message):
+        span = get_current_span()
+        if span:
+            span.add_event("message_done", message_id=message.id)
+
+    def on_tool_call_done(self, tool_call):
+        span = get_current_span()
+        if span:
+            name = tool_call.function.name if tool_call.type == "function" else tool_call.type
+            span.add_event("tool_call_requested", tool_call_id=tool_call.id, tool=name)
+
+    def on_exception(self, exception):
+        span = get_current_span()
+        if span:
+            span.add_event("exception", message=str(exception))
+
+
+def get_current_span() -> Optional[Span]:
+    return _current_span.get()
+
+
+def get_tracer() -> Tracer:
+    global _tracer
+    with _tracer_lock:
+        if _tracer is None:
+            _tracer = Tracer()
+        return _tracer
+
+
+def set_tracer(tracer: Tracer):
+    """Replaces the tracer used by all agencies, for example with `Tracer([JSONLExporter("traces.jsonl")])`."""
+    global _tracer
+    with _tracer_lock:
+        _tracer = tracer
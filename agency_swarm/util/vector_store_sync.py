@@ -0,0 +1,83 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, List
+
+from openai import NOT_GIVEN
+
+
+def list_vector_store_file_ids(client, vector_store_id: str, page_size: int = 100) -> List[str]:
+    """Returns the ids of all files in a vector store, following the pages until the last one."""
+    file_ids = []
+    after = NOT_GIVEN
+    while True:
+        page = client.beta.vector_stores.files.list(vector_store_id=vector_store_id, limit=page_size, after=after)
+        file_ids.extend(file.id for file in page.data)
+        if not page.data or not getattr(page, "has_more", False):
+            return file_ids
+        after = page.data[-1].id
+
+
+class VectorStoreSync:
+    """
+    Keeps the files of a vector store in sync with a list of file ids.
+
+    The files of the store are listed once and compared with the desired ids. Only the missing files are attached,
+    in batches of up to `batch_size` files that are sent in parallel, and files that are no longer wanted are
+    detached in parallel. Since uploaded files are identified by the hash of their content, changed files get a new
+    id, so they are detached and attached again.
+    """
+
+    def __init__(self, client, vector_store_id: str, batch_size: int = 500, max_workers: int = 8):
+        self.client = client
+        self.vector_store_id = vector_store_id
+        self.batch_size = batch_size
+        self.max_workers = max_workers
+
+    def get_file_ids(self) -> List[str]:
+        return list_vector_store_file_ids(self.client, self.vector_store_id)
+
+    def add(self, file_ids: Iterable[str]) -> List[str]:
+        """Attaches the files that are not in the store yet. Returns the ids of the attached files."""
+        existing = set(self.get_file_ids())
+        new_file_ids = [file_id for file_id in dict.fromkeys(file_ids) if file_id not in existing]
+        self._attach(new_file_ids)
+        return new_file_ids
+
+    def sync(self, file_ids: Iterable[str], managed_ids: Iterable[str] = None) -> dict:
+        """
+        Makes the store contain exactly the given files. With `managed_ids`, only those files are ever detached, so
+        files that were attached in other ways stay in the store.
+
+        Returns:
+            dict: The ids of the `attached` and `detached` files and the number of `unchanged` ones.
+        """
+        file_ids = list(dict.fromkeys(file_ids))
+        existing = self.get_file_ids()
+        wanted, current = set(file_ids), set(existing)
+        attached = [file_id for file_id in file_ids if file_id not in current]
+        detached = [file_id for file_id in existing if file_id not in wanted]
+        if managed_ids is not None:
+            managed = set(managed_ids)
+            detached = [file_id for file_id in detached if file_id in managed]
+
+        self._attach(attached)
+        self._detach(detached)
+        return {"attached": attached, "detached": detached, "unchanged": len(current & wanted)}
+
+    def _attach(self, file_ids: List[str]):
+        batches = [file_ids[i:i + self.batch_size] for i in range(0, len(file_ids), self.batch_size)]
+        self._map(lambda batch: self.client.beta.vector_stores.file_batches.create(
+            vector_store_id=self.vector_store_id, file_ids=batch), batches)
+
+    def _detach(self, file_ids: List[str]):
+        self._map(lambda file_id: self.client.beta.vector_stores.files.delete(
+            file_id, vector_store_id=self.vector_store_id), file_ids)
+
+    def _map(self, fn, items: list):
+        if not items:
+            return
+        if len(items) == 1:
+            fn(items[0])
+            return
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(items))) as executor:
+            # consume the results, so the first error is raised
+            list(executor.map(fn, items))
@@ -0,0 +1,189 @@
+import contextvars
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Deque, Dict, Optional
+
+from agency_swarm.util.http import LatencyHistogram
+
+_worker_pool = None
+_worker_pool_lock = threading.Lock()
+
+
+class QueueFullError(Exception):
+    """Raised when a job is submitted while the queue of a worker pool is full."""
+
+
+class Job:
+    """A function submitted to a worker pool, with its status, result and timings."""
+
+    def __init__(self, key: str, func: Callable, args: tuple, kwargs: dict):
+        self.id = uuid.uuid4().hex[:12]
+        self.key = key
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        # the job runs in a copy of the context it was submitted from, so its trace is nested under the caller
+        self.context = contextvars.copy_context()
+        self.status = "queued"
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+        self.submitted_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self._done = threading.Event()
+
+    @property
+    def done(self) -> bool:
+        return self._done.is_set()
+
+    def wait(self, timeout: float = None) -> bool:
+        """Waits until the job is done. Returns False on timeout."""
+        return self._done.wait(timeout)
+
+
+class WorkerPool:
+    """
+    Runs jobs on a fixed number of worker threads, one job per key at a time.
+
+    Jobs with the same key, for example messages to the same agent, wait in a FIFO queue until the previous one is
+    done. Jobs with different keys run in parallel, up to `max_workers`. Once `max_queue_size` jobs are waiting,
+    `submit` raises `QueueFullError` instead of queueing more work. Queue wait and run times are recorded in
+    histograms, see `get_stats`.
+    """
+
+    def __init__(self, max_workers: int = 8, max_queue_size: int = 100):
+        self.max_workers = max_workers
+        self.max_queue_size = max_queue_size
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="agency-worker")
+        self.lock = threading.Lock()
+        # job of each key that is running or waiting for a free worker
+        self.active: Dict[str, Job] = {}
+        # jobs waiting for the active job of their key to finish
+        self.queues: Dict[str, Deque[Job]] = {}
+        # jobs that have not started yet, in the queues or waiting for a free worker
+        self.pending = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.wait_times = LatencyHistogram()
+        self.run_times = LatencyHistogram()
+        self.closed = False
+
+    def submit(self, key: str, func: Callable, *args, **kwargs) -> Job:
+        job = Job(key, func, args, kwargs)
+        with self.lock:
+            if self.closed:
+                raise RuntimeError("The worker pool has been shut down.")
+            if self.pending >= self.max_queue_size:
+                self.rejected += 1
+                raise QueueFullError(f"{self.pending} jobs are already waiting.")
+            self.pending += 1
+            if key in self.active:
+                self.queues.setdefault(key, deque()).append(job)
+            else:
+                self.active[key] = job
+                self.executor.submit(self._run, job)
+        return job
+
+    def get_position(self, job: Job) -> int:
+        """Returns the number of jobs with the same key ahead of the job, or 0 once it is next in line."""
+        with self.lock:
+            queue = self.queues.get(job.key)
+            if queue and job in queue:
+                # the active job of the key is ahead of the whole queue
+                return queue.index(job) + 1
+            return 0
+
+    def get_queue_depth(self, key: str) -> int:
+        """Returns the number of jobs with the key that are waiting behind the active one."""
+        with self.lock:
+            return len(self.queues.get(key, ()))
+
+    def get_stats(self) -> dict:
+        with self.lock:
+            stats = {
+                "max_workers": self.max_workers,
+                "active": len(self.active),
+                "pending": self.pending,
+                "queue_depths": {key: len(queue) for key, queue in self.queues.items() if queue},
+                "completed": self.completed,
+                "failed": self.failed,
+                "rejected": self.rejected,
+            }
+        stats["wait_time"] = self.wait_times.snapshot()
+        stats["run_time"] = self.run_times.snapshot()
+        return stats
+
+    def shutdown(self, wait: bool = True):
+        """Stops the workers. Jobs that are waiting fail, running jobs finish, and are waited for if `wait` is set."""
+        with self.lock:
+            self.closed = True
+            queued = [job for queue in self.queues.values() for job in queue]
+            self.queues.clear()
+            self.pending -= len(queued)
+        for job in queued:
+            self._cancel(job)
+        self.executor.shutdown(wait=wait)
+
+    def _run(self, job: Job):
+        with self.lock:
+            self.pending -= 1
+            closed = self.closed
+        if closed:
+            # the job was waiting for a free worker when the pool was shut down
+            self._cancel(job)
+            return
+        job.started_at = time.time()
+        job.status = "running"
+        self.wait_times.observe(job.started_at - job.submitted_at)
+        try:
+            job.result = job.context.run(job.func, *job.args, **job.kwargs)
+            job.status = "completed"
+        except Exception as e:
+            job.error = e
+            job.status = "failed"
+        finally:
+            job.finished_at = time.time()
+            self.run_times.observe(job.finished_at - job.started_at)
+            with self.lock:
+                if job.status == "completed":
+                    self.completed += 1
+                else:
+                    self.failed += 1
+                queue = self.queues.get(job.key)
+                if queue:
+                    next_job = queue.popleft()
+                    self.active[job.key] = next_job
+                    self.executor.submit(self._run, next_job)
+                else:
+                    self.queues.pop(job.key, None)
+                    self.active.pop(job.key, None)
+            job._done.set()
+
+    def _cancel(self, job: Job):
+        job.error = RuntimeError("The worker pool was shut down before the job started.")
+        job.status = "failed"
+        job.finished_at = time.time()
+        with self.lock:
+            self.failed += 1
+            if self.active.get(job.key) is job:
+                self.active.pop(job.key)
+        job._done.set()
+
+
+def get_worker_pool() -> WorkerPool:
+    global _worker_pool
+    with _worker_pool_lock:
+        if _worker_pool is None:
+            _worker_pool = WorkerPool()
+        return _worker_pool
+
+
+def set_worker_pool(pool: WorkerPool):
+    """Replaces the pool used by async threads that don't belong to an agency with its own pool."""
+    global _worker_pool
+    with _worker_pool_lock:
+        _worker_pool = pool
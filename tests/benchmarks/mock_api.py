@@ -0,0 +1,415 @@
+"""
+Deterministic local stand-in for the parts of the Assistants API used by agency swarm.
+
+It plugs into the OpenAI clients through an `httpx.MockTransport`, so no sockets are opened and no tokens are spent.
+Assistants answer according to a script: a function per assistant name that gets the state of the run and returns
+either a text reply or a list of tool calls. Every request can be delayed by a fixed latency, to model the network.
+"""
+import asyncio
+import itertools
+import json
+import re
+import threading
+import time
+from collections import Counter
+from typing import Callable, Dict, List, Optional
+
+import httpx
+import openai
+
+from agency_swarm.util.oai import set_async_openai_client, set_openai_client
+
+
+def reply(text: str, delay: float = 0.0) -> dict:
+    """
+    Script action: the assistant answers with a text message. The response is delayed by `delay` seconds, on top of
+    the latency, to model a slow run without blocking other requests.
+    """
+    return {"type": "message", "text": text, "delay": delay}
+
+
+def call(name: str, **arguments) -> dict:
+    """Script action: the assistant calls a tool. Return a list of calls to call several tools at once."""
+    return {"type": "tool_call", "name": name, "arguments": arguments}
+
+
+class RunContext:
+    """State of a run passed to the script of an assistant."""
+
+    def __init__(self, api: "MockAssistantsAPI", assistant: dict, thread_id: str, run: dict):
+        self.api = api
+        self.assistant = assistant
+        self.thread_id = thread_id
+        self.run = run
+
+    @property
+    def name(self) -> str:
+        return self.assistant["name"]
+
+    @property
+    def message(self) -> str:
+        """The latest user message in the thread."""
+        for message in reversed(self.api.messages[self.thread_id]):
+            if message["role"] == "user":
+                return message["content"][0]["text"]["value"]
+        return ""
+
+    @property
+    def tool_outputs(self) -> List[dict]:
+        """Tool outputs submitted so far in this run."""
+        return self.run["_tool_outputs"]
+
+
+def echo_script(context: RunContext):
+    return reply(f"{context.name} received: {context.message}")
+
+
+class MockAssistantsAPI:
+    def __init__(self,
+                 latency: float = 0.0,
+                 scripts: Dict[str, Callable[[RunContext], object]] = None,
+                 default_script: Callable[[RunContext], object] = echo_script,
+                 text_chunks: int = 1):
+        """
+        Parameters:
+            latency: Seconds every request is delayed by.
+            scripts: Script for each assistant name, returning `reply(...)`, `call(...)` or a list of calls.
+            default_script: Script for assistants without their own script. Echoes the last user message.
+            text_chunks: Number of deltas each streamed message is split into.
+        """
+        self.latency = latency
+        self.scripts = scripts or {}
+        self.default_script = default_script
+        self.text_chunks = text_chunks
+
+        self.lock = threading.RLock()
+        self.ids = itertools.count(1)
+        self.assistants: Dict[str, dict] = {}
+        self.threads: Dict[str, dict] = {}
+        self.messages: Dict[str, List[dict]] = {}
+        self.runs: Dict[str, dict] = {}
+        self.files: Dict[str, dict] = {}
+        self.vector_stores: Dict[str, dict] = {}
+        self.requests = Counter()
+        self.injected_latency = 0.0
+
+        self.routes = [
+            ("POST", r"/assistants", self.create_assistant),
+            ("GET", r"/assistants/(?P<assistant_id>[^/]+)", self.retrieve_assistant),
+            ("POST", r"/assistants/(?P<assistant_id>[^/]+)", self.update_assistant),
+            ("DELETE", r"/assistants/(?P<assistant_id>[^/]+)", self.delete_object),
+            ("POST", r"/threads", self.create_thread),
+            ("GET", r"/threads/(?P<thread_id>[^/]+)", self.retrieve_thread),
+            ("POST", r"/threads/(?P<thread_id>[^/]+)/messages", self.create_message),
+            ("GET", r"/threads/(?P<thread_id>[^/]+)/messages", self.list_messages),
+            ("POST", r"/threads/(?P<thread_id>[^/]+)/runs", self.create_run),
+            ("GET", r"/threads/(?P<thread_id>[^/]+)/runs", self.list_runs),
+            ("GET", r"/threads/(?P<thread_id>[^/]+)/runs/(?P<run_id>[^/]+)", self.retrieve_run),
+            ("POST", r"/threads/(?P<thread_id>[^/]+)/runs/(?P<run_id>[^/]+)/submit_tool_outputs",
+             self.submit_tool_outputs),
+            ("POST", r"/threads/(?P<thread_id>[^/]+)/runs/(?P<run_id>[^/]+)/cancel", self.cancel_run),
+            ("POST", r"/files", self.create_file),
+            ("DELETE", r"/files/(?P<file_id>[^/]+)", self.delete_object),
+            ("POST", r"/vector_stores", self.create_vector_store),
+            ("DELETE", r"/vector_stores/(?P<vector_store_id>[^/]+)", self.delete_object),
+            ("POST", r"/vector_stores/(?P<vector_store_id>[^/]+)/file_batches", self.create_file_batch),
+            ("GET", r"/vector_stores/(?P<vector_store_id>[^/]+)/files", self.list_vector_store_files),
+            ("DELETE", r"/vector_stores/(?P<vector_store_id>[^/]+)/files/(?P<file_id>[^/]+)",
+             self.delete_vector_store_file),
+        ]
+
+    # --- Clients ---
+
+    def client(self) -> openai.OpenAI:
+        return openai.OpenAI(api_key="mock", base_url="http://mock/v1", max_retries=0,
+                             http_client=httpx.Client(transport=httpx.MockTransport(self.handle)))
+
+    def async_client(self) -> openai.AsyncOpenAI:
+        return openai.AsyncOpenAI(api_key="mock", base_url="http://mock/v1", max_retries=0,
+                                  http_client=httpx.AsyncClient(transport=httpx.MockTransport(self.ahandle)))
+
+    def install(self):
+        """Makes agency swarm use this mock for all new agents and threads."""
+        set_openai_client(self.client())
+        set_async_openai_client(self.async_client())
+        return self
+
+    def handle(self, request: httpx.Request) -> httpx.Response:
+        if self.latency:
+            time.sleep(self.latency)
+        response = self._dispatch(request)
+        if "x-mock-delay" in response.headers:
+            time.sleep(float(response.headers["x-mock-delay"]))
+        return response
+
+    async def ahandle(self, request: httpx.Request) -> httpx.Response:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        response = self._dispatch(request)
+        if "x-mock-delay" in response.headers:
+            await asyncio.sleep(float(response.headers["x-mock-delay"]))
+        return response
+
+    def _dispatch(self, request: httpx.Request) -> httpx.Response:
+        path = request.url.path.removeprefix("/v1")
+        for method, pattern, handler in self.routes:
+            match = re.fullmatch(pattern, path)
+            if method == request.method and match:
+                with self.lock:
+                    self.requests[f"{method} {self._route_name(pattern)}"] += 1
+                    self.injected_latency += self.latency
+                    body = {}
+                    if request.content and request.headers.get("content-type", "").startswith("application/json"):
+                        body = json.loads(request.content)
+                    try:
+                        return handler(request, body, **match.groupdict())
+                    except KeyError as e:
+                        return httpx.Response(404, json={"error": {"message": f"No such object: {e}"}})
+        return httpx.Response(404, json={"error": {"message": f"No mock for {request.method} {path}"}})
+
+    @staticmethod
+    def _route_name(pattern: str) -> str:
+        """Turns a route pattern into a readable name, like `/threads/{thread_id}/runs`."""
+        return re.sub(r"\(\?P<(\w+)>[^)]*\)", r"{\1}", pattern)
+
+    @property
+    def total_requests(self) -> int:
+        return sum(self.requests.values())
+
+    def _id(self, prefix: str) -> str:
+        return f"{prefix}_{next(self.ids):06d}"
+
+    # --- Assistants ---
+
+    def create_assistant(self, request, body):
+        assistant = {
+            "id": self._id("asst"), "object": "assistant", "created_at": int(time.time()),
+            "name": body.get("name"), "description": body.get("description"), "model": body.get("model"),
+            "instructions": body.get("instructions"), "tools": body.get("tools", []),
+            "metadata": body.get("metadata", {}), "temperature": body.get("temperature"),
+            "top_p": body.get("top_p"), "response_format": body.get("response_format"),
+            "tool_resources": self._tool_resources(body.get("tool_resources")),
+        }
+        self.assistants[assistant["id"]] = assistant
+        return httpx.Response(200, json=assistant)
+
+    def retrieve_assistant(self, request, body, assistant_id):
+        return httpx.Response(200, json=self.assistants[assistant_id])
+
+    def update_assistant(self, request, body, assistant_id):
+        assistant = self.assistants[assistant_id]
+        for key, value in body.items():
+            assistant[key] = self._tool_resources(value) if key == "tool_resources" else value
+        return httpx.Response(200, json=assistant)
+
+    def _tool_resources(self, tool_resources: Optional[dict]) -> Optional[dict]:
+        if not tool_resources:
+            return tool_resources
+        tool_resources = dict(tool_resources)
+        file_search = tool_resources.get("file_search")
+        if file_search and file_search.get("vector_stores"):
+            vector_store_ids = list(file_search.get("vector_store_ids") or [])
+            for vector_store in file_search["vector_stores"]:
+                vector_store_id = self._id("vs")
+                self.vector_stores[vector_store_id] = {"file_ids": list(vector_store.get("file_ids", []))}
+                vector_store_ids.append(vector_store_id)
+            tool_resources["file_search"] = {"vector_store_ids": vector_store_ids}
+        return tool_resources
+
+    def delete_object(self, request, body, **ids):
+        object_id = next(iter(ids.values()))
+        for objects in (self.assistants, self.files, self.vector_stores):
+            objects.pop(object_id, None)
+        return httpx.Response(200, json={"id": object_id, "object": "deleted", "deleted": True})
+
+    # --- Threads and messages ---
+
+    def create_thread(self, request, body):
+        thread = {"id": self._id("thread"), "object": "thread", "created_at": int(time.time()), "metadata": {}}
+        self.threads[thread["id"]] = thread
+        self.messages[thread["id"]] = []
+        return httpx.Response(200, json=thread)
+
+    def retrieve_thread(self, request, body, thread_id):
+        return httpx.Response(200, json=self.threads[thread_id])
+
+    def create_message(self, request, body, thread_id):
+        active_run = self._get_active_run(thread_id)
+        if active_run:
+            return self._error(f"Can't add messages to {thread_id} while a run {active_run['id']} is active.")
+        content = body.get("content", "")
+        message = self._add_message(thread_id, body.get("role", "user"), content if isinstance(content, str) else "")
+        return httpx.Response(200, json=message)
+
+    def list_messages(self, request, body, thread_id):
+        messages = self.messages[thread_id]
+        if request.url.params.get("order", "desc") == "desc":
+            messages = list(reversed(messages))
+        return httpx.Response(200, json=self._page(messages[:int(request.url.params.get("limit", 20))]))
+
+    def _add_message(self, thread_id: str, role: str, text: str, run: dict = None) -> dict:
+        message = {
+            "id": self._id("msg"), "object": "thread.message", "created_at": int(time.time()),
+            "thread_id": thread_id, "role": role, "status": "completed", "attachments": [], "metadata": {},
+            "assistant_id": run["assistant_id"] if run else None, "run_id": run["id"] if run else None,
+            "content": [{"type": "text", "text": {"value": text, "annotations": []}}],
+        }
+        self.messages[thread_id].append(message)
+        return message
+
+    @staticmethod
+    def _page(data: List[dict]) -> dict:
+        return {"object": "list", "data": data, "first_id": data[0]["id"] if data else None,
+                "last_id": data[-1]["id"] if data else None, "has_more": False}
+
+    # --- Runs ---
+
+    def create_run(self, request, body, thread_id):
+        run = {
+            "id": self._id("run"), "object": "thread.run", "created_at": int(time.time()),
+            "thread_id": thread_id, "assistant_id": body["assistant_id"], "status": "queued",
+            "model": self.assistants[body["assistant_id"]]["model"], "instructions": "", "tools": [],
+            "required_action": None, "last_error": None, "usage": None, "metadata": {},
+            "truncation_strategy": {"type": "auto"}, "_tool_outputs": [],
+        }
+        self.runs[run["id"]] = run
+        if body.get("stream"):
+            return self._stream(run, [("thread.run.created", self._public(run))])
+        return httpx.Response(200, json=self._public(run))
+
+    def list_runs(self, request, body, thread_id):
+        runs = [self._public(run) for run in reversed(list(self.runs.values())) if run["thread_id"] == thread_id]
+        return httpx.Response(200, json=self._page(runs[:int(request.url.params.get("limit", 20))]))
+
+    def retrieve_run(self, request, body, thread_id, run_id):
+        run = self.runs[run_id]
+        if run["status"] == "queued":
+            # runs created without streaming progress one step each time they are polled
+            self._advance(run)
+        return httpx.Response(200, json=self._public(run), headers=self._delay_header(run))
+
+    def submit_tool_outputs(self, request, body, thread_id, run_id):
+        run = self.runs[run_id]
+        if run["status"] != "requires_action":
+            return self._error(f"Runs in status \"{run['status']}\" do not accept tool outputs.")
+        run["_tool_outputs"].extend(body["tool_outputs"])
+        run["status"] = "queued"
+        run["required_action"] = None
+        if body.get("stream"):
+            return self._stream(run, [])
+        return httpx.Response(200, json=self._public(run))
+
+    def cancel_run(self, request, body, thread_id, run_id):
+        run = self.runs[run_id]
+        if run["status"] not in ("queued", "in_progress", "requires_action"):
+            return self._error(f"Cannot cancel run with status '{run['status']}'.")
+        run["status"] = "cancelled"
+        run["required_action"] = None
+        return httpx.Response(200, json=self._public(run))
+
+    def _get_active_run(self, thread_id: str) -> Optional[dict]:
+        return next((run for run in self.runs.values() if run["thread_id"] == thread_id
+                     and run["status"] in ("queued", "in_progress", "requires_action")), None)
+
+    @staticmethod
+    def _error(message: str) -> httpx.Response:
+        return httpx.Response(400, json={"error": {"message": message, "type": "invalid_request_error",
+                                                   "param": None, "code": None}})
+
+    def _advance(self, run: dict) -> List[tuple]:
+        """Runs the script of the assistant for one step and returns the stream events it produces."""
+        context = RunContext(self, self.assistants[run["assistant_id"]], run["thread_id"], run)
+        script = self.scripts.get(context.name, self.default_script)
+        action = script(context)
+        events = [("thread.run.in_progress", self._public({**run, "status": "in_progress"}))]
+
+        calls = action if isinstance(action, list) else [action]
+        if calls and calls[0]["type"] == "tool_call":
+            tool_calls = [{"id": self._id("call"), "type": "function",
+                           "function": {"name": c["name"], "arguments": json.dumps(c["arguments"])}} for c in calls]
+            step = {"id": self._id("step"), "object": "thread.run.step", "created_at": int(time.time()),
+                    "run_id": run["id"], "thread_id": run["thread_id"], "assistant_id": run["assistant_id"],
+                    "type": "tool_calls", "status": "in_progress",
+                    "step_details": {"type": "tool_calls", "tool_calls": []}}
+            run["status"] = "requires_action"
+            run["required_action"] = {"type": "submit_tool_outputs",
+                                      "submit_tool_outputs": {"tool_calls": tool_calls}}
+            # streamed tool calls arrive as step deltas, like in the real API
+            step_delta = {"id": step["id"], "object": "thread.run.step.delta",
+                          "delta": {"step_details": {"type": "tool_calls", "tool_calls": [
+                              {"index": i, **tool_call} for i, tool_call in enumerate(tool_calls)]}}}
+            events += [("thread.run.step.created", step), ("thread.run.step.delta", step_delta),
+                       ("thread.run.requires_action", self._public(run))]
+        else:
+            text = action["text"]
+            run["_delay"] = action.get("delay", 0.0)
+            message = self._add_message(run["thread_id"], "assistant", text, run)
+            events.append(("thread.message.created", {**message, "status": "in_progress", "content": []}))
+            size = max(len(text) // self.text_chunks, 1)
+            chunks = [text[i:i + size] for i in range(0, len(text), size)] or [""]
+            for chunk in chunks:
+                events.append(("thread.message.delta", {"id": message["id"], "object": "thread.message.delta",
+                                                        "delta": {"content": [{"index": 0, "type": "text",
+                                                                               "text": {"value": chunk}}]}}))
+            run["status"] = "completed"
+            prompt_tokens = sum(len(m["content"][0]["text"]["value"]) // 4 for m in self.messages[run["thread_id"]])
+            run["usage"] = {"prompt_tokens": prompt_tokens, "completion_tokens": len(text) // 4,
+                            "total_tokens": prompt_tokens + len(text) // 4}
+            events += [("thread.message.completed", message), ("thread.run.completed", self._public(run))]
+        return events
+
+    def _stream(self, run: dict, events: List[tuple]) -> httpx.Response:
+        events = events + self._advance(run)
+        body = "".join(f"event: {event}\ndata: {json.dumps(data)}\n\n" for event, data in events)
+        body += "event: done\ndata: [DONE]\n\n"
+        return httpx.Response(200, headers={"content-type": "text/event-stream", **self._delay_header(run)},
+                              content=body.encode())
+
+    @staticmethod
+    def _delay_header(run: dict) -> dict:
+        """Header telling the transport handler to delay the response, once the lock is released."""
+        delay = run.pop("_delay", 0.0)
+        return {"x-mock-delay": str(delay)} if delay else {}
+
+    @staticmethod
+    def _public(run: dict) -> dict:
+        return {key: value for key, value in run.items() if not key.startswith("_")}
+
+    # --- Files and vector stores ---
+
+    def create_file(self, request, body):
+        file = {"id": self._id("file"), "object": "file", "bytes": len(request.content),
+                "created_at": int(time.time()), "filename": "upload", "purpose": "assistants", "status": "processed"}
+        self.files[file["id"]] = file
+        return httpx.Response(200, json=file)
+
+    def create_vector_store(self, request, body):
+        vector_store_id = self._id("vs")
+        self.vector_stores[vector_store_id] = {"file_ids": list(body.get("file_ids", []))}
+        return httpx.Response(200, json={"id": vector_store_id, "object": "vector_store", "name": body.get("name"),
+                                         "created_at": int(time.time()), "status": "completed", "usage_bytes": 0,
+                                         "file_counts": {"in_progress": 0, "completed": 0, "failed": 0,
+                                                         "cancelled": 0, "total": 0}})
+
+    def create_file_batch(self, request, body, vector_store_id):
+        self.vector_stores[vector_store_id]["file_ids"].extend(body["file_ids"])
+        return httpx.Response(200, json={"id": self._id("vsfb"), "object": "vector_store.files_batch",
+                                         "created_at": int(time.time()), "vector_store_id": vector_store_id,
+                                         "status": "completed",
+                                         "file_counts": {"in_progress": 0, "completed": len(body["file_ids"]),
+                                                         "failed": 0, "cancelled": 0,
+                                                         "total": len(body["file_ids"])}})
+
+    def list_vector_store_files(self, request, body, vector_store_id):
+        files = [{"id": file_id, "object": "vector_store.file", "created_at": 0, "usage_bytes": 0,
+                  "vector_store_id": vector_store_id, "status": "completed", "last_error": None}
+                 for file_id in self.vector_stores[vector_store_id]["file_ids"]]
+        after = request.url.params.get("after")
+        if after:
+            files = files[[file["id"] for file in files].index(after) + 1:]
+        limit = int(request.url.params.get("limit", 20))
+        return httpx.Response(200, json={**self._page(files[:limit]), "has_more": len(files) > limit})
+
+    def delete_vector_store_file(self, request, body, vector_store_id, file_id):
+        self.vector_stores[vector_store_id]["file_ids"].remove(file_id)
+        return httpx.Response(200, json={"id": file_id, "object": "vector_store.file.deleted", "deleted": True})
@@ -0,0 +1,292 @@
+"""
+Offline benchmarks of agency orchestration overhead, run against the mock Assistants API.
+
+Usage (from the repository root):
+
+    python tests/benchmarks/run_benchmarks.py                           # print the results table
+    python tests/benchmarks/run_benchmarks.py --save baseline.json      # store results as a baseline
+    python tests/benchmarks/run_benchmarks.py --baseline baseline.json  # compare, exit 1 on regressions
+
+Every scenario runs in a fresh temporary working directory, so settings, threads and file caches start empty.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from agency_swarm import Agency, Agent  # noqa: E402
+from agency_swarm.tools import BaseTool, FileSearch  # noqa: E402
+from mock_api import MockAssistantsAPI, call, reply  # noqa: E402
+from pydantic import Field  # noqa: E402
+
+METRICS = [
+    # key, column title, format
+    ("startup", "startup (s)", "{:.3f}"),
+    ("total", "total (s)", "{:.3f}"),
+    ("hops", "hops", "{}"),
+    ("overhead_per_hop", "overhead/hop (ms)", "{:.2f}"),
+    ("requests", "requests", "{}"),
+    ("peak_memory", "peak mem (MB)", "{:.1f}"),
+]
+
+
+def relay_script(next_name):
+    """Passes each message on to the next agent in the chain and answers with its response."""
+    def script(context):
+        if next_name and not context.tool_outputs:
+            return call("SendMessage", recipient=next_name, my_primary_instructions="Relay the message.",
+                        message=context.message)
+        return reply(context.tool_outputs[-1]["output"] if context.tool_outputs else "done")
+    return script
+
+
+def fan_out_script(worker_names):
+    """Sends the message to every worker, one after the other, then answers."""
+    def script(context):
+        sent = len(context.tool_outputs)
+        if sent < len(worker_names):
+            return call("SendMessage", recipient=worker_names[sent], my_primary_instructions="Ask every worker.",
+                        message=context.message)
+        return reply(f"{sent} workers answered")
+    return script
+
+
+def deep_chain(api, depth=10):
+    names = [f"Chain{i}" for i in range(depth)]
+    for i, name in enumerate(names):
+        api.scripts[name] = relay_script(names[i + 1] if i + 1 < depth else None)
+
+    def setup():
+        agents = [Agent(name=name, description=f"Agent {name}", instructions="Relay messages.") for name in names]
+        return Agency([agents[0]] + [[agents[i], agents[i + 1]] for i in range(depth - 1)], shared_instructions="")
+
+    def run(agency):
+        agency.get_completion("ping")
+        return depth
+
+    return setup, run
+
+
+def wide_fan_out(api, width=25):
+    worker_names = [f"Worker{i}" for i in range(width)]
+    api.scripts["Manager"] = fan_out_script(worker_names)
+
+    def setup():
+        manager = Agent(name="Manager", description="Manager", instructions="Ask every worker.")
+        workers = [Agent(name=name, description=f"Worker {name}", instructions="Answer.") for name in worker_names]
+        return Agency([manager] + [[manager, worker] for worker in workers], shared_instructions="")
+
+    def run(agency):
+        agency.get_completion("ping")
+        return width + 1
+
+    return setup, run
+
+
+def broadcast_fan_out(api, width=25):
+    """Like wide_fan_out, but the manager sends all tasks at once with BroadcastMessage."""
+    worker_names = [f"Worker{i}" for i in range(width)]
+
+    def script(context):
+        if not context.tool_outputs:
+            return call("BroadcastMessage", my_primary_instructions="Ask every worker.", message=context.message,
+                        tasks=[{"recipient": name} for name in worker_names])
+        return reply(f"{len(worker_names)} workers answered")
+
+    api.scripts["Manager"] = script
+
+    def setup():
+        manager = Agent(name="Manager", description="Manager", instructions="Ask every worker.")
+        workers = [Agent(name=name, description=f"Worker {name}", instructions="Answer.") for name in worker_names]
+        return Agency([manager] + [[manager, worker] for worker in workers], shared_instructions="",
+                      broadcast_messages=True)
+
+    def run(agency):
+        agency.get_completion("ping")
+        return width + 1
+
+    return setup, run
+
+
+def knowledge_upload(api, files=100):
+    def setup():
+        os.mkdir("files")
+        for i in range(files):
+            with open(os.path.join("files", f"doc{i}.txt"), "w") as f:
+                f.write(f"Knowledge document {i}\n" * 20)
+        agent = Agent(name="Librarian", description="Librarian", instructions="Answer from the files.",
+                      files_folder="./files", tools=[FileSearch])
+        return Agency([agent], shared_instructions="")
+
+    def run(agency):
+        agency.get_completion("What is in document 1?")
+        return 1
+
+    return setup, run
+
+
+def sequential_messages(api, count=1000):
+    def setup():
+        return Agency([Agent(name="Assistant", description="Assistant", instructions="Answer.")],
+                      shared_instructions="")
+
+    def run(agency):
+        for i in range(count):
+            agency.get_completion(f"message {i}")
+        return count
+
+    return setup, run
+
+
+def make_tool(i):
+    """Creates a tool class with a few fields of different types."""
+    def run(self):
+        return f"{self.query} ({self.limit})"
+
+    return type(f"Tool{i}", (BaseTool,), {
+        "__doc__": f"Tool number {i}. Looks up the query in data source {i}.",
+        "__annotations__": {"query": str, "limit": int, "tags": list[str]},
+        "query": Field(..., description="What to look up."),
+        "limit": Field(10, description="Maximum number of results."),
+        "tags": Field([], description="Tags to filter by."),
+        "run": run,
+    })
+
+
+def many_tools(api, tools=50):
+    tool_classes = [make_tool(i) for i in range(tools)]
+
+    def setup():
+        return Agency([Agent(name="Toolbox", description="Toolbox", instructions="Use your tools.",
+                             tools=tool_classes)], shared_instructions="")
+
+    def run(agency):
+        agency.get_completion("ping")
+        return 1
+
+    return setup, run
+
+
+SCENARIOS = {
+    "deep_chain": (deep_chain, {"depth": 10}),
+    "wide_fan_out": (wide_fan_out, {"width": 25}),
+    "broadcast_fan_out": (broadcast_fan_out, {"width": 25}),
+    "knowledge_upload": (knowledge_upload, {"files": 100}),
+    "sequential_messages": (sequential_messages, {"count": 1000}),
+    "many_tools": (many_tools, {"tools": 50}),
+}
+
+
+def run_scenario(name, latency=0.0, scale=1.0):
+    """Runs one scenario against a fresh mock API and returns its metrics."""
+    scenario, sizes = SCENARIOS[name]
+    sizes = {key: max(int(value * scale), 2) for key, value in sizes.items()}
+
+    api = MockAssistantsAPI(latency=latency).install()
+    setup, run = scenario(api, **sizes)
+
+    cwd = os.getcwd()
+    tmp_dir = tempfile.mkdtemp()
+    os.chdir(tmp_dir)
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            tracemalloc.start()
+            start = time.perf_counter()
+            agency = setup()
+            startup = time.perf_counter() - start
+            startup_latency = api.injected_latency
+
+            hops = run(agency)
+            total = time.perf_counter() - start
+            peak_memory = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            # write pending thread ids before the working directory is removed
+            agency.threads_store.flush()
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    run_time = total - startup
+    run_latency = api.injected_latency - startup_latency
+    return {
+        "startup": startup,
+        "total": total,
+        "hops": hops,
+        # time spent in agency swarm itself, without the simulated network latency
+        "overhead_per_hop": max(run_time - run_latency, 0) / hops * 1000,
+        "requests": api.total_requests,
+        "peak_memory": peak_memory / 1024 / 1024,
+    }
+
+
+def format_table(results, baseline=None, max_regression=0.2):
+    """Formats results as a text table. With a baseline, each value shows its relative change and regressions."""
+    header = ["scenario"] + [title for _, title, _ in METRICS]
+    rows = []
+    regressions = []
+    for name, metrics in results.items():
+        row = [name]
+        for key, title, fmt in METRICS:
+            cell = fmt.format(metrics[key])
+            previous = (baseline or {}).get(name, {}).get(key)
+            if previous:
+                change = (metrics[key] - previous) / previous
+                cell += f" ({change:+.0%})"
+                if change > max_regression and key not in ("hops",):
+                    cell += " !"
+                    regressions.append(f"{name}: {title} {fmt.format(previous)} -> {fmt.format(metrics[key])}")
+            row.append(cell)
+        rows.append(row)
+
+    widths = [max(len(str(row[i])) for row in [header] + rows) for i in range(len(header))]
+    lines = [" | ".join(str(cell).ljust(width) for cell, width in zip(row, widths)) for row in [header] + rows]
+    lines.insert(1, "-+-".join("-" * width for width in widths))
+    return "\n".join(lines), regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark agency orchestration against a mock Assistants API.")
+    parser.add_argument("scenarios", nargs="*", help=f"Scenarios to run: {', '.join(SCENARIOS)}. Runs all by default.")
+    parser.add_argument("--latency", type=float, default=0.0, help="Simulated latency of every request in seconds.")
+    parser.add_argument("--scale", type=float, default=1.0, help="Multiplies the size of every scenario.")
+    parser.add_argument("--baseline", help="JSON file with previous results to compare against.")
+    parser.add_argument("--save", help="Save the results as JSON to this file.")
+    parser.add_argument("--max-regression", type=float, default=0.2,
+                        help="Relative increase of a metric that counts as a regression.")
+    args = parser.parse_args(argv)
+    for name in args.scenarios:
+        if name not in SCENARIOS:
+            parser.error(f"unknown scenario '{name}'")
+
+
+    results = {name: run_scenario(name, args.latency, args.scale) for name in args.scenarios or SCENARIOS}
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    table, regressions = format_table(results, baseline, args.max_regression)
+    print(table)
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=4)
+
+    if regressions:
+        print("\nRegressions:\n" + "\n".join(regressions))
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,125 @@
+"""
+Microbenchmark of streaming text deltas to several subscribers, without any API calls.
+
+Compares the per-token `queue.Queue` fan-out that the Gradio demo used before with `StreamEventBus`. Every subscriber
+rebuilds the streamed message like the Gradio chat does, and each wake-up of a subscriber counts as one UI update.
+
+Usage (from the repository root):
+
+    python tests/benchmarks/stream_benchmark.py                       # 100k tokens, 3 subscribers
+    python tests/benchmarks/stream_benchmark.py --tokens 1000000 --subscribers 1
+"""
+import argparse
+import os
+import queue
+import sys
+import threading
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from agency_swarm.util.event_bus import StreamEventBus  # noqa: E402
+
+TOKENS = [" lorem", " ipsum", " dolor", " sit", " amet", ",", " consectetur", " adipiscing", " elit", "."]
+
+
+def naive_fan_out(tokens, subscribers):
+    """One queue per subscriber, one put and one UI update per token."""
+    queues = [queue.Queue() for _ in range(subscribers)]
+    updates = [0] * subscribers
+
+    def consume(i):
+        message = ""
+        while True:
+            token = queues[i].get()
+            if token is None:
+                break
+            message += token
+            updates[i] += 1
+
+    threads = [threading.Thread(target=consume, args=(i,)) for i in range(subscribers)]
+    for thread in threads:
+        thread.start()
+    for i in range(tokens):
+        token = TOKENS[i % len(TOKENS)]
+        for q in queues:
+            q.put(token)
+    for q in queues:
+        q.put(None)
+    for thread in threads:
+        thread.join()
+    return sum(updates)
+
+
+def bus_fan_out(tokens, subscribers, max_delay=0.05, max_chars=1024):
+    """One subscription per subscriber, one UI update per batch of coalesced deltas."""
+    bus = StreamEventBus(max_delay=max_delay, max_chars=max_chars)
+    subscriptions = [bus.subscribe() for _ in range(subscribers)]
+    updates = [0] * subscribers
+
+    def consume(i):
+        parts = []
+        for events in iter(subscriptions[i].get_batch, []):
+            parts.extend(event.text for event in events if event.type == "delta")
+            updates[i] += 1
+        "".join(parts)
+
+    threads = [threading.Thread(target=consume, args=(i,)) for i in range(subscribers)]
+    for thread in threads:
+        thread.start()
+    message_id = bus.start_message("text", "Assistant", "User")
+    for i in range(tokens):
+        bus.publish_delta(message_id, TOKENS[i % len(TOKENS)])
+    bus.end_message(message_id)
+    bus.close()
+    for thread in threads:
+        thread.join()
+    return sum(updates)
+
+
+def measure(func, tokens, subscribers, memory=False):
+    if memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    updates = func(tokens, subscribers)
+    elapsed = time.perf_counter() - start
+    peak_memory = 0
+    if memory:
+        peak_memory = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return {
+        "seconds": elapsed,
+        "tokens_per_second": tokens / elapsed,
+        "updates": updates,
+        "peak_memory": peak_memory / 1024 / 1024,
+    }
+
+
+def run(tokens=100_000, subscribers=3, memory=True):
+    """Returns the metrics of both fan-outs. Time is measured without tracemalloc, which slows down allocations."""
+    results = {}
+    for name, func in (("queue", naive_fan_out), ("event_bus", bus_fan_out)):
+        results[name] = measure(func, tokens, subscribers)
+        if memory:
+            results[name]["peak_memory"] = measure(func, tokens, subscribers, memory=True)["peak_memory"]
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark streaming fan-out of text deltas.")
+    parser.add_argument("--tokens", type=int, default=100_000, help="Number of streamed tokens.")
+    parser.add_argument("--subscribers", type=int, default=3, help="Number of subscribers.")
+    args = parser.parse_args(argv)
+
+    results = run(args.tokens, args.subscribers)
+    print(f"{args.tokens} tokens, {args.subscribers} subscribers")
+    print(f"{'fan-out':<10} | {'time (s)':>8} | {'tokens/s':>10} | {'UI updates':>10} | {'peak mem (MB)':>13}")
+    for name, metrics in results.items():
+        print(f"{name:<10} | {metrics['seconds']:>8.3f} | {metrics['tokens_per_second']:>10.0f} | "
+              f"{metrics['updates']:>10} | {metrics['peak_memory']:>13.1f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,216 @@
+import contextlib
+import io
+import os
+import queue
+import shutil
+import sys
+import tempfile
+import time
+import unittest
+from unittest.mock import patch
+
+sys.path.insert(0, '../agency-swarm')
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmarks'))
+from agency_swarm import Agency, Agent
+from agency_swarm.agency.server import AgencyServer, _serve
+from agency_swarm.util import oai
+from agency_swarm.util.session_registry import SessionLockTimeout, SessionRegistry
+from agency_swarm.util.worker_pool import WorkerPool
+from mock_api import MockAssistantsAPI
+
+
+class FakeAgency:
+    """Stands in for an agency in the worker processes, which can't share the in-memory mock API."""
+
+    def __init__(self):
+        self.threads_store = None
+        self.shut_down = False
+
+    def shutdown(self, wait=True):
+        self.shut_down = True
+
+    def set_threads_store(self, threads_store):
+        threads_store.load()
+        self.threads_store = threads_store
+
+    def get_completion(self, message, recipient_agent=None):
+        if message == "crash":
+            os._exit(1)
+        if message.startswith("sleep"):
+            time.sleep(float(message.split()[1]))
+        count = (self.threads_store.get("count") or 0) + 1
+        self.threads_store.set("count", thread_id=count)
+        return f"{os.getpid()}:{count}:{message}"
+
+
+def make_fake_agency():
+    return FakeAgency()
+
+
+def make_failing_agency():
+    raise ValueError("no api key")
+
+
+class SessionRegistryTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.registry = SessionRegistry(os.path.join(self.tmp_dir, "sessions.db"), lock_ttl=0.3)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def test_thread_ids_are_stored_per_session(self):
+        store = self.registry.get_threads_store("a")
+        store.load()
+        store.set("main_thread", thread_id="thread_1")
+        store.set("CEO", "Dev", "thread_2")
+
+        self.assertEqual(self.registry.get_thread_ids("a"), {"main_thread": "thread_1", "CEO": {"Dev": "thread_2"}})
+        self.assertEqual(self.registry.get_thread_ids("b"), {})
+        self.assertEqual(self.registry.get_sessions(), ["a"])
+
+    def test_threads_stores_are_reused_per_session(self):
+        registry = SessionRegistry(os.path.join(self.tmp_dir, "sessions.db"), max_threads_stores=2)
+
+        with patch("agency_swarm.util.threads_store.atexit.register") as register:
+            store = registry.get_threads_store("a")
+            self.assertIs(registry.get_threads_store("a"), store)
+            registry.get_threads_store("b")
+            registry.get_threads_store("a")
+            registry.get_threads_store("c")
+
+        self.assertEqual(list(registry.threads_stores), ["a", "c"])
+        # session stores write right away, so they don't need to be flushed on exit
+        register.assert_not_called()
+
+    def test_lock_is_exclusive(self):
+        with self.registry.lock("a"):
+            self.assertTrue(self.registry.is_locked("a"))
+            with self.assertRaises(SessionLockTimeout):
+                with self.registry.lock("a", timeout=0.1):
+                    pass
+            # other sessions are not affected
+            with self.registry.lock("b", timeout=0.1):
+                pass
+        self.assertFalse(self.registry.is_locked("a"))
+
+    def test_lock_is_renewed_while_held_and_expires_after_a_crash(self):
+        with self.registry.lock("a"):
+            time.sleep(0.5)
+            self.assertFalse(self.registry.try_acquire("a", "other"))
+
+        self.assertTrue(self.registry.try_acquire("a", "crashed"))
+        time.sleep(0.4)
+        self.assertTrue(self.registry.try_acquire("a", "other"))
+
+
+class AgencySessionsTest(unittest.TestCase):
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.tmp_dir = tempfile.mkdtemp()
+        os.chdir(self.tmp_dir)
+        self.api = MockAssistantsAPI().install()
+        self.registry = SessionRegistry("sessions.db")
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+        oai.client = None
+        oai.async_client = None
+
+    def test_sessions_have_their_own_threads(self):
+        with contextlib.redirect_stdout(io.StringIO()):
+            agency = Agency([Agent(name="CEO", description="CEO", instructions="Answer.")], shared_instructions="")
+            agency.set_threads_store(self.registry.get_threads_store("alice"))
+            agency.get_completion("hi from alice")
+            agency.set_threads_store(self.registry.get_threads_store("bob"))
+            agency.get_completion("hi from bob")
+            agency.set_threads_store(self.registry.get_threads_store("alice"))
+            agency.get_completion("alice again")
+
+        alice = self.registry.get_thread_ids("alice")["main_thread"]
+        bob = self.registry.get_thread_ids("bob")["main_thread"]
+        self.assertNotEqual(alice, bob)
+        user_messages = [m["content"][0]["text"]["value"] for m in self.api.messages[alice] if m["role"] == "user"]
+        self.assertEqual(user_messages, ["hi from alice", "alice again"])
+
+    def test_shutdown_stops_the_worker_pool_of_the_agency(self):
+        shared_pool = WorkerPool()
+        with contextlib.redirect_stdout(io.StringIO()):
+            agency = Agency([Agent(name="CEO", description="CEO", instructions="Answer.")], shared_instructions="",
+                            async_mode="threading")
+            other = Agency([Agent(name="Dev", description="Dev", instructions="Build.")], shared_instructions="",
+                           async_mode="threading", worker_pool=shared_pool)
+
+        agency.shutdown()
+        other.shutdown()
+
+        self.assertTrue(agency.worker_pool.closed)
+        # a pool passed to the agency belongs to the caller
+        self.assertFalse(shared_pool.closed)
+        shared_pool.shutdown()
+
+
+class AgencyServerTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp_dir = tempfile.mkdtemp()
+        cls.registry_path = os.path.join(cls.tmp_dir, "sessions.db")
+        cls.server = AgencyServer(make_fake_agency, workers=2, registry_path=cls.registry_path, lock_timeout=0.3)
+        cls.server.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        shutil.rmtree(cls.tmp_dir, ignore_errors=True)
+
+    def test_sessions_are_sticky_and_keep_their_state(self):
+        sessions = [f"session-{i}" for i in range(6)]
+        first = {session: self.server.get_completion(session, "hi", timeout=10) for session in sessions}
+        second = {session: self.server.get_completion(session, "again", timeout=10) for session in sessions}
+
+        for session in sessions:
+            pid, count, _ = second[session].split(":")
+            self.assertEqual(pid, first[session].split(":")[0])
+            self.assertEqual(count, "2")
+        self.assertEqual(len({response.split(":")[0] for response in first.values()}), 2)
+
+    def test_concurrent_messages_of_a_session_run_one_at_a_time(self):
+        futures = [self.server.submit("busy", "sleep 0.1") for _ in range(3)]
+
+        counts = sorted(int(future.result(10).split(":")[1]) for future in futures)
+
+        self.assertEqual(counts, [1, 2, 3])
+
+    def test_session_locked_by_another_server_times_out(self):
+        registry = SessionRegistry(self.registry_path)
+        with registry.lock("locked"):
+            with self.assertRaises(SessionLockTimeout):
+                self.server.get_completion("locked", "hi", timeout=10)
+
+    def test_crashed_worker_is_restarted(self):
+        with contextlib.redirect_stdout(io.StringIO()):
+            with self.assertRaises(Exception):
+                self.server.get_completion("crashing", "crash", timeout=10)
+            self.assertIn("crashing", self.server.get_completion("crashing", "crashing", timeout=30))
+        self.assertEqual(sum(worker["restarts"] for worker in self.server.get_stats()), 1)
+
+    def test_agency_is_shut_down_when_its_worker_stops(self):
+        agency = FakeAgency()
+        requests, results = queue.Queue(), queue.Queue()
+        requests.put(None)
+
+        _serve(0, lambda: agency, self.registry_path, None, requests, results)
+
+        self.assertEqual(results.get_nowait(), (None, "ready", 0))
+        self.assertTrue(agency.shut_down)
+
+    def test_failing_factory_is_reported(self):
+        server = AgencyServer(make_failing_agency, workers=1, registry_path=self.registry_path)
+        with self.assertRaises(Exception) as context:
+            server.start()
+        self.assertIn("no api key", str(context.exception))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,276 @@
+import asyncio
+import contextlib
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from unittest.mock import patch
+
+sys.path.insert(0, '../agency-swarm')
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmarks'))
+from agency_swarm import Agency, Agent
+from agency_swarm.tools import BaseTool
+from agency_swarm.util import oai
+from agency_swarm.util.asgi import AgencyStreamApp
+from agency_swarm.util.retry_policy import RetryPolicy, set_retry_policy
+from mock_api import MockAssistantsAPI, call, reply
+
+
+# barrier of the sessions that must stream at the same time
+meeting = None
+
+
+class MeetTool(BaseTool):
+    """Waits for the other session."""
+
+    def run(self):
+        meeting.wait(timeout=2)
+        return "met"
+
+
+class SlowTool(BaseTool):
+    """Takes a while."""
+
+    def run(self):
+        time.sleep(0.5)
+        return "slow result"
+
+
+def parse_sse(body: bytes):
+    events = []
+    for frame in body.decode().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in frame.splitlines() if not line.startswith(":"))
+        if lines:
+            events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+
+class AgencyStreamAppTest(unittest.TestCase):
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.tmp_dir = tempfile.mkdtemp()
+        os.chdir(self.tmp_dir)
+        self.api = MockAssistantsAPI(text_chunks=5).install()
+
+        def ceo(context):
+            if not context.tool_outputs:
+                return call("SendMessage", recipient="Dev", my_primary_instructions="Delegate.",
+                            message=context.message)
+            return reply(f"Done: {context.tool_outputs[-1]['output']}")
+
+        self.api.scripts["CEO"] = ceo
+        self.agency = self.make_agency()
+        self.app = AgencyStreamApp(self.agency, heartbeat=5)
+
+    def tearDown(self):
+        self.app.executor.shutdown()
+        self.agency.threads_store.flush()
+        os.chdir(self.cwd)
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+        oai.client = None
+        oai.async_client = None
+        set_retry_policy(None)
+
+    @staticmethod
+    def make_agency(tools=None):
+        with contextlib.redirect_stdout(io.StringIO()):
+            ceo_agent = Agent(name="CEO", description="CEO", instructions="Delegate.", tools=tools)
+            dev = Agent(name="Dev", description="Dev", instructions="Build.")
+            return Agency([ceo_agent, [ceo_agent, dev]], shared_instructions="")
+
+    def request(self, method="POST", path="/stream", body=None, query=b"", disconnect_on=None):
+        return asyncio.run(self.arequest(method, path, body, query, disconnect_on))
+
+    async def arequest(self, method="POST", path="/stream", body=None, query=b"", disconnect_on=None):
+        """Returns the status, body and headers of the response. The client disconnects once the body contains
+        `disconnect_on`."""
+        sent = []
+        messages = [{"type": "http.request", "body": json.dumps(body).encode() if body else b""}]
+        disconnect = asyncio.Event()
+
+        async def receive():
+            if messages:
+                return messages.pop(0)
+            await disconnect.wait()
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            sent.append(message)
+            if disconnect_on and disconnect_on in message.get("body", b""):
+                disconnect.set()
+
+        scope = {"type": "http", "method": method, "path": "/agency" + path, "root_path": "/agency",
+                 "query_string": query}
+        with contextlib.redirect_stdout(io.StringIO()):
+            await self.app(scope, receive, send)
+        disconnect.set()
+        return sent[0]["status"], b"".join(message.get("body", b"") for message in sent[1:]), \
+            dict(sent[0].get("headers", []))
+
+    def get_user_messages(self, session_id):
+        thread_id = self.app.registry.get_thread_ids(session_id)["main_thread"]
+        return [m["content"][0]["text"]["value"] for m in self.api.messages[thread_id] if m["role"] == "user"]
+
+    def test_sse_streams_deltas_tool_calls_and_hops(self):
+        status, body, _ = self.request(body={"message": "build a website"})
+
+        self.assertEqual(status, 200)
+        events = parse_sse(body)
+        types = [event_type for event_type, _ in events]
+        self.assertEqual(types[-1], "end")
+        self.assertNotIn("error", types)
+
+        starts = [data for event_type, data in events if event_type == "message_start"]
+        self.assertIn(("function", "CEO", "User"),
+                      [(data["msg_type"], data["sender_name"], data["receiver_name"]) for data in starts])
+        # the hop from the CEO to the developer and the answer of the developer
+        self.assertIn(("CEO", "Dev", "build a website"),
+                      [(data["sender_name"], data["receiver_name"], data["text"]) for data in starts])
+        self.assertIn(("Dev", "CEO"), [(data["sender_name"], data["receiver_name"]) for data in starts])
+
+        text = "".join(data["text"] for event_type, data in events if event_type == "delta")
+        self.assertIn("Done: Dev received: build a website", text)
+        self.assertEqual(self.app.get_stats()["first_token_latency"]["count"], 1)
+
+    def test_get_request_with_query_string(self):
+        status, body, _ = self.request(method="GET", query=b"message=hello&recipient_agent=CEO")
+
+        self.assertEqual(status, 200)
+        self.assertEqual(parse_sse(body)[-1][0], "end")
+
+    def test_invalid_requests(self):
+        self.assertEqual(self.request(body={"text": "no message"})[0], 400)
+        self.assertEqual(self.request(body={"message": "hi", "recipient_agent": "Nobody"})[0], 400)
+        self.assertEqual(self.request(method="PUT", body={"message": "hi"})[0], 405)
+        self.assertEqual(self.request(path="/other")[0], 404)
+
+    def test_completion_errors_are_streamed(self):
+        self.api.scripts["CEO"] = lambda context: 1 / 0
+        set_retry_policy(RetryPolicy(max_attempts={"server_error": 0}))
+
+        status, body, _ = self.request(body={"message": "hi"})
+
+        types = [event_type for event_type, _ in parse_sse(body)]
+        self.assertEqual(types[-2:], ["error", "end"])
+        self.assertEqual(self.app.get_stats()["errors"], 1)
+
+    def test_connections_have_their_own_sessions(self):
+        _, _, alice = self.request(body={"message": "hi from alice"})
+        _, _, bob = self.request(body={"message": "hi from bob"})
+        _, body, headers = self.request(body={"message": "alice again",
+                                              "session_id": alice[b"x-session-id"].decode()})
+
+        self.assertEqual(parse_sse(body)[-1][0], "end")
+        self.assertEqual(headers[b"x-session-id"], alice[b"x-session-id"])
+        self.assertNotEqual(alice[b"x-session-id"], bob[b"x-session-id"])
+        self.assertEqual(self.get_user_messages(alice[b"x-session-id"].decode()), ["hi from alice", "alice again"])
+        self.assertEqual(self.get_user_messages(bob[b"x-session-id"].decode()), ["hi from bob"])
+
+    def test_sessions_stream_at_the_same_time(self):
+        global meeting
+        # both completions have to be running for either of them to answer
+        meeting = threading.Barrier(2)
+
+        def ceo(context):
+            if not context.tool_outputs:
+                return call("MeetTool")
+            return reply(f"Hi {context.message}, {context.tool_outputs[-1]['output']}")
+
+        self.api.scripts["CEO"] = ceo
+        self.app.executor.shutdown()
+        self.app = AgencyStreamApp(lambda: self.make_agency(tools=[MeetTool]), heartbeat=5, max_workers=2)
+
+        async def main():
+            return await asyncio.gather(self.arequest(body={"message": "alice"}), self.arequest(body={"message": "bob"}))
+
+        responses = asyncio.run(main())
+
+        for name, (_, body, _) in zip(["alice", "bob"], responses):
+            events = parse_sse(body)
+            self.assertNotIn("error", [event_type for event_type, _ in events])
+            self.assertIn(f"Hi {name}, met", "".join(data["text"] for event_type, data in events if event_type == "delta"))
+
+    def test_runs_are_cancelled_when_the_client_disconnects(self):
+        def ceo(context):
+            if not context.tool_outputs:
+                return call("SlowTool")
+            return reply(f"Done: {context.message}")
+
+        self.api.scripts["CEO"] = ceo
+        self.app.executor.shutdown()
+        self.agency = self.make_agency(tools=[SlowTool])
+        self.app = AgencyStreamApp(self.agency, heartbeat=5)
+
+        _, _, headers = self.request(body={"message": "first"}, disconnect_on=b"SlowTool")
+        # wait for the completion to stop
+        self.app.executor.submit(lambda: None).result(10)
+
+        thread_id = self.agency.main_thread.id
+        self.assertEqual([run["status"] for run in self.api.runs.values() if run["thread_id"] == thread_id],
+                         ["cancelled"])
+        self.assertEqual(self.app.get_stats()["errors"], 0)
+
+        # the session can be used again right away
+        _, body, _ = self.request(body={"message": "second", "session_id": headers[b"x-session-id"].decode()})
+        text = "".join(data["text"] for event_type, data in parse_sse(body) if event_type == "delta")
+        self.assertIn("Done: second", text)
+
+    def test_agencies_are_shut_down_with_the_app(self):
+        messages = [{"type": "lifespan.startup"}, {"type": "lifespan.shutdown"}]
+        sent = []
+
+        async def receive():
+            return messages.pop(0)
+
+        async def send(message):
+            sent.append(message["type"])
+
+        with patch.object(self.agency, "shutdown") as shutdown:
+            asyncio.run(self.app({"type": "lifespan"}, receive, send))
+
+        self.assertEqual(sent, ["lifespan.startup.complete", "lifespan.shutdown.complete"])
+        shutdown.assert_called_once_with(wait=False)
+
+    def test_websocket_runs_one_completion_per_message(self):
+        async def run():
+            incoming = asyncio.Queue()
+            for message in [{"type": "websocket.connect"},
+                            {"type": "websocket.receive", "text": "{}"},
+                            {"type": "websocket.receive", "text": json.dumps({"message": "first"})}]:
+                incoming.put_nowait(message)
+            frames = []
+            ends = 0
+
+            async def send(message):
+                nonlocal ends
+                if message["type"] != "websocket.send":
+                    frames.append(message["type"])
+                    return
+                frame = json.loads(message["text"])
+                frames.append(frame)
+                if frame["type"] == "end":
+                    ends += 1
+                    if ends == 1:
+                        incoming.put_nowait({"type": "websocket.receive", "text": json.dumps({"message": "second"})})
+                    else:
+                        incoming.put_nowait({"type": "websocket.disconnect"})
+
+            with contextlib.redirect_stdout(io.StringIO()):
+                await self.app({"type": "websocket", "path": "/ws"}, incoming.get, send)
+            return frames
+
+        frames = asyncio.run(run())
+
+        self.assertEqual(frames[0], "websocket.accept")
+        self.assertEqual(frames[1]["type"], "error")
+        self.assertEqual([frame["type"] for frame in frames[2:] if frame["type"] == "end"], ["end", "end"])
+        self.assertEqual(self.app.get_stats()["streams"], 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
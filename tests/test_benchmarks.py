@@ -0,0 +1,40 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, '../agency-swarm')
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmarks'))
+from agency_swarm.util import oai
+from run_benchmarks import SCENARIOS, format_table, run_scenario
+
+
+class BenchmarksTest(unittest.TestCase):
+    def tearDown(self):
+        # drop the mock clients, so other tests create their own
+        oai.client = None
+        oai.async_client = None
+
+    def test_scenarios_run_against_the_mock_api(self):
+        results = {name: run_scenario(name, scale=0.05) for name in SCENARIOS}
+
+        for name, metrics in results.items():
+            self.assertGreater(metrics["requests"], 0, name)
+            self.assertGreater(metrics["total"], 0, name)
+
+        table, regressions = format_table(results, baseline=results)
+        self.assertEqual(regressions, [])
+        self.assertIn("overhead/hop (ms)", table)
+
+    def test_regressions_are_reported(self):
+        baseline = {"deep_chain": {"startup": 1.0, "total": 1.0, "hops": 2, "overhead_per_hop": 1.0,
+                                   "requests": 10, "peak_memory": 1.0}}
+        results = {"deep_chain": {**baseline["deep_chain"], "startup": 2.0}}
+
+        table, regressions = format_table(results, baseline=baseline)
+
+        self.assertEqual(len(regressions), 1)
+        self.assertIn("startup", regressions[0])
+
+
+if __name__ == '__main__':
+    unittest.main()
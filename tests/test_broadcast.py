@@ -0,0 +1,180 @@
+import asyncio
+import contextlib
+import io
+import os
+import shutil
+import sys
+import tempfile
+import time
+import unittest
+
+sys.path.insert(0, '../agency-swarm')
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmarks'))
+from agency_swarm import Agency, Agent
+from agency_swarm.tools import BaseTool
+from agency_swarm.util import oai
+from mock_api import MockAssistantsAPI, call, reply
+
+
+class SlowTool(BaseTool):
+    """Takes a while."""
+
+    def run(self):
+        time.sleep(0.6)
+        return "slow result"
+
+    async def arun(self):
+        await asyncio.sleep(0.6)
+        return "slow result"
+
+
+class BroadcastMessageTest(unittest.TestCase):
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.tmp_dir = tempfile.mkdtemp()
+        os.chdir(self.tmp_dir)
+        self.api = MockAssistantsAPI().install()
+        self.outputs = []
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+        oai.client = None
+        oai.async_client = None
+
+    def make_agency(self, tasks, message=None, **worker_scripts):
+        def manager(context):
+            if not context.tool_outputs:
+                return call("BroadcastMessage", my_primary_instructions="Ask the workers.", message=message,
+                            tasks=tasks)
+            self.outputs.append(context.tool_outputs[-1]["output"])
+            return reply("done")
+
+        self.api.scripts["Manager"] = manager
+        self.api.scripts.update(worker_scripts)
+        with contextlib.redirect_stdout(io.StringIO()):
+            manager_agent = Agent(name="Manager", description="Manager", instructions="Delegate.")
+            workers = [Agent(name=name, description=name, instructions="Work.") for name in ("A", "B", "C")]
+            agency = Agency([manager_agent] + [[manager_agent, worker] for worker in workers], shared_instructions="",
+                            broadcast_messages=True)
+        return agency
+
+    def get_completion(self, agency):
+        with contextlib.redirect_stdout(io.StringIO()):
+            agency.get_completion("start")
+        agency.threads_store.flush()
+        return self.outputs[-1]
+
+    def test_tool_is_opt_in(self):
+        with contextlib.redirect_stdout(io.StringIO()):
+            manager = Agent(name="Manager", description="Manager", instructions="Delegate.")
+            workers = [Agent(name=name, description=name, instructions="Work.") for name in ("A", "B")]
+            agency = Agency([manager] + [[manager, worker] for worker in workers], shared_instructions="")
+        agency.threads_store.flush()
+        self.assertNotIn("BroadcastMessage", [tool.__name__ for tool in manager.tools])
+
+    def test_shared_and_per_recipient_messages(self):
+        agency = self.make_agency([{"recipient": "A"}, {"recipient": "B", "message": "special task"}],
+                                  message="shared task")
+
+        output = self.get_completion(agency)
+
+        self.assertIn("A:\nA received: shared task", output)
+        self.assertIn("B:\nB received: special task", output)
+        self.assertNotIn("C:", output)
+
+    def test_recipients_run_concurrently(self):
+        def slow(context):
+            return reply(f"{context.name} finished", delay=0.3)
+
+        agency = self.make_agency([{"recipient": name} for name in ("A", "B", "C")], message="work",
+                                  A=slow, B=slow, C=slow)
+
+        start = time.time()
+        output = self.get_completion(agency)
+
+        self.assertLess(time.time() - start, 0.8)
+        for name in ("A", "B", "C"):
+            self.assertIn(f"{name} finished", output)
+
+    def test_errors_and_timeouts_are_isolated(self):
+        def failing(context):
+            raise RuntimeError("worker crashed")
+
+        def hanging(context):
+            return reply("too late", delay=1)
+
+        agency = self.make_agency([{"recipient": name} for name in ("A", "B", "C")], message="work",
+                                  B=failing, C=hanging)
+        agency.broadcast_timeout = 0.3
+
+        output = self.get_completion(agency)
+
+        self.assertIn("A:\nA received: work", output)
+        self.assertIn("B:\nError:", output)
+        self.assertIn("C:\nError: No response within 0.3 seconds.", output)
+        # let the hanging run finish before the mock API is removed
+        time.sleep(1)
+
+    def make_timeout_agency(self):
+        def manager(context):
+            if not context.tool_outputs:
+                return call("BroadcastMessage", my_primary_instructions="Ask the workers.", message="work",
+                            tasks=[{"recipient": "A"}, {"recipient": "B"}])
+            if len(context.tool_outputs) == 1:
+                self.outputs.append(context.tool_outputs[-1]["output"])
+                return call("SendMessage", my_primary_instructions="Ask B again.", recipient="B",
+                            message="are you there?")
+            self.outputs.append(context.tool_outputs[-1]["output"])
+            return reply("done")
+
+        def slow(context):
+            if context.message == "work" and not context.tool_outputs:
+                return call("SlowTool")
+            return reply(f"B received: {context.message}")
+
+        self.api.scripts.update({"Manager": manager, "B": slow})
+        with contextlib.redirect_stdout(io.StringIO()):
+            manager_agent = Agent(name="Manager", description="Manager", instructions="Delegate.")
+            workers = [Agent(name="A", description="A", instructions="Work."),
+                       Agent(name="B", description="B", instructions="Work.", tools=[SlowTool])]
+            agency = Agency([manager_agent] + [[manager_agent, worker] for worker in workers], shared_instructions="",
+                            broadcast_messages=True)
+        agency.broadcast_timeout = 0.2
+        return agency
+
+    def assert_timed_out_run_was_cancelled(self, agency):
+        broadcast, send_message = self.outputs[-2:]
+        self.assertIn("B:\nError: No response within 0.2 seconds.", broadcast)
+        # the run of B was cancelled, so the next message to B isn't rejected for an active run
+        self.assertEqual(send_message, "B received: are you there?")
+        thread_id = agency.agents_and_threads["Manager"]["B"].id
+        statuses = [run["status"] for run in self.api.runs.values() if run["thread_id"] == thread_id]
+        self.assertEqual(statuses, ["cancelled", "completed"])
+
+    def test_timed_out_runs_are_cancelled(self):
+        agency = self.make_timeout_agency()
+
+        self.get_completion(agency)
+
+        self.assert_timed_out_run_was_cancelled(agency)
+
+    def test_timed_out_async_runs_are_cancelled(self):
+        agency = self.make_timeout_agency()
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            asyncio.run(agency.aget_completion("start"))
+        agency.threads_store.flush()
+
+        self.assert_timed_out_run_was_cancelled(agency)
+
+    def test_duplicate_recipients_are_rejected(self):
+        agency = self.make_agency([{"recipient": "A"}, {"recipient": "A"}], message="work")
+
+        output = self.get_completion(agency)
+
+        self.assertIn("Duplicate recipients", output)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,128 @@
+import os
+import sys
+import unittest
+from types import SimpleNamespace
+
+sys.path.insert(0, '../agency-swarm')
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmarks'))
+from agency_swarm.messages import MessageOutput
+from agency_swarm.util.event_bus import StreamEventBus
+from stream_benchmark import run
+
+
+class StreamEventBusTest(unittest.TestCase):
+    def test_deltas_are_coalesced_by_size(self):
+        bus = StreamEventBus(max_delay=None, max_chars=10)
+        events = []
+        bus.subscribe(events.append)
+
+        message_id = bus.start_message("text", "Assistant", "User")
+        for token in ["abc"] * 9:
+            bus.publish_delta(message_id, token)
+        bus.end_message(message_id)
+
+        self.assertEqual([event.type for event in events],
+                         ["message_start", "delta", "delta", "delta", "message_end"])
+        self.assertEqual([event.text for event in events[1:4]], ["abcabcabcabc", "abcabcabcabc", "abc"])
+        self.assertEqual(bus.get_stats()["deltas"], 9)
+
+    def test_deltas_are_flushed_after_max_delay(self):
+        bus = StreamEventBus(max_delay=0.02)
+        subscription = bus.subscribe()
+        message_id = bus.start_message("text", "Assistant", "User")
+        bus.publish_delta(message_id, "hello")
+
+        subscription.get_batch()
+        events = subscription.get_batch(timeout=1)
+
+        self.assertEqual([(event.type, event.text) for event in events], [("delta", "hello")])
+        bus.close()
+
+    def test_fan_out_to_multiple_subscribers(self):
+        bus = StreamEventBus()
+        subscriptions = [bus.subscribe() for _ in range(3)]
+
+        message_id = bus.start_message("text", "Assistant", "User", "Hi")
+        for token in ["one", " two", " three"]:
+            bus.publish_delta(message_id, token)
+        bus.end_message(message_id)
+        bus.close()
+
+        for subscription in subscriptions:
+            events = list(subscription)
+            self.assertEqual([event.type for event in events], ["message_start", "delta", "message_end", "end"])
+            self.assertEqual(events[1].text, "one two three")
+            self.assertTrue(subscription.closed)
+
+    def test_slow_subscriber_gets_merged_deltas(self):
+        bus = StreamEventBus(max_delay=None, max_chars=1, max_queue_size=3)
+        subscription = bus.subscribe()
+        message_id = bus.start_message("text", "Assistant", "User")
+        for token in "streaming":
+            bus.publish_delta(message_id, token)
+
+        events = subscription.get_batch()
+
+        self.assertEqual([(event.type, event.text) for event in events],
+                         [("message_start", ""), ("delta", "streaming")])
+        self.assertFalse(subscription.overflowed)
+
+    def test_full_queue_closes_subscription(self):
+        bus = StreamEventBus(max_queue_size=2)
+        subscription = bus.subscribe()
+        for _ in range(3):
+            bus.start_message("text", "Assistant", "User")
+
+        self.assertTrue(subscription.overflowed)
+        self.assertEqual(len(subscription.get_batch()), 2)
+        self.assertEqual(subscription.get_batch(), [])
+
+    def test_failing_callback_is_removed(self):
+        bus = StreamEventBus()
+        events = []
+        bus.subscribe(lambda event: 1 / 0)
+        bus.subscribe(events.append)
+
+        bus.start_message("text", "Assistant", "User")
+
+        self.assertEqual(len(events), 1)
+        self.assertEqual(bus.get_stats()["subscribers"], 1)
+
+    def test_event_handler_publishes_stream(self):
+        bus = StreamEventBus(max_delay=None)
+        events = []
+        bus.subscribe(events.append)
+        handler_class = bus.create_event_handler()
+        handler_class.agent_name = "User"
+        handler_class.recipient_agent_name = "CEO"
+        handler = handler_class()
+
+        handler.on_message_created(SimpleNamespace(role="assistant"))
+        for token in ["Hello", " world"]:
+            handler.on_text_delta(SimpleNamespace(value=token), None)
+        handler.on_message_done(None)
+        handler_class.on_all_streams_end()
+
+        self.assertEqual([(event.type, event.text) for event in events],
+                         [("message_start", ""), ("delta", "Hello world"), ("message_end", ""), ("end", "")])
+        self.assertEqual((events[0].sender_name, events[0].receiver_name), ("CEO", "User"))
+
+    def test_benchmark_runs(self):
+        results = run(tokens=2000, subscribers=2, memory=False)
+
+        self.assertEqual(results["queue"]["updates"], 4000)
+        self.assertLess(results["event_bus"]["updates"], results["queue"]["updates"])
+
+
+class MessageOutputTest(unittest.TestCase):
+    def test_colors_and_emojis_are_stable(self):
+        first = MessageOutput("text", "Developer", "CEO", "")
+        second = MessageOutput("text", "Developer", "CEO", "other")
+
+        self.assertEqual(first.hash_names_to_color(), second.hash_names_to_color())
+        self.assertEqual(first.get_sender_emoji(), second.get_sender_emoji())
+        self.assertEqual(MessageOutput("text", "ceo", "User", "").get_sender_emoji(), "🤵")
+
+
+if __name__ == '__main__':
+    unittest.main()
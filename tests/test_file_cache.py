@@ -0,0 +1,89 @@
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from itertools import count
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+
+sys.path.insert(0, '../agency-swarm')
+from agency_swarm import Agent
+from agency_swarm.util.file_cache import FileUploadCache
+
+
+class FileCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.files_folder = os.path.join(self.tmp_dir, "files")
+        os.mkdir(self.files_folder)
+        for i in range(5):
+            with open(os.path.join(self.files_folder, f"doc{i}.txt"), "w") as f:
+                f.write(f"document {i}")
+
+        ids = count()
+        self.client = MagicMock()
+        self.client.with_options.return_value.files.create.side_effect = \
+            lambda **kwargs: SimpleNamespace(id=f"file-{next(ids)}")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def create_agent(self, files_folder):
+        cache_path = os.path.join(self.tmp_dir, "files_cache.json")
+        with patch("agency_swarm.agents.agent.get_openai_client", return_value=self.client), \
+                patch("agency_swarm.agents.agent.get_file_cache", side_effect=lambda path: FileUploadCache(cache_path)):
+            return Agent(name="CacheTestAgent", files_folder=files_folder)
+
+    def upload_count(self):
+        return self.client.with_options.return_value.files.create.call_count
+
+    def test_files_are_uploaded_once_and_not_renamed(self):
+        agent = self.create_agent(self.files_folder)
+        self.assertEqual(self.upload_count(), 5)
+
+        agent2 = self.create_agent(self.files_folder)
+        self.assertEqual(self.upload_count(), 5)
+        self.assertEqual(sorted(os.listdir(self.files_folder)), [f"doc{i}.txt" for i in range(5)])
+        self.assertEqual(agent.tool_resources, agent2.tool_resources)
+
+    def test_copied_files_are_not_uploaded_again(self):
+        self.create_agent(self.files_folder)
+
+        copy_folder = os.path.join(self.tmp_dir, "copy")
+        shutil.copytree(self.files_folder, copy_folder)
+        self.create_agent(copy_folder)
+
+        self.assertEqual(self.upload_count(), 5)
+
+    def test_changed_files_are_uploaded_again(self):
+        self.create_agent(self.files_folder)
+
+        with open(os.path.join(self.files_folder, "doc0.txt"), "a") as f:
+            f.write(" changed")
+        self.create_agent(self.files_folder)
+
+        self.assertEqual(self.upload_count(), 6)
+
+    def test_uploaded_files_are_recorded_when_another_upload_fails(self):
+        ids = count()
+
+        def create(file, purpose):
+            if file.name.endswith("doc2.txt"):
+                raise ConnectionError("upload failed")
+            return SimpleNamespace(id=f"file-{next(ids)}")
+
+        self.client.with_options.return_value.files.create.side_effect = create
+        with self.assertRaises(ConnectionError):
+            self.create_agent(self.files_folder)
+
+        self.client.with_options.return_value.files.create.side_effect = \
+            lambda **kwargs: SimpleNamespace(id=f"file-{next(ids)}")
+        self.create_agent(self.files_folder)
+
+        # the second start only uploads the file that failed
+        self.assertEqual(self.upload_count(), 6)
+
+
+if __name__ == '__main__':
+    unittest.main()
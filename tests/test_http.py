@@ -0,0 +1,158 @@
+import asyncio
+import json
+import sys
+import unittest
+
+import httpx
+
+sys.path.insert(0, '../agency-swarm')
+from agency_swarm.tools import ToolFactory
+from agency_swarm.util.http import HTTPClientPool, LatencyHistogram
+from agency_swarm.util.tracing import InMemoryExporter, Tracer, set_tracer
+
+OPENAPI_SPEC = {
+    "openapi": "3.1.0",
+    "info": {"title": "Pets", "version": "v1"},
+    "servers": [{"url": "https://pets.example.com/v1"}],
+    "paths": {
+        "/pets/{petId}": {
+            "get": {
+                "operationId": "getPet",
+                "description": "Get a pet by id.",
+                "parameters": [{"name": "petId", "in": "path", "required": True, "schema": {"type": "string"}}],
+            },
+        },
+        "/pets": {
+            "post": {
+                "operationId": "createPet",
+                "description": "Create a pet.",
+                "requestBody": {"content": {"application/json": {"schema": {
+                    "type": "object", "properties": {"name": {"type": "string"}}}}}},
+            },
+        },
+    },
+}
+
+
+def echo(request: httpx.Request) -> httpx.Response:
+    return httpx.Response(200, json={"method": request.method, "path": request.url.path,
+                                     "body": json.loads(request.content) if request.content else None})
+
+
+class HTTPClientPoolTest(unittest.TestCase):
+    def setUp(self):
+        self.requests = []
+
+        def handler(request):
+            self.requests.append(request)
+            return echo(request)
+
+        self.pool = HTTPClientPool(transport=httpx.MockTransport(handler),
+                                   async_transport=httpx.MockTransport(handler))
+
+    def tearDown(self):
+        self.pool.close()
+
+    def test_reuses_client_per_server(self):
+        self.assertIs(self.pool.get_client("https://a.example.com/x"), self.pool.get_client("https://a.example.com/y"))
+        self.assertIsNot(self.pool.get_client("https://a.example.com/x"), self.pool.get_client("https://b.example.com"))
+
+    def test_openapi_tools_call_their_own_endpoint(self):
+        get_pet, create_pet = ToolFactory.from_openapi_schema(OPENAPI_SPEC, http_pool=self.pool)
+
+        output = get_pet(parameters={"petId": "42"}).run()
+        self.assertEqual(output["method"], "GET")
+        self.assertEqual(output["path"], "/v1/pets/42")
+
+        output = create_pet(requestBody={"name": "Rex"}).run()
+        self.assertEqual(output["method"], "POST")
+        self.assertEqual(output["path"], "/v1/pets")
+        self.assertEqual(output["body"], {"name": "Rex"})
+
+        histograms = self.pool.get_latency_histograms()
+        self.assertEqual(histograms["GET https://pets.example.com/v1/pets/{petId}"]["count"], 1)
+        self.assertEqual(histograms["POST https://pets.example.com/v1/pets"]["count"], 1)
+
+    def test_async_tools_share_one_client(self):
+        get_pet, _ = ToolFactory.from_openapi_schema(OPENAPI_SPEC, http_pool=self.pool)
+
+        async def main():
+            outputs = await asyncio.gather(*[get_pet(parameters={"petId": str(i)}).arun() for i in range(10)])
+            self.assertEqual(len(self.pool.async_clients[asyncio.get_running_loop()]), 1)
+            await self.pool.aclose()
+            return outputs
+
+        outputs = asyncio.run(main())
+        self.assertEqual([output["path"] for output in outputs], [f"/v1/pets/{i}" for i in range(10)])
+
+    def test_retries_retryable_status(self):
+        responses = [httpx.Response(503, headers={"retry-after": "0"}), httpx.Response(200, json={"ok": True})]
+        pool = HTTPClientPool(transport=httpx.MockTransport(lambda request: responses.pop(0)))
+        exporter = InMemoryExporter()
+        set_tracer(Tracer([exporter]))
+        try:
+            response = pool.request("GET", "https://a.example.com/status")
+        finally:
+            set_tracer(None)
+            pool.close()
+        self.assertEqual(response.json(), {"ok": True})
+        span = exporter.get_spans("http_request")[0]
+        self.assertEqual(span.attributes["attempts"], 2)
+        self.assertEqual(span.attributes["status_code"], 200)
+
+    def test_redirects_are_followed(self):
+        def handler(request):
+            if request.url.path == "/v1/pets/42":
+                return httpx.Response(301, headers={"location": "https://pets.example.com/v2/pets/42"})
+            return echo(request)
+
+        pool = HTTPClientPool(transport=httpx.MockTransport(handler), async_transport=httpx.MockTransport(handler))
+        get_pet, _ = ToolFactory.from_openapi_schema(OPENAPI_SPEC, http_pool=pool)
+        try:
+            self.assertEqual(get_pet(parameters={"petId": "42"}).run()["path"], "/v2/pets/42")
+            self.assertEqual(asyncio.run(get_pet(parameters={"petId": "42"}).arun())["path"], "/v2/pets/42")
+        finally:
+            pool.close()
+
+    def test_schemas_without_servers_fail_when_called(self):
+        spec = {key: value for key, value in OPENAPI_SPEC.items() if key != "servers"}
+        get_pet, _ = ToolFactory.from_openapi_schema(spec, http_pool=self.pool)
+
+        with self.assertRaises(ValueError):
+            get_pet(parameters={"petId": "42"}).run()
+
+    def test_non_idempotent_methods_are_not_retried_on_status(self):
+        requests = []
+
+        def handler(request):
+            requests.append(request.method)
+            return httpx.Response(503, headers={"retry-after": "0"})
+
+        pool = HTTPClientPool(transport=httpx.MockTransport(handler))
+        try:
+            self.assertEqual(pool.request("POST", "https://a.example.com/orders", json={}).status_code, 503)
+            self.assertEqual(pool.request("PATCH", "https://a.example.com/orders/1", json={}).status_code, 503)
+            self.assertEqual(requests, ["POST", "PATCH"])
+
+            pool.retry_methods = ("POST",)
+            pool.request("POST", "https://a.example.com/orders", json={})
+            self.assertEqual(requests.count("POST"), 4)
+        finally:
+            pool.close()
+
+
+class LatencyHistogramTest(unittest.TestCase):
+    def test_snapshot(self):
+        histogram = LatencyHistogram()
+        for seconds in (0.001, 0.02, 0.02, 3.0):
+            histogram.observe(seconds)
+        snapshot = histogram.snapshot()
+        self.assertEqual(snapshot["count"], 4)
+        self.assertEqual(snapshot["buckets"]["0.005"], 1)
+        self.assertEqual(snapshot["buckets"]["0.025"], 3)
+        self.assertEqual(snapshot["buckets"]["+Inf"], 4)
+        self.assertEqual(snapshot["p50"], 0.025)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,92 @@
+import json
+import os
+import subprocess
+import sys
+import types
+import unittest
+from unittest.mock import MagicMock, patch
+
+sys.path.insert(0, '../agency-swarm')
+from agency_swarm.util import gpu_utils
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+IMPORT_SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+print(json.dumps({{"seconds": time.perf_counter() - start, "torch": "torch" in sys.modules}}))
+"""
+
+
+class ImportTimeTest(unittest.TestCase):
+    max_import_seconds = 1.0
+
+    def measure_import(self, module):
+        env = dict(os.environ, PYTHONPATH=REPO_ROOT, OPENAI_API_KEY=os.getenv("OPENAI_API_KEY", "sk-test"))
+        # the fastest of a few runs, so a busy machine doesn't make the test flaky
+        results = []
+        for _ in range(3):
+            output = subprocess.run([sys.executable, "-c", IMPORT_SCRIPT.format(module=module)], cwd=REPO_ROOT,
+                                    env=env, capture_output=True, text=True, check=True).stdout
+            results.append(json.loads(output.strip().splitlines()[-1]))
+        return min(results, key=lambda result: result["seconds"])
+
+    def test_package_import_does_not_load_torch(self):
+        result = self.measure_import("agency_swarm")
+
+        self.assertFalse(result["torch"])
+        self.assertLess(result["seconds"], self.max_import_seconds)
+
+    def test_cli_import_is_fast(self):
+        result = self.measure_import("agency_swarm.cli")
+
+        self.assertFalse(result["torch"])
+        self.assertLess(result["seconds"], self.max_import_seconds)
+
+
+class AcceleratorTest(unittest.TestCase):
+    def tearDown(self):
+        gpu_utils.set_accelerator(None)
+
+    def test_custom_backend(self):
+        class DoublingAccelerator(gpu_utils.Accelerator):
+            name = "doubling"
+
+            def move(self, data, device=None):
+                return data * 2
+
+        gpu_utils.set_accelerator(DoublingAccelerator())
+
+        self.assertEqual(gpu_utils.move_to_device(21), 42)
+        self.assertEqual(gpu_utils.get_device(), "cpu")
+
+    def test_cpu_backend_is_a_no_op(self):
+        os.environ["AGENCY_SWARM_ACCELERATOR"] = "cpu"
+        self.addCleanup(os.environ.pop, "AGENCY_SWARM_ACCELERATOR")
+        data = {"a": [1, 2]}
+
+        backend = gpu_utils.get_accelerator()
+
+        self.assertEqual(type(backend), gpu_utils.Accelerator)
+        self.assertIs(backend.move(data), data)
+        self.assertIs(backend.move(data, "cuda"), data)
+        self.assertEqual(backend.device, "cpu")
+        self.assertIsNone(backend.optimize_memory())
+        # once the backend is loaded, data goes through it
+        self.assertIs(gpu_utils.move_to_device(data), data)
+
+    def test_broken_torch_falls_back_to_the_cpu(self):
+        torch = types.ModuleType("torch")
+        torch.cuda = types.SimpleNamespace(is_available=MagicMock(side_effect=RuntimeError("CUDA driver is too old")))
+        torch.device = lambda name: f"device({name})"
+        with patch.dict(sys.modules, {"torch": torch, "torch_directml": None}):
+            self.assertEqual(gpu_utils.get_device(), "device(cpu)")
+
+        gpu_utils.set_accelerator(None)
+        with patch.object(gpu_utils, "TorchAccelerator", side_effect=OSError("libcudart.so: cannot open")):
+            self.assertEqual(type(gpu_utils.get_accelerator()), gpu_utils.Accelerator)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,109 @@
+import sys
+import unittest
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+
+sys.path.insert(0, '../agency-swarm')
+from agency_swarm.threads import Thread
+from agency_swarm.util.model_router import ModelRouter, RouteRule
+
+
+def make_agent(name="CEO", **kwargs):
+    agent = SimpleNamespace(name=name, id="asst_1", model="gpt-4-turbo", instructions="", tools=[],
+                            max_prompt_tokens=None, max_completion_tokens=None, truncation_strategy=None,
+                            token_budget=None, model_router=None, retry_policy=None)
+    agent.__dict__.update(kwargs)
+    return agent
+
+
+class FakeStream:
+    def __init__(self, run):
+        self.run = run
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+    def until_done(self):
+        pass
+
+    def get_final_run(self):
+        return self.run
+
+    def get_final_messages(self):
+        raise RuntimeError("No messages found")
+
+
+class ModelRouterTest(unittest.TestCase):
+    def test_first_matching_rule_picks_the_model(self):
+        router = ModelRouter([
+            RouteRule("gpt-4o", name="validation", reasons=["validation"]),
+            RouteRule("gpt-3.5-turbo", name="short", agents=["CEO"], max_message_tokens=50),
+        ])
+
+        self.assertEqual(router.route(make_agent(), "message", 10), ("gpt-3.5-turbo", "short"))
+        self.assertEqual(router.route(make_agent(), "validation", 10), ("gpt-4o", "validation"))
+        self.assertEqual(router.route(make_agent(), "message", 500), ("gpt-4-turbo", "default"))
+        self.assertEqual(router.route(make_agent("Dev"), "message", 10), ("gpt-4-turbo", "default"))
+
+    def test_tool_only_turns_are_learnt_per_agent(self):
+        router = ModelRouter([RouteRule("gpt-3.5-turbo", name="tools", tool_only=True)], min_samples=3)
+        for _ in range(3):
+            router.record("default", "CEO", "gpt-4-turbo", 1.0, "requires_action")
+        router.record("default", "Dev", "gpt-4-turbo", 1.0, "completed")
+
+        self.assertEqual(router.route(make_agent("CEO"))[1], "tools")
+        self.assertEqual(router.route(make_agent("Dev"))[1], "default")
+        self.assertEqual(router.route(make_agent("Dev"), tool_choice={"type": "file_search"})[1], "tools")
+
+    def test_slow_models_are_skipped(self):
+        router = ModelRouter([RouteRule("gpt-4o", name="fast", max_latency=2.0)], min_samples=5)
+        for latency in [1.0] * 4 + [5.0] * 2:
+            router.record("fast", "CEO", "gpt-4o", latency, "completed")
+
+        self.assertEqual(router.route(make_agent())[1], "default")
+        stats = router.get_stats()["fast"]
+        self.assertEqual(stats["runs"], 6)
+        self.assertEqual(stats["latency_p50"], 1.0)
+        self.assertEqual(stats["latency_p95"], 5.0)
+
+
+class ThreadRoutingTest(unittest.TestCase):
+    def setUp(self):
+        self.client = MagicMock()
+        self.client.with_options.return_value = self.client
+        with patch("agency_swarm.threads.thread.get_openai_client", return_value=self.client):
+            self.thread = Thread(SimpleNamespace(name="User"), make_agent())
+        self.thread.thread = SimpleNamespace(id="thread_1")
+        self.thread.id = "thread_1"
+        usage = SimpleNamespace(prompt_tokens=100, completion_tokens=10, total_tokens=110)
+        self.client.beta.threads.runs.stream.return_value = FakeStream(
+            SimpleNamespace(id="run_1", status="completed", last_error=None, required_action=None, usage=usage))
+
+    def test_runs_are_created_with_the_routed_model(self):
+        router = ModelRouter([RouteRule("gpt-3.5-turbo", name="short", max_message_tokens=50)])
+        agent = make_agent(model_router=router)
+        self.thread.token_counter.add_message("user", "Forward this to the developer.")
+
+        self.thread._create_run(agent, None, None, None)
+
+        self.assertEqual(self.client.beta.threads.runs.stream.call_args.kwargs["model"], "gpt-3.5-turbo")
+        self.assertEqual(self.thread.last_projection["model"], "gpt-3.5-turbo")
+        stats = router.get_stats()["short"]
+        self.assertEqual((stats["runs"], stats["prompt_tokens"]), (1, 100))
+        self.assertEqual(stats["models"], {"gpt-3.5-turbo": 1})
+
+    def test_agent_model_is_not_sent(self):
+        agent = make_agent(model_router=ModelRouter([RouteRule("gpt-3.5-turbo", reasons=["retry"])]))
+        self.thread.token_counter.add_message("user", "Hi!")
+
+        self.thread._create_run(agent, None, None, None)
+
+        self.assertNotIn("model", self.client.beta.threads.runs.stream.call_args.kwargs)
+        self.assertEqual(agent.model_router.get_stats()["default"]["runs"], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
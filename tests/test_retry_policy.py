@@ -0,0 +1,268 @@
+import asyncio
+import sys
+import threading
+import unittest
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import httpx
+from openai import APIConnectionError, BadRequestError, InternalServerError, RateLimitError
+
+sys.path.insert(0, '../agency-swarm')
+from agency_swarm.threads import Thread
+from agency_swarm.util.backoff import Backoff
+from agency_swarm.util.message_cache import MessageCache
+from agency_swarm.util.retry_policy import CircuitOpenError, RetryPolicy
+
+
+def make_api_error(error_class, status_code, message="error", headers=None):
+    request = httpx.Request("POST", "https://api.openai.com/v1/threads/thread_1/runs")
+    response = httpx.Response(status_code, headers=headers or {}, request=request)
+    return error_class(message, response=response, body=None)
+
+
+def make_run(status, code=None, message=None, run_id="run_1"):
+    last_error = SimpleNamespace(code=code, message=message) if code else None
+    return SimpleNamespace(id=run_id, status=status, last_error=last_error, required_action=None)
+
+
+def make_message(text, run_id):
+    return SimpleNamespace(id=f"msg_{run_id}", thread_id="thread_1", run_id=run_id, role="assistant",
+                           status="completed", created_at=0,
+                           content=[SimpleNamespace(text=SimpleNamespace(value=text))])
+
+
+class FakeStream:
+    def __init__(self, run, messages=()):
+        self.run = run
+        self.messages = list(messages)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+    def until_done(self):
+        pass
+
+    def get_final_run(self):
+        return self.run
+
+    def get_final_messages(self):
+        return self.messages
+
+
+class AsyncFakeStream(FakeStream):
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        return False
+
+    async def until_done(self):
+        pass
+
+    async def get_final_run(self):
+        return self.run
+
+    async def get_final_messages(self):
+        return self.messages
+
+
+class RetryPolicyTest(unittest.TestCase):
+    def test_errors_are_classified(self):
+        policy = RetryPolicy()
+
+        self.assertEqual(policy.classify(make_api_error(RateLimitError, 429)), "rate_limit")
+        self.assertEqual(policy.classify(make_api_error(InternalServerError, 503)), "server_error")
+        self.assertEqual(policy.classify(make_api_error(BadRequestError, 400, 'Runs in status "expired"')), "expired")
+        self.assertEqual(policy.classify(make_api_error(BadRequestError, 400, "Invalid value")), "fatal")
+        self.assertEqual(policy.classify(SimpleNamespace(code="rate_limit_exceeded", message="")), "rate_limit")
+        self.assertEqual(policy.classify(SimpleNamespace(code="server_error", message="")), "server_error")
+        self.assertEqual(policy.classify(SimpleNamespace(code="invalid_prompt", message="Too long")), "fatal")
+
+    def test_retry_after_is_respected(self):
+        policy = RetryPolicy(max_retry_after=10)
+
+        self.assertEqual(policy.next_retry("rate_limit", 0, make_api_error(
+            RateLimitError, 429, headers={"retry-after": "3"})), 3.0)
+        self.assertEqual(policy.next_retry("rate_limit", 0, make_api_error(
+            RateLimitError, 429, headers={"retry-after": "600"})), 10)
+        self.assertEqual(policy.next_retry("rate_limit", 0, SimpleNamespace(
+            code="rate_limit_exceeded", message="Rate limit reached. Please try again in 250ms.")), 0.25)
+
+    def test_backoff_grows_until_attempts_run_out(self):
+        policy = RetryPolicy(max_attempts={"server_error": 3},
+                             backoff=Backoff(initial=1.0, maximum=3.0, multiplier=2.0, jitter=False))
+
+        delays = [policy.next_retry("server_error", attempts) for attempts in range(4)]
+
+        self.assertEqual(delays, [1.0, 2.0, 3.0, None])
+        self.assertEqual(policy.next_retry("expired", 0), 0.0)
+        self.assertIsNone(policy.next_retry("fatal", 0))
+        stats = policy.get_stats()
+        self.assertEqual(stats["retries"], {"server_error": 3, "expired": 1})
+        self.assertEqual(stats["gave_up"], {"server_error": 1, "fatal": 1})
+        self.assertEqual(stats["delay"], 6.0)
+
+    def test_circuit_opens_after_repeated_failures(self):
+        policy = RetryPolicy(failure_threshold=2, recovery_timeout=30)
+        policy.record_failure("gpt-4-turbo")
+        policy.check_circuit("gpt-4-turbo")
+        policy.record_failure("gpt-4-turbo")
+
+        with self.assertRaises(CircuitOpenError):
+            policy.check_circuit("gpt-4-turbo")
+        policy.check_circuit("gpt-4o")
+        self.assertIn("gpt-4-turbo", policy.get_stats()["open_circuits"])
+
+        # after the recovery timeout one run probes the model, and a single failure opens the circuit again
+        opened_at = policy.circuits["gpt-4-turbo"]["opened_at"]
+        with patch("agency_swarm.util.retry_policy.time.time", return_value=opened_at + 31):
+            policy.check_circuit("gpt-4-turbo")
+        policy.record_failure("gpt-4-turbo")
+        with self.assertRaises(CircuitOpenError):
+            policy.check_circuit("gpt-4-turbo")
+
+        policy.record_success("gpt-4-turbo")
+        policy.check_circuit("gpt-4-turbo")
+        self.assertEqual(policy.get_stats()["rejected"], 2)
+
+    def test_only_one_run_probes_a_recovering_model(self):
+        policy = RetryPolicy(failure_threshold=1, recovery_timeout=30)
+        policy.record_failure("gpt-4-turbo")
+        opened_at = policy.circuits["gpt-4-turbo"]["opened_at"]
+        barrier = threading.Barrier(2)
+        results = []
+
+        def check():
+            barrier.wait()
+            try:
+                policy.check_circuit("gpt-4-turbo")
+                results.append("probe")
+            except CircuitOpenError:
+                results.append("rejected")
+
+        with patch("agency_swarm.util.retry_policy.time.time", return_value=opened_at + 31):
+            threads = [threading.Thread(target=check) for _ in range(2)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            self.assertEqual(sorted(results), ["probe", "rejected"])
+
+            # the other runs wait for the result of the probe
+            policy.record_success("gpt-4-turbo")
+            policy.check_circuit("gpt-4-turbo")
+
+    def test_stuck_probe_is_replaced(self):
+        policy = RetryPolicy(failure_threshold=1, recovery_timeout=30)
+        policy.record_failure("gpt-4-turbo")
+        opened_at = policy.circuits["gpt-4-turbo"]["opened_at"]
+
+        with patch("agency_swarm.util.retry_policy.time.time", return_value=opened_at + 31):
+            policy.check_circuit("gpt-4-turbo")
+            with self.assertRaises(CircuitOpenError):
+                policy.check_circuit("gpt-4-turbo")
+        with patch("agency_swarm.util.retry_policy.time.time", return_value=opened_at + 62):
+            policy.check_circuit("gpt-4-turbo")
+
+
+class ThreadRetryTest(unittest.TestCase):
+    def setUp(self):
+        self.client = MagicMock()
+        self.client.with_options.return_value = self.client
+        with patch("agency_swarm.threads.thread.get_openai_client", return_value=self.client):
+            self.thread = Thread(SimpleNamespace(name="User"), SimpleNamespace(name="CEO"))
+        self.thread.thread = SimpleNamespace(id="thread_1")
+        self.thread.id = "thread_1"
+        self.thread.message_cache = MessageCache()
+        self.policy = RetryPolicy(backoff=Backoff(initial=1.0, maximum=30.0, multiplier=2.0, jitter=False))
+        self.recipient = SimpleNamespace(name="CEO", id="asst_1", model="gpt-4-turbo", instructions="", tools=[],
+                                         max_prompt_tokens=None, max_completion_tokens=None,
+                                         truncation_strategy=None, token_budget=None, model_router=None,
+                                         retry_policy=self.policy, response_validator=None,
+                                         assistant=SimpleNamespace(id="asst_1"))
+
+    def test_failed_runs_are_retried_with_backoff(self):
+        self.client.beta.threads.runs.stream.side_effect = [
+            FakeStream(make_run("failed", "rate_limit_exceeded", "Please try again in 2s.", "run_1")),
+            FakeStream(make_run("failed", "server_error", "Something went wrong.", "run_2")),
+            FakeStream(make_run("completed", run_id="run_3"), [make_message("Done!", "run_3")]),
+        ]
+        self.client.beta.threads.messages.list.return_value = SimpleNamespace(data=[])
+
+        with patch("agency_swarm.threads.thread.time.sleep") as sleep:
+            response = self.thread.get_completion("Hi!", recipient_agent=self.recipient)
+
+        self.assertEqual(response.strip(), "Done!")
+        self.assertEqual([call.args[0] for call in sleep.call_args_list], [2.0, 1.0])
+        self.assertEqual(self.policy.get_stats()["retries"], {"rate_limit": 1, "server_error": 1})
+        # the first retry of a server error creates the run again without a "Continue." message
+        contents = [call.kwargs["content"] for call in self.client.beta.threads.messages.create.call_args_list]
+        self.assertEqual(contents, ["Hi!"])
+
+    def test_async_runs_follow_the_same_retries(self):
+        async_client = MagicMock()
+        async_client.with_options.return_value = async_client
+        async_client.beta.threads.messages.create = AsyncMock()
+        async_client.beta.threads.messages.list = AsyncMock(return_value=SimpleNamespace(data=[]))
+        async_client.beta.threads.runs.stream.side_effect = [
+            AsyncFakeStream(make_run("failed", "server_error", "Something went wrong.", "run_1")),
+            AsyncFakeStream(make_run("failed", "server_error", "Something went wrong.", "run_2")),
+            AsyncFakeStream(make_run("completed", run_id="run_3"), [make_message("Done!", "run_3")]),
+        ]
+        self.thread._async_client = async_client
+
+        with patch("agency_swarm.threads.thread.asyncio.sleep", new=AsyncMock()) as sleep:
+            response = asyncio.run(self.thread.aget_completion("Hi!", recipient_agent=self.recipient))
+
+        self.assertEqual(response.strip(), "Done!")
+        self.assertEqual([call.args[0] for call in sleep.call_args_list], [1.0, 2.0])
+        # the second retry of a server error asks the assistant to continue
+        contents = [call.kwargs["content"] for call in async_client.beta.threads.messages.create.call_args_list]
+        self.assertEqual(contents, ["Hi!", "Continue."])
+
+    def test_fatal_run_errors_are_not_retried(self):
+        self.client.beta.threads.runs.stream.return_value = FakeStream(
+            make_run("failed", "invalid_prompt", "Invalid prompt."))
+        self.client.beta.threads.messages.list.return_value = SimpleNamespace(data=[])
+
+        with self.assertRaises(Exception):
+            self.thread.get_completion("Hi!", recipient_agent=self.recipient)
+        self.assertEqual(self.client.beta.threads.runs.stream.call_count, 1)
+
+    def test_rate_limited_run_creation_is_retried_until_the_circuit_opens(self):
+        self.policy.failure_threshold = 3
+        self.client.beta.threads.runs.stream.side_effect = make_api_error(
+            RateLimitError, 429, headers={"retry-after": "5"})
+
+        with patch("agency_swarm.threads.thread.time.sleep") as sleep:
+            with self.assertRaises(CircuitOpenError):
+                self.thread._create_run(self.recipient, None, None, None)
+
+        self.assertEqual(self.client.beta.threads.runs.stream.call_count, 3)
+        self.assertEqual([call.args[0] for call in sleep.call_args_list], [5.0, 5.0, 5.0])
+        self.assertEqual(self.policy.get_stats()["rejected"], 1)
+        # the policy is the only retry layer, so each failure is one request
+        self.client.with_options.assert_called_with(max_retries=0)
+
+    def test_connection_errors_of_run_creation_are_retried(self):
+        request = httpx.Request("POST", "https://api.openai.com/v1/threads/thread_1/runs")
+        self.client.beta.threads.runs.stream.side_effect = [
+            APIConnectionError(request=request),
+            FakeStream(make_run("completed", run_id="run_1")),
+        ]
+
+        with patch("agency_swarm.threads.thread.time.sleep") as sleep:
+            self.thread._create_run(self.recipient, None, None, None)
+
+        self.assertEqual(self.thread.run.status, "completed")
+        self.assertTrue(self.thread.use_streaming)
+        sleep.assert_called_once_with(1.0)
+        self.assertEqual(self.policy.get_stats()["retries"], {"server_error": 1})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,80 @@
+import sys
+import unittest
+from unittest.mock import patch
+
+from pydantic import Field
+
+sys.path.insert(0, '../agency-swarm')
+from agency_swarm.tools import BaseTool, ToolFactory
+from agency_swarm.tools.BaseTool import clear_schema_cache
+
+
+class SearchTool(BaseTool):
+    """Searches the web."""
+    query: str = Field(..., description="What to search for.")
+
+    def run(self):
+        return self.query
+
+
+FUNCTION_SCHEMA = {
+    "name": "GetWeather",
+    "description": "Gets the weather for a city.",
+    "parameters": {
+        "type": "object",
+        "properties": {
+            "city": {"type": "string", "description": "Name of the city."},
+            "location": {"type": "object", "title": "Location", "properties": {"lat": {"type": "number"},
+                                                                                "lon": {"type": "number"}}},
+        },
+        "required": ["city"],
+    },
+}
+
+
+class SchemaCacheTest(unittest.TestCase):
+    def setUp(self):
+        clear_schema_cache()
+
+    def test_schema_is_generated_once(self):
+        with patch.object(SearchTool, "_generate_openai_schema", wraps=SearchTool._generate_openai_schema) as generate:
+            first = SearchTool.openai_schema
+            second = SearchTool.openai_schema
+        self.assertEqual(generate.call_count, 1)
+        self.assertEqual(first, second)
+        self.assertNotIn("caller_agent", first["parameters"]["properties"])
+
+    def test_returns_copies(self):
+        SearchTool.openai_schema["parameters"]["properties"].clear()
+        self.assertIn("query", SearchTool.openai_schema["parameters"]["properties"])
+
+    def test_invalidated_when_docstring_changes(self):
+        class Tool(BaseTool):
+            """Old description."""
+
+            def run(self):
+                pass
+
+        self.assertEqual(Tool.openai_schema["description"], "Old description.")
+        Tool.__doc__ = "New description."
+        self.assertEqual(Tool.openai_schema["description"], "New description.")
+
+    def test_subclasses_are_cached_separately(self):
+        class LimitedSearchTool(SearchTool):
+            limit: int = 10
+
+        self.assertNotIn("limit", SearchTool.openai_schema["parameters"]["properties"])
+        self.assertIn("limit", LimitedSearchTool.openai_schema["parameters"]["properties"])
+
+    def test_factory_reuses_models(self):
+        first = ToolFactory.from_openai_schema(FUNCTION_SCHEMA, lambda self: "first")
+        second = ToolFactory.from_openai_schema(FUNCTION_SCHEMA, lambda self: "second")
+        self.assertIsNot(first, second)
+        self.assertIs(first.__bases__[1], second.__bases__[1])
+        self.assertEqual(first(city="Paris").run(), "first")
+        self.assertEqual(second(city="Paris").run(), "second")
+        self.assertEqual(first.openai_schema, second.openai_schema)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,90 @@
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from itertools import count
+from unittest.mock import MagicMock, patch
+
+from openai.types.beta import Assistant
+
+sys.path.insert(0, '../agency-swarm')
+from agency_swarm import Agent
+from agency_swarm.util.settings_store import JSONSettingsStore, SQLiteSettingsStore
+
+
+class SettingsTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.settings_path = os.path.join(self.tmp_dir, "settings.json")
+        self.settings_store = JSONSettingsStore(self.settings_path)
+
+        ids = count()
+        self.client = MagicMock()
+
+        def create_assistant(**params):
+            return Assistant(id=f"asst_{next(ids)}", created_at=0, object="assistant",
+                             **{k: v for k, v in params.items() if k != "tool_resources"})
+
+        self.client.beta.assistants.create.side_effect = create_assistant
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def create_agent(self, name="SettingsAgent", instructions="Be helpful."):
+        with patch("agency_swarm.agents.agent.get_openai_client", return_value=self.client):
+            agent = Agent(name=name, instructions=instructions)
+        agent.settings_path = self.settings_path
+        agent.settings_store = self.settings_store
+        return agent
+
+    def test_unchanged_agent_skips_the_network(self):
+        agent = self.create_agent().init_oai()
+        self.client.beta.assistants.create.assert_called_once()
+
+        agent2 = self.create_agent().init_oai()
+
+        self.assertEqual(agent2.id, agent.id)
+        self.assertEqual(agent2.assistant.instructions, "Be helpful.")
+        self.client.beta.assistants.retrieve.assert_not_called()
+        self.client.beta.assistants.update.assert_not_called()
+
+    def test_changed_agent_is_checked_remotely(self):
+        agent = self.create_agent().init_oai()
+        self.client.beta.assistants.retrieve.return_value = agent.assistant
+        self.client.beta.assistants.update.return_value = agent.assistant
+
+        self.create_agent(instructions="Be concise.").init_oai()
+
+        self.client.beta.assistants.retrieve.assert_called_once_with(agent.id)
+        self.client.beta.assistants.update.assert_called_once()
+
+    def test_batch_writes_settings_once(self):
+        with patch("agency_swarm.util.settings_store.atomic_write_json") as write:
+            with self.settings_store.batch():
+                for i in range(10):
+                    self.settings_store.save({"id": f"asst_{i}", "name": f"Agent{i}"})
+            write.assert_called_once()
+            self.assertEqual(len(write.call_args[0][1]), 10)
+
+    def test_changes_from_another_store_are_not_lost(self):
+        other_store = JSONSettingsStore(self.settings_path)
+        self.settings_store.save({"id": "asst_1", "name": "Agent1"})
+        other_store.save({"id": "asst_2", "name": "Agent2"})
+        self.settings_store.delete("asst_1")
+
+        self.assertEqual([s["id"] for s in JSONSettingsStore(self.settings_path).load()], ["asst_2"])
+        self.assertEqual(self.settings_store.get_by_name("Agent2")[0]["id"], "asst_2")
+
+    def test_sqlite_store(self):
+        path = os.path.join(self.tmp_dir, "settings.db")
+        SQLiteSettingsStore(path).save({"id": "asst_1", "name": "Agent1", "model": "gpt-4-turbo"})
+
+        store = SQLiteSettingsStore(path)
+        self.assertEqual(store.get_by_id("asst_1")["model"], "gpt-4-turbo")
+        store.delete("asst_1")
+        self.assertEqual(SQLiteSettingsStore(path).load(), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
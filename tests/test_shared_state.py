@@ -0,0 +1,120 @@
+import os
+import sys
+import tempfile
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+
+sys.path.insert(0, '../agency-swarm')
+from agency_swarm.threads import Thread
+from agency_swarm.tools import BaseTool
+from agency_swarm.util.shared_state import MISSING, InMemorySharedState, SQLiteSharedState, get_shared_state, \
+    use_shared_state
+
+
+class RememberTool(BaseTool):
+    """Stores a value in the shared state."""
+    value: str
+
+    def run(self):
+        self.shared_state.set("value", self.value)
+        return "stored"
+
+
+class SharedStateTestMixin:
+    def make_state(self):
+        raise NotImplementedError
+
+    def setUp(self):
+        self.state = self.make_state()
+
+    def test_get_set_delete(self):
+        self.assertIsNone(self.state.get("a"))
+        self.assertEqual(self.state.get("a", 1), 1)
+        self.state.set("a", {"b": [1, 2]})
+        self.assertEqual(self.state.get("a"), {"b": [1, 2]})
+        self.state.delete("a")
+        self.assertNotIn("a", self.state.keys())
+
+    def test_key_must_be_string(self):
+        with self.assertRaises(ValueError):
+            self.state.set(1, "a")
+
+    def test_compare_and_set(self):
+        self.assertTrue(self.state.compare_and_set("a", MISSING, 1))
+        self.assertFalse(self.state.compare_and_set("a", MISSING, 2))
+        self.assertFalse(self.state.compare_and_set("a", 2, 3))
+        self.assertTrue(self.state.compare_and_set("a", 1, 3))
+        self.assertEqual(self.state.get("a"), 3)
+
+    def test_concurrent_updates_are_not_lost(self):
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            list(executor.map(lambda _: self.state.update("counter", lambda value: value + 1, default=0), range(100)))
+        self.assertEqual(self.state.get("counter"), 100)
+
+    def test_namespaces_are_isolated(self):
+        first, second = self.state.namespace("first"), self.state.namespace("second")
+        first.set("a", 1)
+        second.set("a", 2)
+        self.assertEqual((first.get("a"), second.get("a")), (1, 2))
+        self.assertEqual(first.keys(), ["a"])
+        self.assertIsNone(self.state.get("a"))
+
+
+class InMemorySharedStateTest(SharedStateTestMixin, unittest.TestCase):
+    def make_state(self):
+        return InMemorySharedState()
+
+
+class SQLiteSharedStateTest(SharedStateTestMixin, unittest.TestCase):
+    def make_state(self):
+        self.path = os.path.join(tempfile.mkdtemp(), "state.db")
+        return SQLiteSharedState(self.path)
+
+    def test_survives_restart(self):
+        self.state.set("a", 1)
+        self.assertEqual(SQLiteSharedState(self.path).get("a"), 1)
+
+
+class ToolSharedStateTest(unittest.TestCase):
+    def test_tools_use_the_state_of_their_thread(self):
+        with patch("agency_swarm.threads.thread.get_openai_client", return_value=MagicMock()):
+            thread = Thread(SimpleNamespace(name="User"), SimpleNamespace(name="CEO"))
+        thread.shared_state = InMemorySharedState().namespace("agency")
+        recipient = SimpleNamespace(name="CEO", functions=[RememberTool])
+        tool_call = SimpleNamespace(id="call_1", function=SimpleNamespace(name="RememberTool",
+                                                                          arguments='{"value": "a"}'))
+
+        thread._execute_tool_calls([tool_call], recipient, None)
+
+        self.assertEqual(thread.shared_state.get("value"), "a")
+        self.assertIsNone(get_shared_state().get("value"))
+
+    def test_use_shared_state(self):
+        state = InMemorySharedState()
+        with use_shared_state(state):
+            BaseTool.shared_state.set("a", 1)
+        self.assertEqual(state.get("a"), 1)
+        self.assertIsNone(BaseTool.shared_state.get("a"))
+
+    def test_data_is_the_dict_of_the_current_state(self):
+        state = InMemorySharedState()
+        with use_shared_state(state):
+            BaseTool.shared_state.data["a"] = 1
+            self.assertEqual(BaseTool.shared_state.data, {"a": 1})
+        self.assertEqual(state.get("a"), 1)
+        self.assertNotIn("a", BaseTool.shared_state.data)
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            state = SQLiteSharedState(os.path.join(tmp_dir, "state.db"))
+            state.set("old", True)
+            with use_shared_state(state.namespace("agency")):
+                BaseTool.shared_state.data = {"a": 1, "b": [2]}
+                self.assertEqual(BaseTool.shared_state.data, {"a": 1, "b": [2]})
+                BaseTool.shared_state.data = {"b": 3}
+            self.assertEqual(sorted(state.keys()), ["agency/b", "old"])
+
+
+if __name__ == '__main__':
+    unittest.main()
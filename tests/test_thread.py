@@ -0,0 +1,280 @@
+import asyncio
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import unittest
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock, patch
+
+sys.path.insert(0, '../agency-swarm')
+from agency_swarm.threads import Thread
+from agency_swarm.tools import BaseTool
+from agency_swarm.util.backoff import Backoff
+from agency_swarm.util.message_cache import MessageCache
+from agency_swarm.util.threads_store import ThreadsStore
+from agency_swarm.util.tracing import InMemoryExporter, Tracer, set_tracer
+
+
+class SlowTool(BaseTool):
+    """Sleeps for a moment and echoes its input."""
+    text: str
+
+    def run(self):
+        time.sleep(0.2)
+        return self.text
+
+
+class ExclusiveTool(BaseTool):
+    """Can only be called once per run step."""
+    one_call_at_a_time: bool = True
+
+    def run(self):
+        return "done"
+
+
+def make_tool_call(call_id, name, arguments):
+    return SimpleNamespace(id=call_id, function=SimpleNamespace(name=name, arguments=arguments))
+
+
+def make_run(status, run_id="run_1"):
+    return SimpleNamespace(id=run_id, status=status, last_error=None, required_action=None)
+
+
+def make_message(message_id, text, run_id="run_1", thread_id="thread_1"):
+    return SimpleNamespace(id=message_id, thread_id=thread_id, run_id=run_id, role="assistant", status="completed",
+                           created_at=0, content=[SimpleNamespace(text=SimpleNamespace(value=text))])
+
+
+class FakeStream:
+    def __init__(self, run, messages=()):
+        self.run = run
+        self.messages = list(messages)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+    def until_done(self):
+        pass
+
+    def get_final_run(self):
+        return self.run
+
+    def get_final_messages(self):
+        if not self.messages:
+            raise RuntimeError("No messages found")
+        return self.messages
+
+
+class FakeAsyncStream(FakeStream):
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        return False
+
+    async def until_done(self):
+        pass
+
+    async def get_final_run(self):
+        return self.run
+
+    async def get_final_messages(self):
+        return super().get_final_messages()
+
+
+class ThreadTest(unittest.TestCase):
+    def setUp(self):
+        self.client = MagicMock()
+        self.client.with_options.return_value = self.client
+        with patch("agency_swarm.threads.thread.get_openai_client", return_value=self.client):
+            self.thread = Thread(SimpleNamespace(name="User"), SimpleNamespace(name="CEO"))
+        self.thread.thread = SimpleNamespace(id="thread_1")
+        self.thread.id = "thread_1"
+        self.thread.message_cache = MessageCache()
+        self.recipient = SimpleNamespace(name="CEO", id="asst_1", model="gpt-4-turbo", instructions="", tools=[],
+                                         max_prompt_tokens=None, max_completion_tokens=None,
+                                         truncation_strategy=None, token_budget=None, model_router=None,
+                                         retry_policy=None)
+
+    def test_run_is_streamed_without_polling(self):
+        self.client.beta.threads.runs.stream.return_value = FakeStream(make_run("completed"))
+
+        self.thread._create_run(self.recipient, None, None, None)
+
+        self.assertEqual(self.thread.run.status, "completed")
+        self.client.beta.threads.runs.retrieve.assert_not_called()
+        self.assertEqual(self.thread.hop_stats[-1]["mode"], "stream")
+        self.assertEqual(self.thread.hop_stats[-1]["polls"], 0)
+
+    def test_last_message_is_read_from_the_stream(self):
+        self.client.beta.threads.runs.stream.return_value = FakeStream(
+            make_run("completed"), [make_message("msg_1", "Working on it."), make_message("msg_2", "Done!")])
+
+        self.thread._create_run(self.recipient, None, None, None)
+
+        self.assertEqual(self.thread._get_last_message_text(), "Done!")
+        self.client.beta.threads.messages.list.assert_not_called()
+
+    def test_last_message_is_listed_when_not_cached(self):
+        self.client.beta.threads.runs.stream.return_value = FakeStream(make_run("completed"))
+        self.client.beta.threads.messages.list.return_value = SimpleNamespace(data=[make_message("msg_1", "Hi!")])
+
+        self.thread._create_run(self.recipient, None, None, None)
+
+        self.assertEqual(self.thread._get_last_message_text(), "Hi!")
+        self.assertEqual(self.thread._get_last_message_text(), "Hi!")
+        self.client.beta.threads.messages.list.assert_called_once()
+
+    def test_falls_back_to_polling_when_streaming_is_unavailable(self):
+        self.client.beta.threads.runs.stream.side_effect = NotImplementedError("no streaming")
+        self.client.beta.threads.runs.create.return_value = make_run("queued")
+        self.client.beta.threads.runs.retrieve.side_effect = [make_run("in_progress"), make_run("completed")]
+
+        with patch("agency_swarm.threads.thread.time.sleep"):
+            self.thread._create_run(self.recipient, None, None, None)
+
+        self.assertFalse(self.thread.use_streaming)
+        self.assertEqual(self.thread.run.status, "completed")
+        self.assertEqual(self.thread.hop_stats[-1]["mode"], "poll")
+        self.assertEqual(self.thread.get_hop_stats()["polls"], 2)
+
+    def test_aget_completion(self):
+        async_client = MagicMock()
+        async_client.with_options.return_value = async_client
+        async_client.beta.threads.messages.create = AsyncMock()
+        async_client.beta.threads.messages.list = AsyncMock(return_value=SimpleNamespace(
+            data=[SimpleNamespace(content=[SimpleNamespace(text=SimpleNamespace(value="Hello!"))])]))
+        async_client.beta.threads.runs.stream.return_value = FakeAsyncStream(make_run("completed"))
+        self.thread._async_client = async_client
+        self.recipient.assistant = SimpleNamespace(id="asst_1")
+        self.recipient.response_validator = None
+
+        response = asyncio.run(self.thread.aget_completion("Hi!", recipient_agent=self.recipient))
+
+        self.assertEqual(response, "Hello!")
+        self.client.beta.threads.messages.create.assert_not_called()
+        async_client.beta.threads.messages.create.assert_awaited_once()
+
+    def test_tool_calls_run_in_parallel_and_keep_order(self):
+        self.recipient.functions = [SlowTool, ExclusiveTool]
+        tool_calls = [make_tool_call(f"call_{i}", "SlowTool", f'{{"text": "{i}"}}') for i in range(3)]
+        tool_calls += [make_tool_call("call_3", "ExclusiveTool", ""), make_tool_call("call_4", "ExclusiveTool", "")]
+
+        start = time.time()
+        outputs = self.thread._execute_tool_calls(tool_calls, self.recipient, None)
+
+        self.assertLess(time.time() - start, 0.5)
+        self.assertEqual([o["tool_call_id"] for o in outputs], [f"call_{i}" for i in range(5)])
+        self.assertEqual([o["output"] for o in outputs[:4]], ["0", "1", "2", "done"])
+        self.assertIn("already called", outputs[4]["output"])
+        self.assertEqual(len(self.thread.tool_call_stats), 5)
+        self.assertEqual(sum(stat["parallel"] for stat in self.thread.tool_call_stats), 3)
+
+    def test_hops_runs_and_tool_calls_are_traced(self):
+        exporter = InMemoryExporter()
+        set_tracer(Tracer([exporter]))
+        self.addCleanup(set_tracer, Tracer())
+        run = make_run("completed")
+        run.usage = SimpleNamespace(prompt_tokens=10, completion_tokens=5, total_tokens=15)
+        self.client.beta.threads.runs.stream.return_value = FakeStream(run)
+        self.recipient.functions = [SlowTool]
+
+        with self.thread._start_hop_span(self.recipient) as hop:
+            self.thread._create_run(self.recipient, None, None, None)
+            self.thread._execute_tool_calls([make_tool_call(f"call_{i}", "SlowTool", '{"text": "hi"}')
+                                             for i in range(2)], self.recipient, None)
+
+        run_span = exporter.get_spans("run")[0]
+        self.assertEqual(run_span.parent_id, hop.span_id)
+        self.assertEqual(run_span.attributes["total_tokens"], 15)
+        tool_spans = exporter.get_spans("tool")
+        self.assertEqual(len(tool_spans), 2)
+        self.assertTrue(all(span.parent_id == hop.span_id and span.trace_id == hop.trace_id for span in tool_spans))
+        self.assertEqual(exporter.get_spans("agent_hop")[0].attributes["recipient"], "CEO")
+
+    def test_backoff_grows_and_is_capped(self):
+        backoff = Backoff(initial=0.1, maximum=1.0, multiplier=2, jitter=False)
+        delays = [backoff.next_delay() for _ in range(6)]
+
+        self.assertEqual(delays[:4], [0.1, 0.2, 0.4, 0.8])
+        self.assertEqual(delays[-1], 1.0)
+
+
+class MessageCacheTest(unittest.TestCase):
+    def test_least_recently_used_threads_are_evicted(self):
+        cache = MessageCache(max_threads=2, max_messages=2)
+        for i in range(3):
+            cache.add(make_message(f"msg_{i}", f"text {i}", thread_id="thread_a"))
+        cache.add(make_message("msg_b", "b", thread_id="thread_b"))
+        cache.get_last_text("thread_a", "run_1")
+        cache.add(make_message("msg_c", "c", thread_id="thread_c"))
+
+        self.assertEqual(list(cache.threads), ["thread_a", "thread_c"])
+        self.assertEqual(list(cache.threads["thread_a"]), ["msg_1", "msg_2"])
+        self.assertIsNone(cache.get_last_text("thread_b", "run_1"))
+
+    def test_messages_are_persisted(self):
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tmp_dir, "messages.db")
+            MessageCache(path=path).add(make_message("msg_1", "Hello!"))
+
+            self.assertEqual(MessageCache(path=path).get_last_text("thread_1", "run_1"), "Hello!")
+        finally:
+            shutil.rmtree(tmp_dir)
+
+
+class ThreadsStoreTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.threads_path = os.path.join(self.tmp_dir, "threads.json")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_threads_are_created_on_first_use(self):
+        store = ThreadsStore(self.threads_path, debounce=0)
+        client = MagicMock()
+        client.beta.threads.create.return_value = SimpleNamespace(id="thread_1")
+        with patch("agency_swarm.threads.thread.get_openai_client", return_value=client):
+            thread = Thread(SimpleNamespace(name="CEO"), SimpleNamespace(name="Dev", examples=None),
+                            on_created=lambda thread: store.set("CEO", "Dev", thread.id))
+        client.beta.threads.create.assert_not_called()
+
+        thread.init_thread()
+
+        with open(self.threads_path) as f:
+            self.assertEqual(json.load(f), {"CEO": {"Dev": "thread_1"}})
+
+    def test_writes_are_debounced(self):
+        store = ThreadsStore(self.threads_path, debounce=60)
+        with patch("agency_swarm.util.threads_store.atomic_write_json") as write:
+            for i in range(10):
+                store.set("CEO", f"Agent{i}", f"thread_{i}")
+            store.set("main_thread", thread_id="thread_main")
+            write.assert_not_called()
+
+            store.flush()
+
+        write.assert_called_once()
+        self.assertEqual(len(write.call_args[0][1]["CEO"]), 10)
+        self.assertEqual(write.call_args[0][1]["main_thread"], "thread_main")
+
+    def test_ids_saved_by_other_processes_are_kept(self):
+        with open(self.threads_path, "w") as f:
+            json.dump({"CEO": {"Dev": "thread_1"}}, f)
+        store = ThreadsStore(self.threads_path, debounce=0)
+
+        store.set("CEO", "QA", "thread_2")
+
+        self.assertEqual(ThreadsStore(self.threads_path).load(), {"CEO": {"Dev": "thread_1", "QA": "thread_2"}})
+
+
+if __name__ == '__main__':
+    unittest.main()
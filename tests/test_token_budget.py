@@ -0,0 +1,199 @@
+import sys
+import unittest
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+
+sys.path.insert(0, '../agency-swarm')
+from agency_swarm.threads import Thread
+from agency_swarm.tools import BaseTool
+from agency_swarm.util.token_budget import TokenBudget, TokenCounter, count_tokens, get_cost, get_model_profile
+
+
+class LookupTool(BaseTool):
+    """Looks up a record by its key."""
+    key: str
+
+    def run(self):
+        return self.key
+
+
+def make_agent(**kwargs):
+    agent = SimpleNamespace(name="CEO", id="asst_1", model="gpt-4-turbo", instructions="You are the CEO.",
+                            tools=[LookupTool], max_prompt_tokens=None, max_completion_tokens=None,
+                            truncation_strategy=None, token_budget=None, model_router=None, retry_policy=None,
+                            examples=None)
+    agent.get_oai_tools = lambda: [{"type": "function", "function": LookupTool.openai_schema}]
+    agent.__dict__.update(kwargs)
+    return agent
+
+
+def make_run(status, prompt_tokens=None, completion_tokens=None):
+    usage = SimpleNamespace(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens,
+                            total_tokens=(prompt_tokens or 0) + (completion_tokens or 0)) \
+        if prompt_tokens is not None else None
+    return SimpleNamespace(id="run_1", status=status, last_error=None, required_action=None, usage=usage)
+
+
+class FakeStream:
+    def __init__(self, run):
+        self.run = run
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+    def until_done(self):
+        pass
+
+    def get_final_run(self):
+        return self.run
+
+    def get_final_messages(self):
+        raise RuntimeError("No messages found")
+
+
+class TokenCounterTest(unittest.TestCase):
+    def test_projection_includes_instructions_tools_and_messages(self):
+        counter = TokenCounter()
+        agent = make_agent()
+        empty = counter.project(agent)
+
+        counter.add_message("user", "word " * 400)
+        projection = counter.project(agent, additional_instructions="Be brief.")
+
+        self.assertGreater(empty["base_tokens"], count_tokens(agent.instructions))
+        self.assertGreater(projection["base_tokens"], empty["base_tokens"])
+        self.assertGreaterEqual(projection["thread_tokens"] - empty["thread_tokens"], count_tokens("word " * 400))
+        self.assertEqual(projection["cost"], get_cost("gpt-4-turbo", projection["prompt_tokens"],
+                                                      projection["completion_tokens"]))
+        self.assertGreater(projection["latency"], 0)
+        self.assertFalse(projection["over_budget"])
+
+    def test_dated_models_use_their_family_profile(self):
+        self.assertEqual(get_model_profile("gpt-4-turbo-2024-04-09"), get_model_profile("gpt-4-turbo"))
+        self.assertEqual(get_model_profile("gpt-4o-mini")["prompt"], get_model_profile("gpt-4o")["prompt"])
+
+    def test_unknown_history_is_learnt_from_usage(self):
+        counter = TokenCounter()
+        agent = make_agent()
+        counter.add_message("user", "Hi!")
+        projection = counter.project(agent)
+
+        counter.observe(projection, SimpleNamespace(prompt_tokens=projection["prompt_tokens"] + 1000,
+                                                    completion_tokens=50), single_step=True)
+
+        self.assertEqual(counter.project(agent)["prompt_tokens"], projection["prompt_tokens"] + 1000)
+        self.assertEqual(counter.project(agent)["completion_tokens"], 50)
+        self.assertEqual(counter.get_stats()["runs"], 1)
+
+    def test_truncation_keeps_the_latest_messages_within_budget(self):
+        counter = TokenCounter()
+        for i in range(10):
+            counter.add_message("user", f"message {i} " + "word " * 100)
+        base_tokens = counter.project(make_agent())["base_tokens"]
+        message_tokens = counter.messages[-1]["tokens"]
+        agent = make_agent(token_budget=TokenBudget(max_prompt_tokens=base_tokens + message_tokens * 3 + 10))
+
+        projection = counter.project(agent)
+        strategy = counter.apply_budget(agent, projection)
+
+        self.assertTrue(projection["over_budget"])
+        self.assertEqual(strategy, {"type": "last_messages", "last_messages": 3})
+
+    def test_agent_truncation_strategy_is_not_overridden(self):
+        counter = TokenCounter()
+        counter.add_message("user", "word " * 1000)
+        agent = make_agent(token_budget=TokenBudget(max_prompt_tokens=10),
+                           truncation_strategy={"type": "auto"})
+
+        self.assertIsNone(counter.apply_budget(agent, counter.project(agent)))
+
+
+class ThreadBudgetTest(unittest.TestCase):
+    def setUp(self):
+        self.client = MagicMock()
+        self.client.with_options.return_value = self.client
+        with patch("agency_swarm.threads.thread.get_openai_client", return_value=self.client):
+            self.thread = Thread(SimpleNamespace(name="User"), make_agent())
+        self.thread.thread = SimpleNamespace(id="thread_1")
+        self.thread.id = "thread_1"
+        self.client.beta.threads.runs.stream.return_value = FakeStream(make_run("completed", 500, 20))
+
+    def test_runs_within_budget_are_not_truncated(self):
+        agent = make_agent(token_budget=TokenBudget(max_prompt_tokens=100000))
+        self.thread.token_counter.add_message("user", "Hi!")
+
+        self.thread._create_run(agent, None, None, None)
+
+        params = self.client.beta.threads.runs.stream.call_args.kwargs
+        self.assertIsNone(params["truncation_strategy"])
+        self.assertFalse(self.thread.last_projection["over_budget"])
+        self.assertEqual(self.thread.token_counter.get_stats()["prompt_tokens"], 500)
+
+    def test_old_turns_are_summarized_when_over_budget(self):
+        summarizer = MagicMock(return_value="The user asked about the weather.")
+        for i in range(6):
+            self.thread.token_counter.add_message("user" if i % 2 == 0 else "assistant",
+                                                  f"turn {i} " + "word " * 100)
+        base_tokens = self.thread.project_run(make_agent())["base_tokens"]
+        agent = make_agent(token_budget=TokenBudget(max_prompt_tokens=base_tokens + 300, strategy="summarize",
+                                                    summary_tokens=50, summarizer=summarizer))
+
+        self.thread._create_run(agent, "Be brief.", None, None)
+        self.thread._create_run(agent, "Be brief.", None, None)
+
+        params = self.client.beta.threads.runs.stream.call_args.kwargs
+        self.assertEqual(params["truncation_strategy"], {"type": "last_messages", "last_messages": 2})
+        self.assertTrue(params["additional_instructions"].startswith("Be brief."))
+        self.assertIn("The user asked about the weather.", params["additional_instructions"])
+        # the cut off turns are summarized once
+        summarizer.assert_called_once()
+        self.assertEqual(len(summarizer.call_args[0][0]), 4)
+        self.assertEqual(self.thread.token_counter.get_stats()["summarized"], 4)
+
+    def test_switching_threads_keeps_the_budget_state_of_each_thread(self):
+        summarizer = MagicMock(return_value="Alice asked about her invoice.")
+        for i in range(6):
+            self.thread.token_counter.add_message("user" if i % 2 == 0 else "assistant",
+                                                  f"turn {i} " + "word " * 100)
+        base_tokens = self.thread.project_run(make_agent())["base_tokens"]
+        agent = make_agent(token_budget=TokenBudget(max_prompt_tokens=base_tokens + 300, strategy="summarize",
+                                                    summary_tokens=50, summarizer=summarizer),
+                           examples=[{"role": "user", "content": "Example question."}])
+        self.thread.recipient_agent = agent
+        self.thread._create_run(agent, None, None, None)
+        self.assertIn("Alice", self.client.beta.threads.runs.stream.call_args.kwargs["additional_instructions"])
+
+        self.thread.switch_thread("thread_2")
+        self.thread.thread = SimpleNamespace(id="thread_2")
+        self.thread.token_counter.add_message("user", "Hi, this is Bob.")
+        self.thread._create_run(agent, None, None, None)
+
+        params = self.client.beta.threads.runs.stream.call_args.kwargs
+        self.assertEqual(params["thread_id"], "thread_2")
+        self.assertIsNone(params["additional_instructions"])
+        self.assertIsNone(params["truncation_strategy"])
+        self.assertFalse(self.thread.last_projection["over_budget"])
+        stats = self.thread.token_counter.get_stats()
+        # the examples already in the existing thread, and Bob's message
+        self.assertEqual((stats["messages"], stats["summarized"], stats["runs"]), (2, 0, 1))
+        summarizer.assert_called_once()
+
+        # switching to the same thread keeps its counts
+        self.thread.switch_thread("thread_2")
+        self.assertEqual(self.thread.token_counter.get_stats()["messages"], 2)
+
+        # switching back restores the counts and summary of the first thread
+        bob = self.thread.token_counter.get_stats()
+        self.thread.switch_thread("thread_1")
+        stats = self.thread.token_counter.get_stats()
+        self.assertEqual((stats["messages"], stats["summarized"]), (6, 4))
+        self.assertIn("Alice", self.thread.token_counter.get_summary_instructions())
+        self.thread.switch_thread("thread_2")
+        self.assertEqual(self.thread.token_counter.get_stats(), bob)
+
+
+if __name__ == '__main__':
+    unittest.main()
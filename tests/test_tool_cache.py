@@ -0,0 +1,166 @@
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+import unittest
+from types import SimpleNamespace
+from typing import ClassVar
+from unittest.mock import MagicMock, patch
+
+import httpx
+
+sys.path.insert(0, '../agency-swarm')
+from agency_swarm.threads import Thread
+from agency_swarm.tools import BaseTool, ToolFactory
+from agency_swarm.util.http import HTTPClientPool
+from agency_swarm.util.tool_cache import ToolCache
+
+
+class CountingTool(BaseTool):
+    """Returns the query and counts how often it ran."""
+    query: str
+    cacheable = True
+    calls: ClassVar[int] = 0
+
+    def run(self):
+        CountingTool.calls += 1
+        return f"result for {self.query}"
+
+
+class ExpiringTool(CountingTool):
+    """Cached for a moment only."""
+    cache_ttl = 0.1
+
+
+class FailingTool(BaseTool):
+    """Always fails."""
+    cacheable = True
+
+    def run(self):
+        raise ValueError("boom")
+
+
+class UncachedTool(CountingTool):
+    """Opts out of caching."""
+    cacheable = False
+
+
+def make_tool_call(call_id, name, arguments):
+    return SimpleNamespace(id=call_id, function=SimpleNamespace(name=name, arguments=json.dumps(arguments)))
+
+
+class ThreadToolCacheTest(unittest.TestCase):
+    def setUp(self):
+        CountingTool.calls = 0
+        with patch("agency_swarm.threads.thread.get_openai_client", return_value=MagicMock()):
+            self.thread = Thread(SimpleNamespace(name="User"), SimpleNamespace(name="CEO"))
+        self.thread.tool_cache = ToolCache()
+        self.recipient = SimpleNamespace(name="CEO", functions=[CountingTool, ExpiringTool, FailingTool,
+                                                                UncachedTool])
+
+    def execute(self, name, **arguments):
+        return self.thread.execute_tool(make_tool_call("call_1", name, arguments), self.recipient)
+
+    def test_repeated_calls_are_cached(self):
+        self.assertEqual(self.execute("CountingTool", query="a"), "result for a")
+        self.assertEqual(self.execute("CountingTool", query="a"), "result for a")
+        self.assertEqual(self.execute("CountingTool", query="b"), "result for b")
+        self.assertEqual(CountingTool.calls, 2)
+
+        stats = self.thread.tool_cache.get_stats()
+        self.assertEqual((stats["hits"], stats["misses"]), (1, 2))
+        self.assertEqual(stats["tools"]["CountingTool"], {"hits": 1, "misses": 2})
+
+    def test_entries_expire(self):
+        self.execute("ExpiringTool", query="a")
+        time.sleep(0.15)
+        self.execute("ExpiringTool", query="a")
+        self.assertEqual(CountingTool.calls, 2)
+        self.assertEqual(self.thread.tool_cache.get_stats()["expirations"], 1)
+
+    def test_errors_are_not_cached(self):
+        self.assertTrue(self.execute("FailingTool").startswith("Error:"))
+        self.assertEqual(self.thread.tool_cache.get_stats()["entries"], 0)
+
+    def test_tools_are_not_cached_by_default(self):
+        self.execute("UncachedTool", query="a")
+        self.execute("UncachedTool", query="a")
+        self.assertEqual(CountingTool.calls, 2)
+        self.assertEqual(self.thread.tool_cache.get_stats()["misses"], 0)
+
+    def test_async_calls_are_cached(self):
+        async def main():
+            for _ in range(3):
+                await self.thread.aexecute_tool(make_tool_call("call_1", "CountingTool", {"query": "a"}),
+                                                self.recipient)
+
+        asyncio.run(main())
+        self.assertEqual(CountingTool.calls, 1)
+
+    def test_openapi_get_operations_are_cached(self):
+        requests = []
+
+        def handler(request):
+            requests.append(request)
+            return httpx.Response(200, json={"path": request.url.path})
+
+        spec = {
+            "openapi": "3.1.0", "info": {"title": "Pets", "version": "v1"},
+            "servers": [{"url": "https://pets.example.com"}],
+            "paths": {"/pets": {
+                "get": {"operationId": "listPets", "description": "List pets."},
+                "post": {"operationId": "createPet", "description": "Create a pet."},
+            }},
+        }
+        pool = HTTPClientPool(transport=httpx.MockTransport(handler))
+        list_pets, create_pet = ToolFactory.from_openapi_schema(spec, http_pool=pool, cache_ttl=60)
+        self.assertTrue(list_pets.cacheable)
+        self.assertFalse(create_pet.cacheable)
+
+        self.recipient.functions = [list_pets, create_pet]
+        for _ in range(2):
+            self.execute("listPets")
+            self.execute("createPet")
+        pool.close()
+        self.assertEqual([request.method for request in requests], ["GET", "POST", "POST"])
+
+
+class ToolCacheTest(unittest.TestCase):
+    def test_lru_eviction(self):
+        cache = ToolCache(max_entries=2)
+        for key in ("a", "b", "c"):
+            cache.set(key, key)
+        self.assertEqual(cache.get("a"), (False, None))
+        self.assertEqual(cache.get("c"), (True, "c"))
+        self.assertEqual(cache.get_stats()["evictions"], 1)
+
+    def test_disk_backend_survives_restart(self):
+        path = os.path.join(tempfile.mkdtemp(), "tools.db")
+        cache = ToolCache(path=path)
+        cache.set("a", {"value": 1})
+        cache.set("b", "expired", ttl=-1)
+
+        cache = ToolCache(path=path)
+        self.assertEqual(cache.get("a"), (True, {"value": 1}))
+        self.assertEqual(cache.get("b"), (False, None))
+
+    def test_disk_backend_is_bounded(self):
+        path = os.path.join(tempfile.mkdtemp(), "tools.db")
+        cache = ToolCache(path=path, max_entries=1, max_disk_entries=2)
+        for key in ("a", "b", "c"):
+            cache.set(key, key)
+            time.sleep(0.01)
+        self.assertEqual(cache.get("a"), (False, None))
+        self.assertEqual(cache.get("b"), (True, "b"))
+
+    def test_key_ignores_thread_fields(self):
+        first, second = CountingTool(query="a"), CountingTool(query="a")
+        second.caller_agent = object()
+        self.assertEqual(ToolCache.get_key(first), ToolCache.get_key(second))
+        self.assertNotEqual(ToolCache.get_key(first), ToolCache.get_key(CountingTool(query="b")))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,95 @@
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from unittest.mock import MagicMock, patch
+
+sys.path.insert(0, '../agency-swarm')
+from agency_swarm import Agent
+from agency_swarm.tools import BaseTool, ToolFactory
+from agency_swarm.tools.ToolFactory import clear_file_cache
+
+TOOL_TEMPLATE = '''from agency_swarm.tools import BaseTool
+
+
+class {name}(BaseTool):
+    """{description}"""
+
+    def run(self):
+        return "{description}"
+'''
+
+SCHEMAS_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "schemas")
+
+
+class ToolLoadingTest(unittest.TestCase):
+    def setUp(self):
+        clear_file_cache()
+        self.folder = tempfile.mkdtemp()
+
+    def tearDown(self):
+        clear_file_cache()
+        shutil.rmtree(self.folder)
+
+    def write_tool(self, name, description, mtime=None):
+        f_path = os.path.join(self.folder, f"{name}.py")
+        with open(f_path, "w") as f:
+            f.write(TOOL_TEMPLATE.format(name=name, description=description))
+        if mtime is not None:
+            os.utime(f_path, ns=(mtime, mtime))
+        return f_path
+
+    def test_tool_files_are_imported_once_until_they_change(self):
+        f_path = self.write_tool("CachedTool", "First version.", mtime=1_000_000_000)
+
+        with patch.object(ToolFactory, "_import_file", wraps=ToolFactory._import_file) as import_file:
+            tool = ToolFactory.from_file(f_path)
+            self.assertIs(ToolFactory.from_file(f_path), tool)
+            self.assertEqual(import_file.call_count, 1)
+
+            self.write_tool("CachedTool", "Second version!", mtime=2_000_000_000)
+            changed_tool = ToolFactory.from_file(f_path)
+
+        self.assertEqual(import_file.call_count, 2)
+        self.assertTrue(issubclass(changed_tool, BaseTool))
+        self.assertEqual(changed_tool().run(), "Second version!")
+        # imported classes no longer leak into the module of the factory
+        self.assertNotIn("CachedTool", vars(sys.modules["agency_swarm.tools.ToolFactory"]))
+
+    def test_files_without_a_tool_class_are_rejected(self):
+        f_path = os.path.join(self.folder, "NotATool.py")
+        with open(f_path, "w") as f:
+            f.write("class Other:\n    pass\n")
+
+        with self.assertRaises(ImportError):
+            ToolFactory.from_file(f_path)
+
+    def test_schema_files_are_parsed_once_per_headers(self):
+        f_path = os.path.join(SCHEMAS_FOLDER, "ga4.json")
+
+        with patch.object(ToolFactory, "from_openapi_schema", wraps=ToolFactory.from_openapi_schema) as parse:
+            tools = ToolFactory.from_openapi_file(f_path)
+            self.assertEqual(ToolFactory.from_openapi_file(f_path), tools)
+            self.assertEqual(parse.call_count, 1)
+
+            ToolFactory.from_openapi_file(f_path, headers={"Authorization": "Bearer token"})
+            self.assertEqual(parse.call_count, 2)
+
+    def test_agents_load_tool_folders_in_order(self):
+        for name in ["ToolA", "ToolB", "ToolC"]:
+            self.write_tool(name, f"{name} output.")
+
+        with patch("agency_swarm.agents.agent.get_openai_client", return_value=MagicMock()):
+            first = Agent(name="First", tools_folder=self.folder, schemas_folder=SCHEMAS_FOLDER)
+            second = Agent(name="Second", tools_folder=self.folder, schemas_folder=SCHEMAS_FOLDER)
+
+        names = sorted(tool.__name__ for tool in first.tools if tool.__name__.startswith("Tool"))
+        self.assertEqual(names, ["ToolA", "ToolB", "ToolC"])
+        self.assertEqual([tool.__name__ for tool in first.tools], [tool.__name__ for tool in second.tools])
+        # both agents share the tool classes imported by the first one
+        self.assertTrue(all(a is b for a, b in zip(first.tools, second.tools)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,150 @@
+import contextlib
+import io
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, '../agency-swarm')
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmarks'))
+from agency_swarm import Agent
+from agency_swarm.util import oai
+from agency_swarm.util.vector_store_sync import VectorStoreSync, list_vector_store_file_ids
+from mock_api import MockAssistantsAPI
+
+LIST_FILES = "GET /vector_stores/{vector_store_id}/files"
+CREATE_BATCH = "POST /vector_stores/{vector_store_id}/file_batches"
+DETACH_FILE = "DELETE /vector_stores/{vector_store_id}/files/{file_id}"
+
+
+class VectorStoreSyncTest(unittest.TestCase):
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.tmp_dir = tempfile.mkdtemp()
+        os.chdir(self.tmp_dir)
+        self.api = MockAssistantsAPI().install()
+        self.client = oai.get_openai_client()
+        self.files_folder = os.path.join(self.tmp_dir, "knowledge")
+        os.mkdir(self.files_folder)
+        for i in range(150):
+            self.write_file(f"doc{i}.txt", f"document {i}")
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+        oai.client = None
+        oai.async_client = None
+
+    def write_file(self, name, content):
+        with open(os.path.join(self.files_folder, name), "w") as f:
+            f.write(content)
+
+    def create_agent(self):
+        with contextlib.redirect_stdout(io.StringIO()):
+            return Agent(name="Researcher", files_folder=self.files_folder).init_oai()
+
+    def vector_store_files(self, agent):
+        return self.api.vector_stores[agent.tool_resources["file_search"]["vector_store_ids"][0]]["file_ids"]
+
+    def test_list_follows_all_pages(self):
+        vector_store_id = self.client.beta.vector_stores.create(file_ids=[f"file-{i}" for i in range(250)]).id
+
+        file_ids = list_vector_store_file_ids(self.client, vector_store_id)
+
+        self.assertEqual(file_ids, [f"file-{i}" for i in range(250)])
+        self.assertEqual(self.api.requests[LIST_FILES], 3)
+
+    def test_sync_attaches_in_batches_and_detaches_removed_files(self):
+        vector_store_id = self.client.beta.vector_stores.create(file_ids=["old-1", "kept", "old-2"]).id
+
+        result = VectorStoreSync(self.client, vector_store_id, batch_size=100).sync(
+            ["kept"] + [f"new-{i}" for i in range(250)])
+
+        self.assertEqual(len(result["attached"]), 250)
+        self.assertEqual(sorted(result["detached"]), ["old-1", "old-2"])
+        self.assertEqual(result["unchanged"], 1)
+        self.assertEqual(self.api.requests[CREATE_BATCH], 3)
+        self.assertEqual(sorted(self.api.vector_stores[vector_store_id]["file_ids"]),
+                         sorted(["kept"] + [f"new-{i}" for i in range(250)]))
+
+    def test_add_skips_attached_files(self):
+        vector_store_id = self.client.beta.vector_stores.create(file_ids=["a", "b"]).id
+
+        self.assertEqual(VectorStoreSync(self.client, vector_store_id).add(["a", "b", "c"]), ["c"])
+        self.assertEqual(self.api.vector_stores[vector_store_id]["file_ids"], ["a", "b", "c"])
+
+    def test_unchanged_folder_is_a_no_op(self):
+        agent = self.create_agent()
+        self.assertEqual(len(self.vector_store_files(agent)), 150)
+        requests = self.api.total_requests
+
+        self.create_agent()
+
+        self.assertEqual(self.api.total_requests, requests)
+
+    def test_changed_folder_is_synced_incrementally(self):
+        agent = self.create_agent()
+        old_file_ids = set(self.vector_store_files(agent))
+
+        self.write_file("doc0.txt", "document 0, changed")
+        self.write_file("new.txt", "new document")
+        os.remove(os.path.join(self.files_folder, "doc1.txt"))
+        agent = self.create_agent()
+
+        file_ids = set(self.vector_store_files(agent))
+        self.assertEqual(len(file_ids), 150)
+        self.assertEqual(len(file_ids - old_file_ids), 2)
+        self.assertEqual(len(old_file_ids - file_ids), 2)
+        self.assertEqual(self.api.requests[CREATE_BATCH], 1)
+        self.assertEqual(self.api.requests[DETACH_FILE], 2)
+        self.assertEqual(self.api.requests["POST /files"], 152)
+
+        # the next start is a no-op again
+        requests = self.api.total_requests
+        self.create_agent()
+        self.assertEqual(self.api.total_requests, requests)
+
+    def test_sync_only_detaches_managed_files(self):
+        vector_store_id = self.client.beta.vector_stores.create(file_ids=["folder-1", "folder-2", "user"]).id
+
+        result = VectorStoreSync(self.client, vector_store_id).sync(["folder-1"], managed_ids=["folder-1", "folder-2"])
+
+        self.assertEqual(result["detached"], ["folder-2"])
+        self.assertEqual(self.api.vector_stores[vector_store_id]["file_ids"], ["folder-1", "user"])
+
+    def test_files_attached_in_other_ways_are_kept(self):
+        agent = self.create_agent()
+        vector_store_id = agent.tool_resources["file_search"]["vector_store_ids"][0]
+        VectorStoreSync(self.client, vector_store_id).add(["file-added"])
+        self.write_file("data.csv", "a,b")
+        agent = self.create_agent()
+        code_interpreter_ids = agent.tool_resources["code_interpreter"]["file_ids"]
+        self.api.assistants[agent.id]["tool_resources"]["code_interpreter"]["file_ids"].append("file-user")
+
+        os.remove(os.path.join(self.files_folder, "doc0.txt"))
+        os.remove(os.path.join(self.files_folder, "data.csv"))
+        self.write_file("other.csv", "c,d")
+        agent = self.create_agent()
+
+        file_ids = self.vector_store_files(agent)
+        self.assertIn("file-added", file_ids)
+        self.assertEqual(len(file_ids), 150)
+        self.assertEqual(self.api.requests[DETACH_FILE], 1)
+        # the csv removed from the folder is replaced, the file attached by the user is kept
+        new_ids = self.api.assistants[agent.id]["tool_resources"]["code_interpreter"]["file_ids"]
+        self.assertEqual(len(new_ids), 2)
+        self.assertEqual(new_ids[0], "file-user")
+        self.assertNotIn(code_interpreter_ids[0], new_ids)
+
+    def test_delete_removes_all_files(self):
+        agent = self.create_agent()
+
+        agent.delete()
+
+        self.assertEqual(self.api.files, {})
+        self.assertEqual(self.api.vector_stores, {})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,137 @@
+import sys
+import threading
+import time
+import unittest
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+
+sys.path.insert(0, '../agency-swarm')
+from agency_swarm.threads import Thread
+from agency_swarm.threads.thread_async import ThreadAsync
+from agency_swarm.util.worker_pool import QueueFullError, WorkerPool
+
+
+class WorkerPoolTest(unittest.TestCase):
+    def setUp(self):
+        self.pool = WorkerPool(max_workers=4, max_queue_size=10)
+
+    def tearDown(self):
+        self.pool.shutdown()
+
+    def test_jobs_with_the_same_key_run_in_order(self):
+        order = []
+        jobs = [self.pool.submit("agent", lambda i=i: (time.sleep(0.01), order.append(i))) for i in range(5)]
+        for job in jobs:
+            self.assertTrue(job.wait(5))
+        self.assertEqual(order, list(range(5)))
+
+    def test_jobs_with_different_keys_run_in_parallel(self):
+        barrier = threading.Barrier(3, timeout=5)
+        jobs = [self.pool.submit(f"agent{i}", barrier.wait) for i in range(3)]
+        for job in jobs:
+            self.assertTrue(job.wait(5))
+            self.assertEqual(job.status, "completed")
+
+    def test_positions_and_queue_depth(self):
+        release = threading.Event()
+        first = self.pool.submit("agent", release.wait)
+        second = self.pool.submit("agent", lambda: None)
+        third = self.pool.submit("agent", lambda: None)
+
+        self.assertEqual([self.pool.get_position(job) for job in (first, second, third)], [0, 1, 2])
+        self.assertEqual(self.pool.get_queue_depth("agent"), 2)
+        self.assertEqual(self.pool.get_stats()["queue_depths"], {"agent": 2})
+
+        release.set()
+        self.assertTrue(third.wait(5))
+        self.assertEqual(self.pool.get_position(third), 0)
+        stats = self.pool.get_stats()
+        self.assertEqual((stats["completed"], stats["pending"], stats["active"]), (3, 0, 0))
+        self.assertEqual(stats["wait_time"]["count"], 3)
+
+    def test_full_queue_rejects_jobs(self):
+        pool = WorkerPool(max_workers=1, max_queue_size=2)
+        release = threading.Event()
+        try:
+            pool.submit("a", release.wait)
+            time.sleep(0.05)
+            pool.submit("a", lambda: None)
+            pool.submit("b", lambda: None)
+            with self.assertRaises(QueueFullError):
+                pool.submit("c", lambda: None)
+            self.assertEqual(pool.get_stats()["rejected"], 1)
+        finally:
+            release.set()
+            pool.shutdown()
+
+    def test_failures_are_recorded_and_queue_continues(self):
+        def fail():
+            raise ValueError("boom")
+
+        failed = self.pool.submit("agent", fail)
+        after = self.pool.submit("agent", lambda: "ok")
+        self.assertTrue(after.wait(5))
+        self.assertEqual(failed.status, "failed")
+        self.assertIsInstance(failed.error, ValueError)
+        self.assertEqual(after.result, "ok")
+        self.assertEqual(self.pool.get_stats()["failed"], 1)
+
+    def test_shutdown_fails_waiting_jobs(self):
+        release = threading.Event()
+        running = self.pool.submit("agent", release.wait)
+        waiting = self.pool.submit("agent", lambda: "never")
+
+        threading.Timer(0.05, release.set).start()
+        self.pool.shutdown()
+
+        self.assertEqual(running.status, "completed")
+        self.assertTrue(waiting.done)
+        self.assertEqual(waiting.status, "failed")
+        self.assertEqual(self.pool.get_stats()["pending"], 0)
+        with self.assertRaises(RuntimeError):
+            self.pool.submit("agent", lambda: None)
+
+
+class ThreadAsyncQueueTest(unittest.TestCase):
+    def setUp(self):
+        with patch("agency_swarm.threads.thread.get_openai_client", return_value=MagicMock()):
+            self.thread = ThreadAsync(SimpleNamespace(name="CEO"), SimpleNamespace(name="Worker"))
+        self.thread.worker_pool = WorkerPool(max_workers=2)
+        self.thread.get_last_run = MagicMock(return_value=None)
+        self.release = threading.Event()
+        self.messages = []
+
+    def tearDown(self):
+        self.release.set()
+        self.thread.worker_pool.shutdown()
+
+    def get_completion(self, message, **kwargs):
+        self.release.wait(5)
+        self.messages.append(message)
+        return f"done: {message}"
+
+    def test_messages_to_a_busy_agent_are_queued(self):
+        with patch.object(Thread, "get_completion", side_effect=self.get_completion):
+            first = self.thread.get_completion_async("first")
+            second = self.thread.get_completion_async("second")
+
+            self.assertIn("Task has started", first)
+            self.assertIn("queued at position 1", second)
+            self.assertIn("queued at position 1", self.thread.check_status())
+
+            self.release.set()
+            self.assertTrue(self.thread.jobs[-1].wait(5))
+
+        self.assertEqual(self.messages, ["first", "second"])
+        self.assertEqual(self.thread.response, "Worker's Response: 'done: second'")
+
+    def test_failed_job_is_reported(self):
+        with patch.object(Thread, "get_completion", side_effect=RuntimeError("connection lost")):
+            self.thread.get_completion_async("first")
+            self.assertTrue(self.thread.jobs[-1].wait(5))
+
+        self.assertIn("connection lost", self.thread.check_status())
+
+
+if __name__ == '__main__':
+    unittest.main()